@@ -0,0 +1,455 @@
+# src/batch.py
+
+from __future__ import annotations
+
+import io
+import json
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Tuple, Union
+
+from .client import (
+    AnthropicChatClient,
+    ConversationResult,
+    SimulatedChatClient,
+    TokenLogProbs,
+    TurnResult,
+    _chat_loop,
+    _get_model_config,
+    _normalize_logprob_flags,
+    get_llm_client,
+)
+
+# One batch request: (custom_id, run index, message history, want_logprobs)
+BatchRequest = Tuple[str, int, List[Dict[str, str]], bool]
+
+
+# --- Backends ------------------------------------------------------------------------
+
+
+class BatchBackend(Protocol):
+    """
+    A provider batch endpoint: submit many independent chat requests as one job,
+    poll until it has finished, then collect results by custom_id.
+    """
+
+    poll_interval: float
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        ...
+
+    def is_done(self, job_id: str) -> bool:
+        ...
+
+    def results(self, job_id: str) -> Dict[str, Union[TurnResult, Exception]]:
+        ...
+
+
+def _openai_batch_line(
+    custom_id: str,
+    model_id: str,
+    messages: List[Dict[str, str]],
+    want_logprobs: bool,
+    gen_kwargs: Dict[str, Any],
+) -> Dict[str, Any]:
+    body: Dict[str, Any] = {"model": model_id, "messages": messages, **gen_kwargs}
+    if want_logprobs:
+        body["logprobs"] = True
+        body["top_logprobs"] = 1
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": body,
+    }
+
+
+def _parse_openai_batch_output(text: str) -> Dict[str, Union[TurnResult, Exception]]:
+    """Parse an OpenAI batch output/error JSONL file into per-request turns."""
+    out: Dict[str, Union[TurnResult, Exception]] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        custom_id = item["custom_id"]
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code", 200) >= 400:
+            out[custom_id] = RuntimeError(
+                f"Batch request {custom_id} failed: {item.get('error') or response.get('body')}"
+            )
+            continue
+
+        body = response["body"]
+        choice = body["choices"][0]
+        content = choice["message"].get("content") or ""
+
+        token_stats: Optional[TokenLogProbs] = None
+        logprobs = choice.get("logprobs")
+        if logprobs and logprobs.get("content"):
+            entries = [
+                (idx, entry["token"], entry["logprob"])
+                for idx, entry in enumerate(logprobs["content"])
+                if entry.get("token") is not None and entry.get("logprob") is not None
+            ]
+            if entries:
+                positions, tokens, lps = zip(*entries)
+                token_stats = TokenLogProbs(tokens, lps, positions)
+        out[custom_id] = (content, token_stats, body)
+    return out
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API (/v1/batches) for chat completions."""
+
+    def __init__(
+        self,
+        client: Any,
+        model_id: str,
+        supports_logprobs: bool,
+        gen_kwargs: Dict[str, Any],
+        poll_interval: float = 30.0,
+    ):
+        self._client = client
+        self._model_id = model_id
+        self._supports_logprobs = supports_logprobs
+        self._gen_kwargs = gen_kwargs
+        self.poll_interval = poll_interval
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        lines = [
+            json.dumps(
+                _openai_batch_line(
+                    cid, self._model_id, msgs, want and self._supports_logprobs, self._gen_kwargs
+                )
+            )
+            for cid, _, msgs, want in requests
+        ]
+        payload = io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+        batch_file = self._client.files.create(
+            file=("batch.jsonl", payload), purpose="batch"
+        )
+        job = self._client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return job.id
+
+    def is_done(self, job_id: str) -> bool:
+        status = self._client.batches.retrieve(job_id).status
+        if status in ("failed", "expired", "cancelled"):
+            raise RuntimeError(f"OpenAI batch {job_id} ended with status '{status}'.")
+        return status == "completed"
+
+    def results(self, job_id: str) -> Dict[str, Union[TurnResult, Exception]]:
+        job = self._client.batches.retrieve(job_id)
+        out: Dict[str, Union[TurnResult, Exception]] = {}
+        for file_id in (job.output_file_id, job.error_file_id):
+            if file_id:
+                out.update(_parse_openai_batch_output(self._client.files.content(file_id).text))
+        return out
+
+
+class AnthropicBatchBackend:
+    """Anthropic Message Batches API."""
+
+    def __init__(
+        self,
+        client: Any,
+        model_id: str,
+        gen_kwargs: Dict[str, Any],
+        poll_interval: float = 30.0,
+    ):
+        self._client = client
+        self._model_id = model_id
+        self._gen_kwargs = dict(gen_kwargs)
+        self._max_tokens = self._gen_kwargs.pop("max_tokens", 512)
+        self.poll_interval = poll_interval
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        batch = self._client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": cid,
+                    "params": {
+                        "model": self._model_id,
+                        **AnthropicChatClient._request_kwargs(msgs),
+                        "max_tokens": self._max_tokens,
+                        **self._gen_kwargs,
+                    },
+                }
+                for cid, _, msgs, _ in requests
+            ]
+        )
+        return batch.id
+
+    def is_done(self, job_id: str) -> bool:
+        return self._client.messages.batches.retrieve(job_id).processing_status == "ended"
+
+    def results(self, job_id: str) -> Dict[str, Union[TurnResult, Exception]]:
+        out: Dict[str, Union[TurnResult, Exception]] = {}
+        for entry in self._client.messages.batches.results(job_id):
+            result = entry.result
+            if result.type != "succeeded":
+                out[entry.custom_id] = RuntimeError(
+                    f"Batch request {entry.custom_id} {result.type}: "
+                    f"{getattr(result, 'error', None)}"
+                )
+                continue
+            text = "".join(
+                block.text
+                for block in result.message.content
+                if getattr(block, "type", None) == "text"
+            )
+            # Claude does not expose per-token logprobs
+            out[entry.custom_id] = (text, None, result.message)
+        return out
+
+
+class FileBatchBackend:
+    """
+    Local, file-based stand-in for a provider batch endpoint (offline testing).
+
+    Jobs are directories holding an OpenAI-format input.jsonl (each line also
+    records the request's run index). A job stays "in
+    progress" for `polls_until_done` polls, after which output.jsonl is written
+    in the OpenAI batch output format, so the same parsing path is exercised.
+    Replies come from a SimulatedChatClient built from `sim_config`.
+
+    Without `directory`, jobs go to a temporary directory that is removed by
+    close() (or on leaving a `with` block).
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Union[str, Path]] = None,
+        model_id: str = "simulated",
+        sim_config: Optional[Dict[str, Any]] = None,
+        gen_kwargs: Optional[Dict[str, Any]] = None,
+        polls_until_done: int = 1,
+        fail_custom_ids: Optional[List[str]] = None,
+    ):
+        self._tmpdir = (
+            tempfile.TemporaryDirectory(prefix="batch-jobs-") if directory is None else None
+        )
+        self.directory = Path(directory if self._tmpdir is None else self._tmpdir.name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._model_id = model_id
+        self._sim = SimulatedChatClient(sim_config or {"supports_logprobs": True})
+        self._gen_kwargs = gen_kwargs or {}
+        self._polls_until_done = polls_until_done
+        self._fail_once = set(fail_custom_ids or [])
+        self._polls: Dict[str, int] = {}
+        self.poll_interval = 0.0
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        job_id = f"batch_{uuid.uuid4().hex[:12]}"
+        job_dir = self.directory / job_id
+        job_dir.mkdir()
+        with open(job_dir / "input.jsonl", "w", encoding="utf-8") as fh:
+            for cid, run_index, msgs, want in requests:
+                line = _openai_batch_line(cid, self._model_id, msgs, want, self._gen_kwargs)
+                line["run_index"] = run_index
+                fh.write(json.dumps(line) + "\n")
+        self._polls[job_id] = 0
+        return job_id
+
+    def is_done(self, job_id: str) -> bool:
+        self._polls[job_id] += 1
+        if self._polls[job_id] < self._polls_until_done:
+            return False
+        if not (self.directory / job_id / "output.jsonl").exists():
+            self._process(job_id)
+        return True
+
+    def _process(self, job_id: str) -> None:
+        job_dir = self.directory / job_id
+        lines = []
+        with open(job_dir / "input.jsonl", "r", encoding="utf-8") as fh:
+            for raw_line in fh:
+                req = json.loads(raw_line)
+                cid = req["custom_id"]
+                if cid in self._fail_once:
+                    self._fail_once.discard(cid)
+                    lines.append({"custom_id": cid, "response": None,
+                                  "error": {"code": "server_error", "message": "injected"}})
+                    continue
+                body = req["body"]
+                text, token_stats, _ = self._sim.complete(
+                    body["messages"], bool(body.get("logprobs")), req["run_index"]
+                )
+                choice: Dict[str, Any] = {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }
+                if token_stats:
+                    choice["logprobs"] = {
+                        "content": [{"token": t.token, "logprob": t.logprob} for t in token_stats]
+                    }
+                lines.append({
+                    "custom_id": cid,
+                    "response": {
+                        "status_code": 200,
+                        "body": {"object": "chat.completion", "model": body["model"],
+                                 "choices": [choice]},
+                    },
+                    "error": None,
+                })
+        tmp = job_dir / "output.jsonl.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            for line in lines:
+                fh.write(json.dumps(line) + "\n")
+        tmp.replace(job_dir / "output.jsonl")
+
+    def results(self, job_id: str) -> Dict[str, Union[TurnResult, Exception]]:
+        text = (self.directory / job_id / "output.jsonl").read_text(encoding="utf-8")
+        return _parse_openai_batch_output(text)
+
+    def close(self) -> None:
+        """Remove the job directory if it was created by this backend."""
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+    def __enter__(self) -> "FileBatchBackend":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def make_batch_backend(
+    model_name: str,
+    api_key: Optional[str] = None,
+    **gen_kwargs: Any,
+) -> BatchBackend:
+    """
+    Backend for a MODEL_CONFIG entry: OpenAI / Anthropic batch APIs, or the
+    file stand-in for provider "simulated" or when the entry sets
+    "batch_backend": "file" (optionally with "batch_dir").
+
+    The provider backends use the SDK client of the shared chat client from
+    get_llm_client(), so batch jobs reuse its pooled connections.
+    """
+    cfg = _get_model_config(model_name)
+    provider = cfg.get("provider")
+    model_id = cfg.get("model_id", model_name)
+    poll_interval = float(cfg.get("batch_poll_interval", 30.0))
+
+    if provider == "simulated" or cfg.get("batch_backend") == "file":
+        sim_cfg = cfg if provider == "simulated" else {"supports_logprobs": True}
+        return FileBatchBackend(
+            cfg.get("batch_dir"), model_id=model_id, sim_config=sim_cfg, gen_kwargs=gen_kwargs
+        )
+    if provider not in ("openai", "anthropic"):
+        raise ValueError(f"Provider '{provider}' has no batch endpoint.")
+
+    # Batch calls do not go through our RateLimiter, so keep the SDK's own
+    # retries; with_options() shares the underlying HTTP client.
+    client = get_llm_client(model_name, api_key=api_key)._client.with_options(max_retries=2)
+    if provider == "openai":
+        return OpenAIBatchBackend(
+            client,
+            model_id,
+            bool(cfg.get("supports_logprobs", False)),
+            gen_kwargs,
+            poll_interval=poll_interval,
+        )
+    return AnthropicBatchBackend(client, model_id, gen_kwargs, poll_interval=poll_interval)
+
+
+# --- Driver --------------------------------------------------------------------------
+
+
+def _run_batch_job(
+    backend: BatchBackend, requests: List[BatchRequest], max_resubmits: int
+) -> Dict[str, TurnResult]:
+    """Submit, poll to completion, and resubmit failed requests a few times."""
+    done: Dict[str, TurnResult] = {}
+    pending = requests
+    for attempt in range(max_resubmits + 1):
+        job_id = backend.submit(pending)
+        while not backend.is_done(job_id):
+            time.sleep(backend.poll_interval)
+        results = backend.results(job_id)
+
+        failed: List[BatchRequest] = []
+        for req in pending:
+            res = results.get(req[0])
+            if res is None or isinstance(res, Exception):
+                failed.append(req)
+            else:
+                done[req[0]] = res
+        if not failed:
+            return done
+        pending = failed
+
+    errors = [str(results.get(req[0], "missing result")) for req in pending]
+    raise RuntimeError(
+        f"{len(pending)} batch request(s) still failing after {max_resubmits} "
+        f"resubmission(s): {errors[:3]}"
+    )
+
+
+def run_conversations_batch(
+    model_name: str,
+    user_prompts: List[str],
+    n_runs: int,
+    system_prompt: Optional[str] = None,
+    request_logprobs: Optional[List[bool]] = None,
+    api_key: Optional[str] = None,
+    backend: Optional[BatchBackend] = None,
+    max_resubmits: int = 2,
+    **gen_kwargs: Any,
+) -> List[ConversationResult]:
+    """
+    Generate n_runs conversations through a provider batch endpoint.
+
+    Turn t of every run is submitted as one batch job; once it has finished,
+    all conversations advance to turn t + 1 together. Returns the
+    ConversationResults in run order, shaped like run_conversation output.
+    """
+    if not user_prompts:
+        raise ValueError("user_prompts must contain at least one prompt string.")
+    owned = backend is None
+    if backend is None:
+        backend = make_batch_backend(model_name, api_key=api_key, **gen_kwargs)
+
+    flags = _normalize_logprob_flags(user_prompts, request_logprobs)
+    loops = [_chat_loop(model_name, user_prompts, system_prompt, flags) for _ in range(n_runs)]
+    states = [next(loop) for loop in loops]  # (messages, want_logprobs) per run
+    results: List[Optional[ConversationResult]] = [None] * n_runs
+
+    try:
+        for turn in range(len(user_prompts)):
+            requests = [
+                (f"run-{i}-turn-{turn}", i, list(messages), want)
+                for i, (messages, want) in enumerate(states)
+            ]
+            turn_results = _run_batch_job(backend, requests, max_resubmits)
+
+            for i, loop in enumerate(loops):
+                try:
+                    states[i] = loop.send(turn_results[f"run-{i}-turn-{turn}"])
+                except StopIteration as stop:
+                    results[i] = stop.value
+    finally:
+        close = getattr(backend, "close", None)
+        if owned and close is not None:
+            close()  # e.g. the temporary job directory of a FileBatchBackend
+
+    return [r for r in results if r is not None]
+
+
+__all__ = [
+    "BatchBackend",
+    "OpenAIBatchBackend",
+    "AnthropicBatchBackend",
+    "FileBatchBackend",
+    "make_batch_backend",
+    "run_conversations_batch",
+]
@@ -0,0 +1,299 @@
+# src/benchmark.py
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .client import (
+    HuggingFaceLocalClient,
+    InferenceProfile,
+    LocalModelCache,
+    _get_model_config,
+    torch,
+)
+from .lazy import LazyModule
+from .replicas import LocalReplicaPool
+from .scheduler import ContinuousBatchScheduler
+
+pd = LazyModule("pandas", "pandas package is not installed. Add 'pandas' to requirements.txt.")
+
+
+# --- Inference profile benchmark -----------------------------------------------------
+
+
+DEFAULT_BENCHMARK_PROFILES = ("default", "sdpa", "bf16", "int8")
+
+
+def benchmark_profiles(
+    model_name: str,
+    user_prompts: List[str],
+    profiles: Optional[Sequence[Any]] = None,
+    system_prompt: Optional[str] = None,
+    n_runs: int = 2,
+    warmup_runs: int = 1,
+    max_new_tokens: int = 64,
+    **gen_kwargs: Any,
+) -> "pd.DataFrame":
+    """
+    Tokens/sec of a local HuggingFace model under several InferenceProfiles.
+
+    Each profile loads the model fresh (the previous one is evicted), runs
+    `warmup_runs` conversations (this is where torch.compile compiles), then
+    times `n_runs` streamed conversations of the scenario (user_prompts +
+    system_prompt). Every turn generates exactly max_new_tokens unless
+    min_new_tokens or stop is passed (the default stop=False also disables the
+    role-marker stop strings), so profiles decode the same amount of work.
+
+    profiles: preset names, dicts or InferenceProfile objects
+    (default: DEFAULT_BENCHMARK_PROFILES). Thread settings are restored
+    afterwards.
+
+    Returns one row per profile with load_s, generated_tokens, total_s,
+    tokens_per_s, ttft_s_mean, decode_tokens_per_s_mean and speedup
+    (tokens_per_s relative to the first profile).
+    """
+    if not user_prompts:
+        raise ValueError("user_prompts must contain at least one prompt string.")
+    cfg = _get_model_config(model_name)
+    if cfg.get("provider") not in ("huggingface", "local", "llama_local"):
+        raise ValueError(f"Model '{model_name}' is not a local HuggingFace model.")
+
+    gen_kwargs.setdefault("min_new_tokens", max_new_tokens)
+    gen_kwargs.setdefault("stop", False)  # turn-marker stops are not held off by min_new_tokens
+    threads = torch.get_num_threads()
+    model_cache = LocalModelCache(max_models=1)
+    rows: List[Dict[str, Any]] = []
+    try:
+        for spec in profiles if profiles is not None else DEFAULT_BENCHMARK_PROFILES:
+            profile = InferenceProfile.coerce(spec)
+            torch.set_num_threads(threads)
+
+            started = time.perf_counter()
+            client = HuggingFaceLocalClient(
+                model_id=cfg.get("model_id", model_name),
+                device=cfg.get("device") or "cpu",
+                dtype=cfg.get("dtype"),
+                model_cache=model_cache,
+                reuse_kv_cache=bool(cfg.get("reuse_kv_cache", True)),
+                share_prefix_cache=False,  # keep runs independent of each other
+                inference_profile=profile,
+            )
+            load_s = time.perf_counter() - started
+
+            def run(run_index: int) -> Any:
+                return client.run_conversation(
+                    model_name,
+                    user_prompts,
+                    system_prompt,
+                    request_logprobs=[False],
+                    run_index=run_index,
+                    max_new_tokens=max_new_tokens,
+                    stream=True,
+                    **gen_kwargs,
+                )
+
+            for i in range(warmup_runs):
+                run(-1 - i)
+
+            generated = 0
+            ttfts: List[float] = []
+            decode_rates: List[float] = []
+            started = time.perf_counter()
+            for i in range(n_runs):
+                result = run(i)
+                for raw in result.raw_responses:
+                    generated += len(raw["generated_ids"])
+                for msg in result.assistant_messages:
+                    if msg.timing is None:
+                        continue
+                    if msg.timing.ttft_s is not None:
+                        ttfts.append(msg.timing.ttft_s)
+                    if msg.timing.decode_tokens_per_s is not None:
+                        decode_rates.append(msg.timing.decode_tokens_per_s)
+            total_s = time.perf_counter() - started
+
+            rows.append(
+                {
+                    "profile": spec if isinstance(spec, str) else profile.load_key,
+                    "load_key": profile.load_key,
+                    "dtype": client.dtype or "auto",
+                    "num_threads": torch.get_num_threads(),
+                    "load_s": load_s,
+                    "generated_tokens": generated,
+                    "total_s": total_s,
+                    "tokens_per_s": generated / total_s if total_s > 0 else float("nan"),
+                    "ttft_s_mean": sum(ttfts) / len(ttfts) if ttfts else float("nan"),
+                    "decode_tokens_per_s_mean": (
+                        sum(decode_rates) / len(decode_rates) if decode_rates else float("nan")
+                    ),
+                }
+            )
+            del client
+            model_cache.clear()
+    finally:
+        torch.set_num_threads(threads)
+
+    df = pd.DataFrame(rows).set_index("profile")
+    df["speedup"] = df["tokens_per_s"] / df["tokens_per_s"].iloc[0]
+    return df
+
+
+# --- Replica scaling benchmark -------------------------------------------------------
+
+
+def benchmark_replicas(
+    model_name: str,
+    user_prompts: List[str],
+    worker_counts: Sequence[int] = (1, 2, 4),
+    threads_per_worker: Optional[int] = None,
+    system_prompt: Optional[str] = None,
+    runs_per_worker: int = 4,
+    max_new_tokens: int = 64,
+    **gen_kwargs: Any,
+) -> "pd.DataFrame":
+    """
+    Aggregate tokens/sec of a LocalReplicaPool for several worker counts.
+
+    Each pool first runs one warm-up conversation per worker, then
+    runs_per_worker * n_workers conversations are timed end to end. With
+    threads_per_worker fixed, tokens_per_s should grow almost linearly with
+    the worker count until memory bandwidth runs out; efficiency is the
+    speedup over the first count divided by the growth in workers.
+
+    Returns one row per worker count with load_s, shared_weight_bytes,
+    generated_tokens, total_s, tokens_per_s, speedup and efficiency.
+    """
+    if not user_prompts:
+        raise ValueError("user_prompts must contain at least one prompt string.")
+    gen_kwargs.setdefault("min_new_tokens", max_new_tokens)
+    gen_kwargs.setdefault("stop", False)  # turn-marker stops are not held off by min_new_tokens
+    gen_kwargs.update(max_new_tokens=max_new_tokens, request_logprobs=[False])
+
+    rows: List[Dict[str, Any]] = []
+    for n_workers in worker_counts:
+        started = time.perf_counter()
+        with LocalReplicaPool(
+            model_name, n_workers=n_workers, threads_per_worker=threads_per_worker
+        ) as pool:
+            load_s = time.perf_counter() - started
+            pool.run(user_prompts, n_workers, system_prompt=system_prompt, **gen_kwargs)
+
+            n_runs = runs_per_worker * n_workers
+            started = time.perf_counter()
+            results = pool.run(user_prompts, n_runs, system_prompt=system_prompt, **gen_kwargs)
+            total_s = time.perf_counter() - started
+            generated = sum(
+                raw.get("num_generated_tokens", 0)
+                for result in results
+                for raw in result.raw_responses
+                if raw
+            )
+            rows.append(
+                {
+                    "n_workers": n_workers,
+                    "threads_per_worker": pool.threads_per_worker,
+                    "load_s": load_s,
+                    "shared_weight_bytes": pool.stats()["shared_weight_bytes"].iloc[0],
+                    "runs": n_runs,
+                    "generated_tokens": generated,
+                    "total_s": total_s,
+                    "tokens_per_s": generated / total_s if total_s > 0 else float("nan"),
+                }
+            )
+
+    df = pd.DataFrame(rows).set_index("n_workers")
+    df["speedup"] = df["tokens_per_s"] / df["tokens_per_s"].iloc[0]
+    df["efficiency"] = df["speedup"] / (df.index / df.index[0])
+    return df
+
+
+# --- Static vs continuous batching benchmark -----------------------------------------
+
+
+def benchmark_batching(
+    model_name: str,
+    user_prompts: List[str],
+    n_runs: int = 16,
+    batch_size: int = 8,
+    system_prompt: Optional[str] = None,
+    max_new_tokens: int = 256,
+    **gen_kwargs: Any,
+) -> "pd.DataFrame":
+    """
+    Tokens/sec of static vs continuous batching on the same n_runs conversations.
+
+    Use sampling and stop strings (e.g. do_sample=True, stop=[...]) so reply
+    lengths vary as they do in real scenarios: the static batch decodes until
+    the longest reply of each turn is done, the continuous scheduler refills
+    freed slots at every step. Both run one warm-up conversation first.
+
+    Returns one row per mode with generated_tokens, reply_tokens_mean/std,
+    total_s, tokens_per_s, mean_batch_size (continuous only) and speedup
+    (relative to static).
+    """
+    if not user_prompts:
+        raise ValueError("user_prompts must contain at least one prompt string.")
+    cfg = _get_model_config(model_name)
+    if cfg.get("provider") not in ("huggingface", "local", "llama_local"):
+        raise ValueError(f"Model '{model_name}' is not a local HuggingFace model.")
+
+    client = HuggingFaceLocalClient(
+        model_id=cfg.get("model_id", model_name),
+        device=cfg.get("device") or "cpu",
+        dtype=cfg.get("dtype"),
+        reuse_kv_cache=bool(cfg.get("reuse_kv_cache", True)),
+        share_prefix_cache=False,  # keep both modes independent of each other
+        inference_profile=cfg.get("inference_profile"),
+    )
+    gen_kwargs.update(
+        system_prompt=system_prompt, request_logprobs=[False], max_new_tokens=max_new_tokens
+    )
+
+    def static() -> List[Any]:
+        results: List[Any] = []
+        while len(results) < n_runs:
+            k = min(batch_size, n_runs - len(results))
+            results += client.run_conversations_batched(model_name, user_prompts, k, **gen_kwargs)
+        return results
+
+    scheduler = ContinuousBatchScheduler(
+        client, max_batch_size=batch_size, max_kv_bytes=cfg.get("max_kv_cache_bytes")
+    )
+
+    def continuous() -> List[Any]:
+        return scheduler.run(model_name, user_prompts, n_runs, **gen_kwargs)
+
+    client.run_conversation(model_name, user_prompts, run_index=-1, **gen_kwargs)
+    rows: List[Dict[str, Any]] = []
+    for mode, run in (("static", static), ("continuous", continuous)):
+        started = time.perf_counter()
+        results = run()
+        total_s = time.perf_counter() - started
+        lengths = [len(raw["generated_ids"]) for r in results for raw in r.raw_responses]
+        generated = sum(lengths)
+        rows.append(
+            {
+                "mode": mode,
+                "generated_tokens": generated,
+                "reply_tokens_mean": generated / len(lengths),
+                "reply_tokens_std": float(pd.Series(lengths).std()),
+                "total_s": total_s,
+                "tokens_per_s": generated / total_s if total_s > 0 else float("nan"),
+                "mean_batch_size": (
+                    scheduler.stats.mean_batch_size if mode == "continuous" else float("nan")
+                ),
+            }
+        )
+
+    df = pd.DataFrame(rows).set_index("mode")
+    df["speedup"] = df["tokens_per_s"] / df["tokens_per_s"].iloc[0]
+    return df
+
+
+__all__ = [
+    "DEFAULT_BENCHMARK_PROFILES",
+    "benchmark_batching",
+    "benchmark_profiles",
+    "benchmark_replicas",
+]
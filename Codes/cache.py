@@ -0,0 +1,198 @@
+# src/cache.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+# --- Persistent response cache -------------------------------------------------------
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of generated assistant turns.
+
+    Every entry is keyed by a stable SHA-256 hash of everything that determines a
+    reply: provider, model_id, the full message history, generation kwargs and the
+    run index (so the 100 runs of a scenario stay 100 distinct samples).
+
+    Layout: <directory>/<key[:2]>/<key>.json, one small JSON file per turn.
+
+    - Writes are atomic (temp file in the same directory + os.replace), so several
+      processes may fill the same cache concurrently; identical keys simply
+      overwrite each other with equivalent content.
+    - Reads bump the file's mtime, which serves as the LRU clock.
+    - Once the cache grows past max_bytes, the least recently used entries are
+      evicted until it is back under low_watermark * max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        max_bytes: int = 2 << 30,
+        low_watermark: float = 0.9,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.low_watermark = low_watermark
+        self._approx_bytes: Optional[int] = None  # lazily initialized by a scan
+        self._lock = threading.Lock()
+
+    # ---- keys -----------------------------------------------------------------------
+
+    @staticmethod
+    def make_key(**fields: Any) -> str:
+        """Stable hash of arbitrary JSON-like fields (dict order does not matter)."""
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=repr)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    # ---- get / put ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                value = json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return None  # unreadable / partially written by a foreign tool
+
+        try:
+            os.utime(path)  # LRU touch
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_bytes()
+            else:
+                self._approx_bytes += len(data)
+            over_budget = self._approx_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    # ---- maintenance ----------------------------------------------------------------
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    @property
+    def nbytes(self) -> int:
+        return self._scan_bytes()
+
+    def evict(self) -> int:
+        """Delete least recently used entries until under the low watermark."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * self.low_watermark)
+
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass  # another process evicted it first
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._approx_bytes = total
+        return removed
+
+    def compact(self, stale_tmp_seconds: float = 3600.0) -> int:
+        """
+        Remove stale temp files and unreadable entries, drop empty shard
+        directories, then enforce the size budget. Returns the number of files removed.
+        """
+        removed = 0
+        cutoff = time.time() - stale_tmp_seconds
+        for tmp in self.directory.glob("*/.tmp-*"):
+            try:
+                # young temp files may belong to a writer that is still running
+                if tmp.stat().st_mtime < cutoff:
+                    tmp.unlink()
+                    removed += 1
+            except OSError:
+                pass
+
+        for _, _, path in self._entries():
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    json.load(fh)
+            except (OSError, ValueError):
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+
+        for shard in self.directory.iterdir():
+            if shard.is_dir():
+                try:
+                    shard.rmdir()  # only succeeds when empty
+                except OSError:
+                    pass
+
+        if self._scan_bytes() > self.max_bytes:
+            removed += self.evict()
+        else:
+            with self._lock:
+                self._approx_bytes = None
+        return removed
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        self.compact(stale_tmp_seconds=0.0)
+
+
+__all__ = ["ResponseCache"]
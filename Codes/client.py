@@ -2,43 +2,64 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import copy
+import gc
+import gzip
+import hashlib
+import json
+import math
+import mmap
 import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Literal, Optional, Protocol, Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+)
 
 from dotenv import load_dotenv
 
+from .cache import ResponseCache
 from .config import MODEL_CONFIG  # expected to be a dict[str, dict[str, Any]]
+from .lazy import LazyModule
+from .ratelimit import RateLimiter, classify_error, estimate_tokens, get_rate_limiter
+from .telemetry import CallRecord, record_call, telemetry_enabled
 
 # --- Optional imports by provider ----------------------------------------------------
-
-try:  # OpenAI
-    from openai import OpenAI  # type: ignore
-except ImportError:  # pragma: no cover
-    OpenAI = None  # type: ignore
-
-try:  # Anthropic (Claude)
-    import anthropic  # type: ignore
-except ImportError:  # pragma: no cover
-    anthropic = None  # type: ignore
-
-try:  # Gemini (google-genai)
-    from google import genai  # type: ignore
-except ImportError:  # pragma: no cover
-    genai = None  # type: ignore
-
-try:  # Mistral API
-    from mistralai import Mistral  # type: ignore
-except ImportError:  # pragma: no cover
-    Mistral = None  # type: ignore
-
-try:  # HuggingFace local (LLaMA / Mistral / etc.)
-    import torch  # type: ignore
-    from transformers import AutoModelForCausalLM, AutoTokenizer  # type: ignore
-except ImportError:  # pragma: no cover
-    torch = None  # type: ignore
-    AutoModelForCausalLM = None  # type: ignore
-    AutoTokenizer = None  # type: ignore
+#
+# Every backend is imported on first use, so an API-only worker never pays for
+# torch / transformers and a local-only one never loads the provider SDKs.
+# Missing packages surface as ImportError when the matching client is created.
+
+openai = LazyModule("openai")
+# Shared HTTP transport (used by the OpenAI / Anthropic / Mistral SDKs)
+httpx = LazyModule(
+    "httpx", "httpx package is not installed. Add 'httpx' to requirements.txt."
+)
+anthropic = LazyModule("anthropic")  # Claude
+mistralai = LazyModule("mistralai")
+# HuggingFace local (LLaMA / Mistral / etc.)
+torch = LazyModule("torch")
+transformers = LazyModule("transformers")
+huggingface_hub = LazyModule("huggingface_hub")  # downloads for memory-mapped loading
+np = LazyModule("numpy", "numpy is required. Add 'numpy' to requirements.txt.")
 
 
 Role = Literal["system", "user", "assistant"]
@@ -56,18 +77,175 @@ class TokenLogProb:
     position: int  # token index in the generated message
 
 
+class TokenLogProbs:
+    """
+    Compact token log-probabilities of one generated message.
+
+    Holds a float32 array of log-probs, an int32 array of positions and a tuple
+    of interned token strings instead of one TokenLogProb object per token.
+    It still behaves like a read-only sequence of TokenLogProb (len, indexing,
+    iteration), so `[t.logprob for t in msg.token_logprobs]` keeps working, but
+    metrics should use the arrays or the vectorized reductions below.
+    """
+
+    __slots__ = ("tokens", "logprobs", "positions")
+
+    def __init__(
+        self,
+        tokens: Iterable[str],
+        logprobs: Any,
+        positions: Any = None,
+    ):
+        self.tokens: Tuple[str, ...] = tuple(sys.intern(str(t)) for t in tokens)
+        self.logprobs = np.asarray(logprobs, dtype=np.float32).reshape(-1)
+        self.positions = (
+            np.arange(len(self.tokens), dtype=np.int32)
+            if positions is None
+            else np.asarray(positions, dtype=np.int32).reshape(-1)
+        )
+        if not len(self.tokens) == len(self.logprobs) == len(self.positions):
+            raise ValueError(
+                "tokens, logprobs and positions must have the same length "
+                f"(got {len(self.tokens)}, {len(self.logprobs)}, {len(self.positions)})."
+            )
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[TokenLogProb]) -> "TokenLogProbs":
+        entries = list(entries)
+        return cls(
+            [t.token for t in entries],
+            [t.logprob for t in entries],
+            [t.position for t in entries],
+        )
+
+    @classmethod
+    def coerce(cls, value: Any) -> Optional["TokenLogProbs"]:
+        """TokenLogProbs for a TokenLogProbs / list of TokenLogProb; None if empty."""
+        if value is None:
+            return None
+        if not isinstance(value, cls):
+            value = cls.from_entries(value)
+        return value if len(value) else None
+
+    @classmethod
+    def concat(cls, parts: Iterable["TokenLogProbs"]) -> "TokenLogProbs":
+        parts = [p for p in parts if p is not None]
+        if not parts:
+            return cls((), ())
+        return cls(
+            [tok for p in parts for tok in p.tokens],
+            np.concatenate([p.logprobs for p in parts]),
+            np.concatenate([p.positions for p in parts]),
+        )
+
+    # ---- sequence view --------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return TokenLogProbs(
+                self.tokens[index], self.logprobs[index], self.positions[index]
+            )
+        return TokenLogProb(
+            token=self.tokens[index],
+            logprob=float(self.logprobs[index]),
+            position=int(self.positions[index]),
+        )
+
+    def __iter__(self) -> Iterator[TokenLogProb]:
+        for tok, lp, pos in zip(self.tokens, self.logprobs.tolist(), self.positions.tolist()):
+            yield TokenLogProb(token=tok, logprob=lp, position=pos)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, TokenLogProbs):
+            return (
+                self.tokens == other.tokens
+                and np.array_equal(self.logprobs, other.logprobs)
+                and np.array_equal(self.positions, other.positions)
+            )
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TokenLogProbs(n={len(self)}, mean={self.mean()})"
+
+    def to_records(self) -> List[List[Any]]:
+        """[[token, logprob, position], ...] (JSON-friendly)."""
+        return [
+            [tok, lp, pos]
+            for tok, lp, pos in zip(self.tokens, self.logprobs.tolist(), self.positions.tolist())
+        ]
+
+    # ---- reductions (float64 accumulation, None when empty) -------------------------
+
+    def sum(self) -> Optional[float]:
+        return float(self.logprobs.sum(dtype=np.float64)) if len(self) else None
+
+    def mean(self) -> Optional[float]:
+        return float(self.logprobs.mean(dtype=np.float64)) if len(self) else None
+
+    def min(self) -> Optional[float]:
+        """Log-prob of the least confident token."""
+        return float(self.logprobs.min()) if len(self) else None
+
+    def surprisal(self) -> Optional[float]:
+        """Mean negative log-prob of the chosen tokens (nats/token)."""
+        mean = self.mean()
+        return -mean if mean is not None else None
+
+    def perplexity(self) -> Optional[float]:
+        mean = self.mean()
+        return math.exp(-mean) if mean is not None else None
+
+
+@dataclass
+class MessageTiming:
+    """
+    Latency breakdown of one generated assistant message (streaming mode).
+
+    - queued_s: time spent in the rate limiter (throttling and retries) before
+      the request that succeeded was sent
+    - ttft_s: request sent -> first content token (provider queueing + prefill)
+    - total_s: request sent -> last token
+    - output_tokens: generated tokens (provider usage when reported)
+    """
+
+    ttft_s: Optional[float]
+    total_s: float
+    output_tokens: Optional[int] = None
+    queued_s: float = 0.0
+    started: float = field(default=0.0, repr=False)  # perf_counter() at send
+
+    @property
+    def decode_tokens_per_s(self) -> Optional[float]:
+        """Tokens per second after the first token (None if not measurable)."""
+        if self.ttft_s is None or not self.output_tokens or self.output_tokens < 2:
+            return None
+        decode_s = self.total_s - self.ttft_s
+        return (self.output_tokens - 1) / decode_s if decode_s > 0 else None
+
+
 @dataclass
 class MessageStats:
     """
     Representation of a single message in the conversation.
 
     Note: for user/system messages, tokens and token_logprobs will usually be None.
+    For assistant messages, tokens lists the tokens of token_logprobs.
+    timing is only set for assistant messages generated with stream=True; usage
+    only for assistant messages whose provider response reported token counts.
     """
 
     role: Role
     content: str
     tokens: Optional[List[str]] = None
-    token_logprobs: Optional[List[TokenLogProb]] = None
+    token_logprobs: Optional[TokenLogProbs] = None
+    timing: Optional[MessageTiming] = None
+    usage: Optional[Dict[str, int]] = None  # provider token counts (see _message_usage)
 
 
 @dataclass
@@ -77,7 +255,8 @@ class ConversationResult:
 
     - messages: full conversation (system, user, assistant, in order)
     - assistant_messages: subset of messages that were generated by the model
-    - raw_responses: provider-specific raw responses (one per assistant message)
+    - raw_responses: provider-specific raw responses (one per assistant message);
+      run_conversation / int_consist keep only a summary by default (see raw=)
     """
 
     model_name: str
@@ -85,12 +264,41 @@ class ConversationResult:
     assistant_messages: List[MessageStats]
     raw_responses: List[Any] = field(default_factory=list)
 
+    def usage_totals(self) -> Dict[str, int]:
+        """Token counts summed over all assistant messages (e.g. cache reads/writes)."""
+        totals: Dict[str, int] = {}
+        for msg in self.assistant_messages:
+            for key, value in (msg.usage or {}).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def assisted_decoding(self) -> Optional[Dict[str, float]]:
+        """
+        Acceptance rate, tokens per target forward pass and estimated speedup
+        of assisted (draft model) decoding, or None if it was not used.
+        """
+        totals = self.usage_totals()
+        if not totals.get("target_forwards"):
+            return None
+        draft = totals.get("draft_tokens", 0)
+        return {
+            "acceptance_rate": totals["accepted_draft_tokens"] / draft if draft else math.nan,
+            "tokens_per_target_forward": totals["output_tokens"] / totals["target_forwards"],
+            "speedup": (
+                totals["target_only_us"] / totals["generate_us"]
+                if totals.get("generate_us")
+                else math.nan
+            ),
+        }
+
 
 class LLMClient(Protocol):
     """
     Generic interface for an LLM client.
 
-    A concrete implementation (OpenAI, Anthropic, etc.) must implement run_conversation.
+    A concrete implementation (OpenAI, Anthropic, etc.) must implement run_conversation
+    and its asyncio counterpart run_conversation_async. Turns inside one conversation
+    are always generated in order; only separate conversations may run concurrently.
     """
 
     def run_conversation(
@@ -99,6 +307,20 @@ class LLMClient(Protocol):
         user_prompts: List[str],
         system_prompt: Optional[str] = None,
         request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        ...
+
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
         **gen_kwargs: Any,
     ) -> ConversationResult:
         ...
@@ -128,6 +350,17 @@ def _get_model_config(model_name: str) -> Dict[str, Any]:
         raise ValueError(f"Unknown model '{model_name}'. Check your config.py.") from exc
 
 
+_DOTENV_LOADED = False
+
+
+def _load_dotenv_once() -> None:
+    """Parse .env at most once per process; later lookups only hit os.environ."""
+    global _DOTENV_LOADED
+    if not _DOTENV_LOADED:
+        load_dotenv()
+        _DOTENV_LOADED = True
+
+
 def _resolve_api_key(cfg: Dict[str, Any], explicit_api_key: Optional[str]) -> str:
     """
     Resolve API key either from an explicit argument or from environment variables.
@@ -137,15 +370,19 @@ def _resolve_api_key(cfg: Dict[str, Any], explicit_api_key: Optional[str]) -> st
     if explicit_api_key:
         return explicit_api_key
 
-    load_dotenv()
+    _load_dotenv_once()
 
     provider = cfg.get("provider")
     env_var = cfg.get("env_var")
 
     # Providers that don't require API keys (e.g. local HuggingFace)
-    if provider in ("huggingface", "local", "llama_local"):
+    if provider in ("huggingface", "local", "llama_local", "simulated"):
         return ""
 
+    # Self-hosted servers usually accept any key, but the openai SDK needs one.
+    if provider == "openai_compatible":
+        return (os.getenv(env_var) if env_var else None) or "EMPTY"
+
     # Prefer per-model env var if configured
     if env_var:
         key = os.getenv(env_var)
@@ -206,9 +443,702 @@ def _normalize_logprob_flags(
     return request_logprobs
 
 
+# A single provider call: (history so far, want_logprobs) -> (text, token logprobs, raw).
+# Streamed turns append a fourth element, the MessageTiming of the call; a fifth
+# element, if present, holds extra usage counts (e.g. uploaded_bytes).
+TurnResult = Tuple[str, Optional[TokenLogProbs], Any]
+TimedTurnResult = Tuple[str, Optional[TokenLogProbs], Any, Optional[MessageTiming]]
+TurnFn = Callable[[List[Dict[str, str]], bool], TurnResult]
+AsyncTurnFn = Callable[[List[Dict[str, str]], bool], Awaitable[TurnResult]]
+
+
+def _chat_loop(
+    model_name: str,
+    user_prompts: List[str],
+    system_prompt: Optional[str],
+    request_logprobs: List[bool],
+):
+    """
+    Generator driving a chat-style conversation turn by turn.
+
+    Yields (messages, want_logprobs) before every assistant turn and expects the
+    caller to send back the TurnResult for that turn. The final ConversationResult
+    is returned via StopIteration.value. Sharing this between the sync and async
+    paths keeps message bookkeeping identical for both.
+    """
+    messages: List[Dict[str, str]] = []
+    result_messages: List[MessageStats] = []
+    assistant_messages: List[MessageStats] = []
+    raw_responses: List[Any] = []
+
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+        result_messages.append(MessageStats(role="system", content=system_prompt))
+
+    for idx, user_prompt in enumerate(user_prompts):
+        messages.append({"role": "user", "content": user_prompt})
+        result_messages.append(MessageStats(role="user", content=user_prompt))
+
+        turn = yield messages, request_logprobs[idx]
+        assistant_content, token_stats, raw = turn[:3]
+        token_stats = TokenLogProbs.coerce(token_stats)
+        raw_responses.append(raw)
+        messages.append({"role": "assistant", "content": assistant_content})
+
+        msg_stats = MessageStats(
+            role="assistant",
+            content=assistant_content,
+            tokens=list(token_stats.tokens) if token_stats else None,
+            token_logprobs=token_stats,
+            timing=turn[3] if len(turn) > 3 else None,
+            usage=_message_usage(raw, turn[4] if len(turn) > 4 else None),
+        )
+        result_messages.append(msg_stats)
+        assistant_messages.append(msg_stats)
+
+    return ConversationResult(
+        model_name=model_name,
+        messages=result_messages,
+        assistant_messages=assistant_messages,
+        raw_responses=raw_responses,
+    )
+
+
+def _turn_to_record(content: str, token_stats: Any) -> Dict[str, Any]:
+    """JSON-serializable form of a turn for the ResponseCache."""
+    token_stats = TokenLogProbs.coerce(token_stats)
+    return {
+        "content": content,
+        "token_logprobs": token_stats.to_records() if token_stats else None,
+    }
+
+
+def _turn_from_record(record: Dict[str, Any], key: str) -> TurnResult:
+    token_stats = None
+    if record.get("token_logprobs"):
+        tokens, logprobs, positions = zip(*record["token_logprobs"])
+        token_stats = TokenLogProbs(tokens, logprobs, positions)
+    # No provider response exists for a cache hit; record where it came from.
+    return record["content"], token_stats, {"cached": True, "cache_key": key}
+
+
+def _turn_cache_key(
+    response_cache: ResponseCache,
+    cache_scope: Dict[str, Any],
+    messages: Any,
+    want_logprobs: bool,
+) -> str:
+    return response_cache.make_key(
+        messages=messages, want_logprobs=want_logprobs, **cache_scope
+    )
+
+
+def _with_response_cache(
+    complete_turn: TurnFn,
+    response_cache: Optional[ResponseCache],
+    cache_scope: Dict[str, Any],
+) -> TurnFn:
+    """Serve turns from response_cache when possible, storing fresh ones."""
+    if response_cache is None:
+        return complete_turn
+
+    def cached_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+        key = _turn_cache_key(response_cache, cache_scope, messages, want_logprobs)
+        record = response_cache.get(key)
+        if record is not None:
+            return _turn_from_record(record, key)
+        turn = complete_turn(messages, want_logprobs)
+        response_cache.put(key, _turn_to_record(turn[0], turn[1]))
+        return turn
+
+    return cached_turn
+
+
+def _with_response_cache_async(
+    complete_turn: AsyncTurnFn,
+    response_cache: Optional[ResponseCache],
+    cache_scope: Dict[str, Any],
+) -> AsyncTurnFn:
+    if response_cache is None:
+        return complete_turn
+
+    async def cached_turn(
+        messages: List[Dict[str, str]], want_logprobs: bool
+    ) -> TurnResult:
+        key = _turn_cache_key(response_cache, cache_scope, messages, want_logprobs)
+        record = response_cache.get(key)
+        if record is not None:
+            return _turn_from_record(record, key)
+        turn = await complete_turn(messages, want_logprobs)
+        response_cache.put(key, _turn_to_record(turn[0], turn[1]))
+        return turn
+
+    return cached_turn
+
+
+# Default requests in flight to one OpenAI-compatible server.
+_SERVER_CONCURRENCY = 16
+
+
+def _rate_limiter(model_name: str) -> RateLimiter:
+    """Shared limiter for a MODEL_CONFIG entry (retries always; limits if configured)."""
+    cfg = _get_model_config(model_name)
+    if cfg.get("provider") == "openai_compatible":
+        # Every model served from one base_url competes for the same batch slots,
+        # and a local server needs no slow start: fixed limit per server.
+        limit = int(cfg.get("max_concurrency", _SERVER_CONCURRENCY))
+        rate_limits = dict(
+            {"initial_concurrency": limit, "max_concurrency": limit},
+            **(cfg.get("rate_limits") or {}),
+        )
+        return get_rate_limiter(("openai_compatible", cfg.get("base_url")), rate_limits)
+    return get_rate_limiter((cfg.get("provider"), model_name), cfg.get("rate_limits"))
+
+
+def _usage_tokens(raw: Any) -> Optional[float]:
+    """Total tokens billed for one provider response, if the response reports it."""
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k, None))
+    total = get("total_tokens")
+    if total is None:
+        parts = [get(k) for k in ("input_tokens", "output_tokens")]
+        if all(p is None for p in parts):
+            return None
+        total = sum(p or 0 for p in parts)
+    return float(total)
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, Any]]:
+    if usage is None or isinstance(usage, dict):
+        return usage
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return {k: v for k, v in vars(usage).items() if not k.startswith("_")}
+
+
+_USAGE_KEYS = (
+    "input_tokens",
+    "output_tokens",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+
+def _message_usage(
+    raw: Any, extra: Optional[Dict[str, int]] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Flat token counts of one provider response, for MessageStats.usage.
+
+    Anthropic reports prompt-cache activity as cache_read_input_tokens /
+    cache_creation_input_tokens; OpenAI's cached_tokens (chat completions and
+    Responses API) is mapped to cache_read_input_tokens as well. `extra` holds
+    client-side counts such as uploaded_bytes.
+    """
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    data = _usage_dict(usage) or {}
+    out = {
+        key: int(value)
+        for key, value in data.items()
+        if key in _USAGE_KEYS and isinstance(value, (int, float))
+    }
+    for details_key in ("prompt_tokens_details", "input_tokens_details"):
+        details = _usage_dict(data.get(details_key))
+        if details and details.get("cached_tokens") is not None:
+            out["cache_read_input_tokens"] = int(details["cached_tokens"])
+    if extra:
+        out.update(extra)
+    return out or None
+
+
+def _payload_bytes(body: Dict[str, Any]) -> int:
+    """Size of a JSON request body as sent over the wire (approximately)."""
+    return len(json.dumps(body, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def _estimated_turn_tokens(messages: List[Dict[str, str]], scope: Dict[str, Any]) -> float:
+    gen_kwargs = scope.get("gen_kwargs") or {}
+    max_out = gen_kwargs.get("max_tokens") or gen_kwargs.get("max_completion_tokens") or 0
+    return float(estimate_tokens("".join(m["content"] for m in messages)) + max_out)
+
+
+def _record_queue_time(turn: Any, entered: float) -> None:
+    """Set queued_s on a streamed turn: limiter entry -> successful request sent."""
+    timing = turn[3] if len(turn) > 3 else None
+    if timing is not None:
+        timing.queued_s = max(0.0, timing.started - entered)
+
+
+def _with_rate_limit(
+    complete_turn: TurnFn, rate_limiter: Optional[RateLimiter], scope: Dict[str, Any]
+) -> TurnFn:
+    """Throttle and retry provider calls through the model's RateLimiter."""
+    if rate_limiter is None:
+        return complete_turn
+
+    def limited_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+        entered = time.perf_counter()
+        turn = rate_limiter.call(
+            lambda: complete_turn(messages, want_logprobs),
+            estimated_tokens=_estimated_turn_tokens(messages, scope),
+            used_tokens=lambda turn: _usage_tokens(turn[2]),
+        )
+        _record_queue_time(turn, entered)
+        return turn
+
+    return limited_turn
+
+
+def _with_rate_limit_async(
+    complete_turn: AsyncTurnFn, rate_limiter: Optional[RateLimiter], scope: Dict[str, Any]
+) -> AsyncTurnFn:
+    if rate_limiter is None:
+        return complete_turn
+
+    async def limited_turn(
+        messages: List[Dict[str, str]], want_logprobs: bool
+    ) -> TurnResult:
+        entered = time.perf_counter()
+        turn = await rate_limiter.call_async(
+            lambda: complete_turn(messages, want_logprobs),
+            estimated_tokens=_estimated_turn_tokens(messages, scope),
+            used_tokens=lambda turn: _usage_tokens(turn[2]),
+        )
+        _record_queue_time(turn, entered)
+        return turn
+
+    return limited_turn
+
+
+# --- Call telemetry ------------------------------------------------------------------
+
+
+class _CallProbe:
+    """Provider attempts of the current turn, filled in below the rate limiter."""
+
+    def __init__(self) -> None:
+        self.attempts = 0
+        self.attempt_s = 0.0
+
+    def reset(self) -> None:
+        self.attempts = 0
+        self.attempt_s = 0.0
+
+
+def _with_attempt_probe(complete_turn: TurnFn, probe: Optional[_CallProbe]) -> TurnFn:
+    if probe is None:
+        return complete_turn
+
+    def probed_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+        probe.attempts += 1
+        started = time.perf_counter()
+        try:
+            return complete_turn(messages, want_logprobs)
+        finally:
+            probe.attempt_s = time.perf_counter() - started
+
+    return probed_turn
+
+
+def _with_attempt_probe_async(
+    complete_turn: AsyncTurnFn, probe: Optional[_CallProbe]
+) -> AsyncTurnFn:
+    if probe is None:
+        return complete_turn
+
+    async def probed_turn(
+        messages: List[Dict[str, str]], want_logprobs: bool
+    ) -> TurnResult:
+        probe.attempts += 1
+        started = time.perf_counter()
+        try:
+            return await complete_turn(messages, want_logprobs)
+        finally:
+            probe.attempt_s = time.perf_counter() - started
+
+    return probed_turn
+
+
+def _record_turn(
+    model_name: str,
+    scope: Dict[str, Any],
+    turn_index: int,
+    started: float,
+    turn: Any = None,
+    error: Optional[BaseException] = None,
+    attempts: int = 1,
+    attempt_s: Optional[float] = None,
+) -> None:
+    """Report one assistant turn (finished or failed) to the telemetry registries."""
+    end_to_end = time.perf_counter() - started
+    usage: Dict[str, int] = {}
+    cache_hit = False
+    if turn is not None:
+        raw = turn[2]
+        cache_hit = isinstance(raw, dict) and bool(raw.get("cached"))
+        usage = _message_usage(raw, turn[4] if len(turn) > 4 else None) or {}
+    if error is not None:
+        status = classify_error(error)
+    else:
+        status = "cache_hit" if cache_hit else "ok"
+    record_call(
+        CallRecord(
+            model=model_name,
+            provider=scope.get("provider"),
+            run_index=int(scope.get("run_index", 0)),
+            turn_index=turn_index,
+            status=status,
+            latency_s=end_to_end if attempt_s is None else attempt_s,
+            end_to_end_s=end_to_end,
+            retries=max(0, attempts - 1),
+            cache_hit=cache_hit,
+            input_tokens=usage.get("input_tokens", usage.get("prompt_tokens")),
+            output_tokens=usage.get("output_tokens", usage.get("completion_tokens")),
+            cache_read_tokens=usage.get("cache_read_input_tokens"),
+            error=type(error).__name__ if error is not None else None,
+        )
+    )
+
+
+def _turn_index(messages: List[Dict[str, str]]) -> int:
+    return sum(1 for m in messages if m["role"] == "user") - 1
+
+
+def _with_telemetry(
+    complete_turn: TurnFn, probe: Optional[_CallProbe], model_name: str, scope: Dict[str, Any]
+) -> TurnFn:
+    """Record every turn (outermost wrapper, so cache hits are seen too)."""
+    if probe is None:
+        return complete_turn
+
+    def recorded_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+        probe.reset()
+        started = time.perf_counter()
+        try:
+            turn = complete_turn(messages, want_logprobs)
+        except Exception as exc:
+            _record_turn(
+                model_name, scope, _turn_index(messages), started,
+                error=exc, attempts=probe.attempts, attempt_s=probe.attempt_s,
+            )
+            raise
+        _record_turn(
+            model_name, scope, _turn_index(messages), started,
+            turn=turn, attempts=probe.attempts, attempt_s=probe.attempt_s,
+        )
+        return turn
+
+    return recorded_turn
+
+
+def _with_telemetry_async(
+    complete_turn: AsyncTurnFn,
+    probe: Optional[_CallProbe],
+    model_name: str,
+    scope: Dict[str, Any],
+) -> AsyncTurnFn:
+    if probe is None:
+        return complete_turn
+
+    async def recorded_turn(
+        messages: List[Dict[str, str]], want_logprobs: bool
+    ) -> TurnResult:
+        probe.reset()
+        started = time.perf_counter()
+        try:
+            turn = await complete_turn(messages, want_logprobs)
+        except Exception as exc:
+            _record_turn(
+                model_name, scope, _turn_index(messages), started,
+                error=exc, attempts=probe.attempts, attempt_s=probe.attempt_s,
+            )
+            raise
+        _record_turn(
+            model_name, scope, _turn_index(messages), started,
+            turn=turn, attempts=probe.attempts, attempt_s=probe.attempt_s,
+        )
+        return turn
+
+    return recorded_turn
+
+
+def _run_chat_turns(
+    model_name: str,
+    user_prompts: List[str],
+    system_prompt: Optional[str],
+    request_logprobs: List[bool],
+    complete_turn: TurnFn,
+    response_cache: Optional[ResponseCache] = None,
+    cache_scope: Optional[Dict[str, Any]] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> ConversationResult:
+    """
+    Run all turns of a chat conversation with a blocking provider call.
+
+    cache_scope holds the non-message parts of the cache key (provider,
+    model_id, gen_kwargs, run_index). Cache hits never reach the rate limiter.
+    Each turn is reported to the telemetry registries (see telemetry.py).
+    """
+    scope = cache_scope or {}
+    probe = _CallProbe() if telemetry_enabled() else None
+    complete_turn = _with_attempt_probe(complete_turn, probe)
+    complete_turn = _with_rate_limit(complete_turn, rate_limiter, scope)
+    complete_turn = _with_response_cache(complete_turn, response_cache, scope)
+    complete_turn = _with_telemetry(complete_turn, probe, model_name, scope)
+    loop = _chat_loop(model_name, user_prompts, system_prompt, request_logprobs)
+    try:
+        messages, want_logprobs = next(loop)
+        while True:
+            messages, want_logprobs = loop.send(complete_turn(messages, want_logprobs))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _run_chat_turns_async(
+    model_name: str,
+    user_prompts: List[str],
+    system_prompt: Optional[str],
+    request_logprobs: List[bool],
+    complete_turn: AsyncTurnFn,
+    response_cache: Optional[ResponseCache] = None,
+    cache_scope: Optional[Dict[str, Any]] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> ConversationResult:
+    """Async counterpart of _run_chat_turns; turns are still awaited in order."""
+    scope = cache_scope or {}
+    probe = _CallProbe() if telemetry_enabled() else None
+    complete_turn = _with_attempt_probe_async(complete_turn, probe)
+    complete_turn = _with_rate_limit_async(complete_turn, rate_limiter, scope)
+    complete_turn = _with_response_cache_async(complete_turn, response_cache, scope)
+    complete_turn = _with_telemetry_async(complete_turn, probe, model_name, scope)
+    loop = _chat_loop(model_name, user_prompts, system_prompt, request_logprobs)
+    try:
+        messages, want_logprobs = next(loop)
+        while True:
+            turn = await complete_turn(messages, want_logprobs)
+            messages, want_logprobs = loop.send(turn)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _cache_scope(
+    provider: str, model_id: str, gen_kwargs: Dict[str, Any], run_index: int
+) -> Dict[str, Any]:
+    return {
+        "provider": provider,
+        "model_id": model_id,
+        "gen_kwargs": gen_kwargs,
+        "run_index": run_index,
+    }
+
+
+# --- Streaming / timing --------------------------------------------------------------
+
+
+def _pop_stream(model_name: str, gen_kwargs: Dict[str, Any]) -> bool:
+    """Pop the `stream` flag (default: MODEL_CONFIG[model]["stream"], else False)."""
+    if "stream" in gen_kwargs:
+        return bool(gen_kwargs.pop("stream"))
+    return bool(_get_model_config(model_name).get("stream", False))
+
+
+class _TurnTimer:
+    """Wall-clock timestamps of one streamed request."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.first_token: Optional[float] = None
+
+    def mark_token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def finish(self, output_tokens: Optional[int]) -> MessageTiming:
+        return MessageTiming(
+            ttft_s=None if self.first_token is None else self.first_token - self.started,
+            total_s=time.perf_counter() - self.started,
+            output_tokens=output_tokens,
+            started=self.started,
+        )
+
+
+class _ChatStreamState:
+    """
+    Assembles an OpenAI-style chat completion stream (OpenAI, Mistral) into the
+    same (text, token logprobs, raw) a non-streamed call produces.
+    """
+
+    def __init__(self, timer: _TurnTimer):
+        self.timer = timer
+        self.parts: List[str] = []
+        self.tokens: List[str] = []
+        self.logprobs: List[float] = []
+        self.usage: Any = None
+        self.finish_reason: Optional[str] = None
+        self.id: Optional[str] = None
+        self.model: Optional[str] = None
+
+    def add(self, chunk: Any) -> None:
+        self.id = getattr(chunk, "id", None) or self.id
+        self.model = getattr(chunk, "model", None) or self.model
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+
+        for choice in getattr(chunk, "choices", None) or []:
+            text = getattr(choice.delta, "content", None)
+            if isinstance(text, list):
+                text = "".join(getattr(part, "text", "") or "" for part in text)
+            if text:
+                self.timer.mark_token()
+                self.parts.append(text)
+
+            logprobs = getattr(choice, "logprobs", None)
+            for item in getattr(logprobs, "content", None) or []:
+                token = getattr(item, "token", None)
+                lp = getattr(item, "logprob", None)
+                if token is None or lp is None:
+                    continue
+                self.tokens.append(token)
+                self.logprobs.append(lp)
+            if getattr(choice, "finish_reason", None):
+                self.finish_reason = choice.finish_reason
+
+    def result(self) -> TimedTurnResult:
+        usage = _usage_dict(self.usage)
+        output_tokens = (usage or {}).get("completion_tokens")
+        if output_tokens is None and self.tokens:
+            output_tokens = len(self.tokens)
+        raw = {
+            "id": self.id,
+            "model": self.model,
+            "finish_reason": self.finish_reason,
+            "usage": usage,
+            "streamed": True,
+        }
+        return (
+            "".join(self.parts),
+            TokenLogProbs(self.tokens, self.logprobs) if self.tokens else None,
+            raw,
+            self.timer.finish(output_tokens),
+        )
+
+
+# --- Pooled HTTP transport -----------------------------------------------------------
+
+
+class HTTPPool:
+    """
+    Keep-alive HTTP connection pool shared by the SDK clients of all providers.
+
+    One httpx.Client serves every blocking call. httpx.AsyncClient connections are
+    bound to the event loop that opened them, so one async client is kept per loop
+    (each int_consist(concurrency=...) call runs its own loop).
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 600.0,
+    ):
+        if not httpx.available():
+            raise ImportError(
+                "httpx package is not installed. Add 'httpx' to requirements.txt."
+            )
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = timeout
+        self._sync_client: Optional[Any] = None
+        self._async_clients: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def sync_client(self) -> Any:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(limits=self._limits, timeout=self._timeout)
+            return self._sync_client
+
+    def async_client(self) -> Any:
+        """Return the httpx.AsyncClient for the currently running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Drop clients whose loop is gone; their sockets cannot be reused.
+            for old_loop in [lp for lp in self._async_clients if lp.is_closed()]:
+                del self._async_clients[old_loop]
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=self._limits, timeout=self._timeout)
+                self._async_clients[loop] = client
+            return client
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+            # Async clients can only be closed from their own loop; once that loop
+            # has finished, dropping the reference releases the sockets.
+            self._async_clients.clear()
+
+
+class _PerLoop:
+    """Lazily build one object per running event loop (for async SDK clients)."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._loop: Any = None
+        self._value: Any = None
+
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._value = self._factory()
+            self._loop = loop
+        return self._value
+
+
 # --- OpenAI client -------------------------------------------------------------------
 
 
+@dataclass
+class _ResponseChain:
+    """Server-side conversation state of one run (OpenAI Responses API)."""
+
+    response_id: Optional[str] = None
+    synced: int = 0  # leading messages already held by the server
+
+
+# A 400 means "no Responses API here" only if it calls the endpoint or one of the
+# server-state parameters unsupported; any other 400 is a real request error.
+_UNSUPPORTED_MARKERS = (
+    "not supported",
+    "unsupported",
+    "unrecognized request argument",
+    "unknown parameter",
+    "invalid url",
+)
+_SERVER_STATE_TERMS = re.compile(r"\b(responses|store|previous_response_id)\b")
+
+
+def _error_detail(exc: BaseException) -> str:
+    """Lower-cased message, code and param of an SDK error (for matching)."""
+    parts = [str(exc)]
+    body = getattr(exc, "body", None)
+    error = body.get("error", body) if isinstance(body, dict) else None
+    if isinstance(error, dict):
+        parts += [str(error.get(key) or "") for key in ("code", "param", "message")]
+    return " ".join(parts).lower()
+
+
 class OpenAIChatClient:
     """
     Concrete LLM client for OpenAI chat models.
@@ -217,14 +1147,45 @@ class OpenAIChatClient:
         - gpt-3.5-turbo, gpt-4.1, gpt-5.1-thinking, etc.
 
     Per-model logprob support is controlled by `supports_logprobs` in config.py.
+
+    With "server_state": True in MODEL_CONFIG, turns are chained through the
+    Responses API (previous_response_id), so each request uploads only the new
+    user message instead of the whole history. If the endpoint is not
+    available (older SDK, OpenAI-compatible servers) the client falls back to
+    full-history chat completions; if a stored response has expired, the turn
+    is re-sent with the full history. Every assistant message records
+    uploaded_bytes and input_tokens in MessageStats.usage in both modes.
     """
 
-    def __init__(self, api_key: str):
-        if OpenAI is None:
+    provider = "openai"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        http_pool: Optional[HTTPPool] = None,
+    ):
+        if not openai.available():
             raise ImportError(
                 "openai package is not installed. Add 'openai' to requirements.txt."
             )
-        self._client = OpenAI(api_key=api_key)
+        # Retries are handled by our RateLimiter, so SDK-level retries are off.
+        self._client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=http_pool.sync_client() if http_pool else None,
+        )
+        self._async_client = _PerLoop(
+            lambda: openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=http_pool.async_client() if http_pool else None,
+            )
+        )
+        # model ids whose endpoint rejected the Responses API (use full history)
+        self._no_server_state: set = set()
 
     def run_conversation(
         self,
@@ -232,64 +1193,237 @@ class OpenAIChatClient:
         user_prompts: List[str],
         system_prompt: Optional[str] = None,
         request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
         **gen_kwargs: Any,
     ) -> ConversationResult:
         if not user_prompts:
             raise ValueError("user_prompts must contain at least one prompt string.")
 
         request_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        model_id, supports_logprobs = self._model_settings(model_name)
+        stream = _pop_stream(model_name, gen_kwargs)
+        chain = self._response_chain(model_name, stream)
+
+        def complete_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+            want_logprobs = want_logprobs and supports_logprobs
+            if chain is not None and model_id not in self._no_server_state:
+                body = self._responses_body(model_id, messages, want_logprobs, gen_kwargs, chain)
+                try:
+                    response = self._client.responses.create(**body)
+                except Exception as exc:
+                    if not self._server_state_fallback(exc, body, chain, model_id):
+                        raise
+                else:
+                    return self._responses_turn(response, body, messages, chain)
+                if model_id not in self._no_server_state:  # expired chain: full history
+                    return complete_turn(messages, want_logprobs)
+
+            body = self._chat_body(model_id, messages, want_logprobs, gen_kwargs)
+            if stream:
+                state = _ChatStreamState(_TurnTimer())
+                for chunk in self._client.chat.completions.create(
+                    **body, stream=True, stream_options={"include_usage": True}
+                ):
+                    state.add(chunk)
+                return state.result() + ({"uploaded_bytes": _payload_bytes(body)},)
+
+            response = self._client.chat.completions.create(**body)
+            content, token_stats = self._extract_message_and_logprobs(response)
+            return content, token_stats, response, None, {"uploaded_bytes": _payload_bytes(body)}
+
+        return _run_chat_turns(
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            complete_turn,
+            response_cache,
+            _cache_scope(self.provider, model_id, gen_kwargs, run_index),
+            _rate_limiter(model_name),
+        )
 
-        cfg = _get_model_config(model_name)
-        model_id = cfg.get("model_id", model_name)
-        supports_logprobs = bool(cfg.get("supports_logprobs", False))
-
-        messages: List[Dict[str, str]] = []
-        result_messages: List[MessageStats] = []
-        assistant_messages: List[MessageStats] = []
-        raw_responses: List[Any] = []
-
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            result_messages.append(MessageStats(role="system", content=system_prompt))
-
-        for idx, user_prompt in enumerate(user_prompts):
-            messages.append({"role": "user", "content": user_prompt})
-            result_messages.append(MessageStats(role="user", content=user_prompt))
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
 
-            want_logprobs = request_logprobs[idx] and supports_logprobs
+        request_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        model_id, supports_logprobs = self._model_settings(model_name)
+        stream = _pop_stream(model_name, gen_kwargs)
+        chain = self._response_chain(model_name, stream)
+
+        async def complete_turn(
+            messages: List[Dict[str, str]], want_logprobs: bool
+        ) -> TurnResult:
+            want_logprobs = want_logprobs and supports_logprobs
+            client = self._async_client.get()
+            if chain is not None and model_id not in self._no_server_state:
+                body = self._responses_body(model_id, messages, want_logprobs, gen_kwargs, chain)
+                try:
+                    response = await client.responses.create(**body)
+                except Exception as exc:
+                    if not self._server_state_fallback(exc, body, chain, model_id):
+                        raise
+                else:
+                    return self._responses_turn(response, body, messages, chain)
+                if model_id not in self._no_server_state:  # expired chain: full history
+                    return await complete_turn(messages, want_logprobs)
+
+            body = self._chat_body(model_id, messages, want_logprobs, gen_kwargs)
+            if stream:
+                state = _ChatStreamState(_TurnTimer())
+                async for chunk in await client.chat.completions.create(
+                    **body, stream=True, stream_options={"include_usage": True}
+                ):
+                    state.add(chunk)
+                return state.result() + ({"uploaded_bytes": _payload_bytes(body)},)
+
+            response = await client.chat.completions.create(**body)
+            content, token_stats = self._extract_message_and_logprobs(response)
+            return content, token_stats, response, None, {"uploaded_bytes": _payload_bytes(body)}
+
+        return await _run_chat_turns_async(
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            complete_turn,
+            response_cache,
+            _cache_scope(self.provider, model_id, gen_kwargs, run_index),
+            _rate_limiter(model_name),
+        )
 
-            response = self._client.chat.completions.create(
-                model=model_id,
-                messages=messages,
-                logprobs=want_logprobs or None,  # type: ignore[arg-type]
-                top_logprobs=1 if want_logprobs else None,
-                **gen_kwargs,
-            )
-            raw_responses.append(response)
+    @staticmethod
+    def _model_settings(model_name: str) -> Tuple[str, bool]:
+        cfg = _get_model_config(model_name)
+        return cfg.get("model_id", model_name), bool(cfg.get("supports_logprobs", False))
+
+    def _response_chain(self, model_name: str, stream: bool) -> Optional[_ResponseChain]:
+        """A fresh chain when server_state is enabled for the model, else None."""
+        if not _get_model_config(model_name).get("server_state", False):
+            return None
+        if stream:
+            raise ValueError("stream=True is not supported together with server_state.")
+        if not hasattr(self._client, "responses"):
+            return None  # SDK without the Responses API
+        return _ResponseChain()
 
-            assistant_content, token_stats = self._extract_message_and_logprobs(response)
-            messages.append({"role": "assistant", "content": assistant_content})
+    @staticmethod
+    def _chat_body(
+        model_id: str,
+        messages: List[Dict[str, str]],
+        want_logprobs: bool,
+        gen_kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        return dict(
+            model=model_id,
+            messages=messages,
+            logprobs=want_logprobs or None,
+            top_logprobs=1 if want_logprobs else None,
+            **gen_kwargs,
+        )
 
-            msg_stats = MessageStats(
-                role="assistant",
-                content=assistant_content,
-                tokens=[t.token for t in token_stats] if token_stats else None,
-                token_logprobs=token_stats if token_stats else None,
-            )
-            result_messages.append(msg_stats)
-            assistant_messages.append(msg_stats)
+    @staticmethod
+    def _responses_body(
+        model_id: str,
+        messages: List[Dict[str, str]],
+        want_logprobs: bool,
+        gen_kwargs: Dict[str, Any],
+        chain: _ResponseChain,
+    ) -> Dict[str, Any]:
+        """Responses API request carrying only what the server does not hold yet."""
+        body: Dict[str, Any] = {"model": model_id, "store": True}
+        if chain.response_id is not None and chain.synced <= len(messages):
+            body["previous_response_id"] = chain.response_id
+            body["input"] = messages[chain.synced:]
+        else:
+            body["input"] = messages
+
+        for key, value in gen_kwargs.items():
+            if key in ("max_tokens", "max_completion_tokens"):
+                body["max_output_tokens"] = value
+            else:
+                body[key] = value
+        if want_logprobs:
+            body["include"] = ["message.output_text.logprobs"]
+            body["top_logprobs"] = 1
+        return body
+
+    def _server_state_fallback(
+        self, exc: BaseException, body: Dict[str, Any], chain: _ResponseChain, model_id: str
+    ) -> bool:
+        """
+        Decide how to continue after a failed Responses API call. Returns False
+        when the error should propagate (bad parameters, context overflow,
+        content policy, rate limits, server errors, ...).
+        """
+        status = getattr(exc, "status_code", None)
+        detail = _error_detail(exc)
+        if "previous_response_id" in body:
+            if status == 404 or (status == 400 and "previous_response" in detail):
+                # stored response expired or was not stored: resend the full history
+                chain.response_id = None
+                chain.synced = 0
+                return True
+            return False
+        if status in (404, 405, 501) or (
+            status == 400
+            and any(marker in detail for marker in _UNSUPPORTED_MARKERS)
+            and _SERVER_STATE_TERMS.search(detail) is not None
+        ):
+            self._no_server_state.add(model_id)
+            return True
+        return False
+
+    def _responses_turn(
+        self,
+        response: Any,
+        body: Dict[str, Any],
+        messages: List[Dict[str, str]],
+        chain: _ResponseChain,
+    ) -> TurnResult:
+        # the stored response holds the full input plus the assistant reply
+        chain.response_id = response.id
+        chain.synced = len(messages) + 1
+        content, token_stats = self._extract_response_output(response)
+        return content, token_stats, response, None, {"uploaded_bytes": _payload_bytes(body)}
 
-        return ConversationResult(
-            model_name=model_name,
-            messages=result_messages,
-            assistant_messages=assistant_messages,
-            raw_responses=raw_responses,
-        )
+    @staticmethod
+    def _extract_response_output(
+        response: Any,
+    ) -> Tuple[str, Optional[TokenLogProbs]]:
+        text_parts: List[str] = []
+        tokens: List[str] = []
+        logprobs: List[float] = []
+        for item in getattr(response, "output", None) or []:
+            if getattr(item, "type", None) != "message":
+                continue
+            for part in getattr(item, "content", None) or []:
+                if getattr(part, "type", None) != "output_text":
+                    continue
+                text_parts.append(part.text)
+                for entry in getattr(part, "logprobs", None) or []:
+                    token = getattr(entry, "token", None)
+                    lp = getattr(entry, "logprob", None)
+                    if token is None or lp is None:
+                        continue
+                    tokens.append(token)
+                    logprobs.append(lp)
+        return "".join(text_parts), TokenLogProbs(tokens, logprobs) if tokens else None
 
     @staticmethod
     def _extract_message_and_logprobs(
         response: Any,
-    ) -> Tuple[str, Optional[List[TokenLogProb]]]:
+    ) -> Tuple[str, Optional[TokenLogProbs]]:
         choice = response.choices[0]
 
         content = getattr(choice.message, "content", "")
@@ -304,38 +1438,111 @@ class OpenAIChatClient:
         elif content is None:
             content = ""
 
-        token_stats: Optional[List[TokenLogProb]] = None
+        token_stats: Optional[TokenLogProbs] = None
         logprobs = getattr(choice, "logprobs", None)
 
         if logprobs and hasattr(logprobs, "content"):
-            token_stats = []
-            for idx, item in enumerate(logprobs.content):
+            tokens: List[str] = []
+            lps: List[float] = []
+            positions: List[int] = []
+            for idx, item in enumerate(logprobs.content or []):
                 token = getattr(item, "token", None)
                 lp = getattr(item, "logprob", None)
                 if token is None or lp is None:
                     continue
-                token_stats.append(TokenLogProb(token=token, logprob=float(lp), position=idx))
+                tokens.append(token)
+                lps.append(lp)
+                positions.append(idx)
+            token_stats = TokenLogProbs(tokens, lps, positions)
 
         return str(content), token_stats
 
 
+# --- OpenAI-compatible inference servers ---------------------------------------------
+
+
+class OpenAICompatibleChatClient(OpenAIChatClient):
+    """
+    LLM client for self-hosted servers that speak the OpenAI chat completions
+    API (vLLM, llama.cpp server, TGI, ...), typically doing continuous batching.
+
+    Request building, streaming and message / logprob extraction are those of
+    OpenAIChatClient; only the Responses API (server_state) is never used.
+    MODEL_CONFIG entry:
+
+        "llama-3.1-8b-vllm": {
+            "provider": "openai_compatible",
+            "base_url": "http://localhost:8000/v1",
+            "model_id": "meta-llama/Llama-3.1-8B-Instruct",  # served model name
+            "supports_logprobs": True,
+            "max_concurrency": 32,    # requests in flight to this server
+            "env_var": "VLLM_API_KEY",  # optional; most servers accept any key
+        }
+
+    All models served from one base_url share one concurrency limit (see
+    _rate_limiter). The shared ClientRegistry pool opens at most
+    max_connections (default 20) sockets, so raise it for larger limits.
+    """
+
+    provider = "openai_compatible"
+
+    def _response_chain(self, model_name: str, stream: bool) -> Optional[_ResponseChain]:
+        return None
+
+
 # --- Anthropic (Claude) client -------------------------------------------------------
 
 
+# Anthropic allows at most four cache_control breakpoints per request.
+_CACHE_BREAKPOINTS = ("system", "first_user", "last_user")
+
+
 class AnthropicChatClient:
     """
     LLM client for Anthropic Claude models via anthropic.messages API.
 
     Claude does NOT expose token-level logprobs in current public API, so
     token_logprobs=None in MessageStats.
+
+    Prompt caching is opt-in per model via MODEL_CONFIG:
+
+        "prompt_caching": True        # default breakpoints, 5 minute TTL
+        "prompt_caching": {
+            "breakpoints": ["system", "first_user", "last_user"],
+            "ttl": "5m" | "1h",
+        }
+
+    "system" and "first_user" mark the stable scenario prefix (the persona /
+    context instruction is the first user prompt in most scenarios), shared by
+    every run; "last_user" lets each turn read the previous turn's prefix back
+    from the cache. Cache read/write token counts end up in MessageStats.usage.
     """
 
-    def __init__(self, api_key: str):
-        if anthropic is None:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        http_pool: Optional[HTTPPool] = None,
+    ):
+        if not anthropic.available():
             raise ImportError(
                 "anthropic package is not installed. Add 'anthropic' to requirements.txt."
             )
-        self._client = anthropic.Anthropic(api_key=api_key)
+        # Retries are handled by our RateLimiter, so SDK-level retries are off.
+        self._client = anthropic.Anthropic(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=http_pool.sync_client() if http_pool else None,
+        )
+        self._async_client = _PerLoop(
+            lambda: anthropic.AsyncAnthropic(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=http_pool.async_client() if http_pool else None,
+            )
+        )
 
     def run_conversation(
         self,
@@ -343,6 +1550,8 @@ class AnthropicChatClient:
         user_prompts: List[str],
         system_prompt: Optional[str] = None,
         request_logprobs: Optional[List[bool]] = None,  # ignored for Claude
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
         **gen_kwargs: Any,
     ) -> ConversationResult:
 
@@ -354,76 +1563,182 @@ class AnthropicChatClient:
 
         # Claude requires `max_tokens`, so ensure it exists.
         max_tokens = gen_kwargs.pop("max_tokens", 512)
+        stream = _pop_stream(model_name, gen_kwargs)
+        prompt_caching = self._prompt_caching(cfg)
+
+        def complete_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+            payload = self._request_kwargs(messages, prompt_caching)
+            if stream:
+                timer = _TurnTimer()
+                with self._client.messages.stream(
+                    model=model_id,
+                    **payload,
+                    max_tokens=max_tokens,
+                    **gen_kwargs
+                ) as events:
+                    for text in events.text_stream:
+                        if text:
+                            timer.mark_token()
+                    response = events.get_final_message()
+                timing = timer.finish(getattr(response.usage, "output_tokens", None))
+                return self._extract_text(response), None, response, timing
 
-        # ---- Build Claude-style messages list ----
-        # Claude requires everything inside `messages=[ ... ]`
-        # No separate system=... parameter is allowed.
-        claude_messages: List[Dict[str, str]] = []
-        result_messages: List[MessageStats] = []
-        assistant_messages: List[MessageStats] = []
-        raw_responses: List[Any] = []
-
-        # Add system message inside messages list (correct Anthropic format)
-        if system_prompt:
-            claude_messages.append({
-                "role": "system",
-                "content": system_prompt
-            })
-            result_messages.append(
-                MessageStats(role="system", content=system_prompt, token_logprobs=None)
+            response = self._client.messages.create(
+                model=model_id,
+                **payload,
+                max_tokens=max_tokens,
+                **gen_kwargs
             )
+            # Claude does not expose per-token logprobs
+            return self._extract_text(response), None, response
+
+        return _run_chat_turns(
+            model_name,
+            user_prompts,
+            system_prompt,
+            [False] * len(user_prompts),
+            complete_turn,
+            response_cache,
+            _cache_scope(
+                "anthropic", model_id, dict(gen_kwargs, max_tokens=max_tokens), run_index
+            ),
+            _rate_limiter(model_name),
+        )
 
-        # ---- Multi-turn conversation ----
-        for user_prompt in user_prompts:
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,  # ignored for Claude
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
 
-            # User message
-            claude_messages.append({
-                "role": "user",
-                "content": user_prompt
-            })
-            result_messages.append(
-                MessageStats(role="user", content=user_prompt, token_logprobs=None)
-            )
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
 
-            # Call Claude API
-            response = self._client.messages.create(
+        cfg = _get_model_config(model_name)
+        model_id = cfg.get("model_id", model_name)
+        max_tokens = gen_kwargs.pop("max_tokens", 512)
+        stream = _pop_stream(model_name, gen_kwargs)
+        prompt_caching = self._prompt_caching(cfg)
+
+        async def complete_turn(
+            messages: List[Dict[str, str]], want_logprobs: bool
+        ) -> TurnResult:
+            payload = self._request_kwargs(messages, prompt_caching)
+            if stream:
+                timer = _TurnTimer()
+                async with self._async_client.get().messages.stream(
+                    model=model_id,
+                    **payload,
+                    max_tokens=max_tokens,
+                    **gen_kwargs
+                ) as events:
+                    async for text in events.text_stream:
+                        if text:
+                            timer.mark_token()
+                    response = await events.get_final_message()
+                timing = timer.finish(getattr(response.usage, "output_tokens", None))
+                return self._extract_text(response), None, response, timing
+
+            response = await self._async_client.get().messages.create(
                 model=model_id,
-                messages=claude_messages,
+                **payload,
                 max_tokens=max_tokens,
                 **gen_kwargs
             )
-            raw_responses.append(response)
-
-            # Extract assistant text
-            text_parts: List[str] = []
-            for block in response.content:
-                # Claude response chunks have typed blocks, e.g. {"type": "text", "text": "..."}
-                if getattr(block, "type", None) == "text":
-                    text_parts.append(block.text)
-
-            assistant_text = "".join(text_parts)
+            return self._extract_text(response), None, response
+
+        return await _run_chat_turns_async(
+            model_name,
+            user_prompts,
+            system_prompt,
+            [False] * len(user_prompts),
+            complete_turn,
+            response_cache,
+            _cache_scope(
+                "anthropic", model_id, dict(gen_kwargs, max_tokens=max_tokens), run_index
+            ),
+            _rate_limiter(model_name),
+        )
 
-            # Append assistant message to conversation history
-            claude_messages.append({
-                "role": "assistant",
-                "content": assistant_text
-            })
+    @staticmethod
+    def _prompt_caching(cfg: Dict[str, Any]) -> Optional[Tuple[Tuple[str, ...], Dict[str, str]]]:
+        """(breakpoints, cache_control) from MODEL_CONFIG, or None when disabled."""
+        spec = cfg.get("prompt_caching")
+        if not spec:
+            return None
+        if spec is True:
+            spec = {}
+        breakpoints = tuple(spec.get("breakpoints", _CACHE_BREAKPOINTS))
+        unknown = set(breakpoints) - set(_CACHE_BREAKPOINTS)
+        if unknown:
+            raise ValueError(
+                f"Unknown prompt_caching breakpoints {sorted(unknown)}; "
+                f"expected a subset of {list(_CACHE_BREAKPOINTS)}."
+            )
+        cache_control = {"type": "ephemeral"}
+        if spec.get("ttl"):
+            cache_control["ttl"] = spec["ttl"]
+        return breakpoints, cache_control
 
-            # Build MessageStats for assistant reply
-            msg_stats = MessageStats(
-                role="assistant",
-                content=assistant_text,
-                token_logprobs=None,   # Claude does not expose per-token logprobs
+    @staticmethod
+    def _request_kwargs(
+        messages: List[Dict[str, str]],
+        prompt_caching: Optional[Tuple[Tuple[str, ...], Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        messages= (and system=) for the Messages API from a chat history.
+
+        Claude takes the system prompt as a separate `system` parameter, not as
+        a "system" role message. With prompt_caching, the configured breakpoints
+        get cache_control (their content becomes a single text block); everything
+        up to and including a breakpoint is cached as one prefix.
+        """
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        chat = [m for m in messages if m["role"] != "system"]
+        breakpoints, cache_control = prompt_caching or ((), {})
+
+        user_idx = [i for i, m in enumerate(chat) if m["role"] == "user"]
+        marked = set()
+        if "first_user" in breakpoints and user_idx:
+            marked.add(user_idx[0])
+        if "last_user" in breakpoints and user_idx:
+            marked.add(user_idx[-1])
+
+        kwargs: Dict[str, Any] = {
+            "messages": [
+                {
+                    "role": m["role"],
+                    "content": [
+                        {"type": "text", "text": m["content"], "cache_control": cache_control}
+                    ],
+                }
+                if i in marked
+                else m
+                for i, m in enumerate(chat)
+            ]
+        }
+        if system:
+            text = "\n\n".join(system)
+            kwargs["system"] = (
+                [{"type": "text", "text": text, "cache_control": cache_control}]
+                if "system" in breakpoints
+                else text
             )
-            result_messages.append(msg_stats)
-            assistant_messages.append(msg_stats)
+        return kwargs
 
-        return ConversationResult(
-            model_name=model_name,
-            messages=result_messages,
-            assistant_messages=assistant_messages,
-            raw_responses=raw_responses,
-        )
+    @staticmethod
+    def _extract_text(response: Any) -> str:
+        text_parts: List[str] = []
+        for block in response.content:
+            # Claude response chunks have typed blocks, e.g. {"type": "text", "text": "..."}
+            if getattr(block, "type", None) == "text":
+                text_parts.append(block.text)
+        return "".join(text_parts)
 
 
 class GeminiChatClient:
@@ -451,6 +1766,8 @@ class GeminiChatClient:
         user_prompts: List[str],
         system_prompt: Optional[str] = None,
         request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
         **gen_kwargs,
     ) -> ConversationResult:
         from .config import MODEL_CONFIG  # avoid circular import at import time
@@ -484,6 +1801,80 @@ class GeminiChatClient:
             "temperature": gen_kwargs.get("temperature", 0.7),
         }
 
+        # ------------------------------------------------------------------ #
+        # Serve from the response cache if possible
+        # ------------------------------------------------------------------ #
+        scope = _cache_scope("gemini", model_id, gen_config, run_index)
+        started = time.perf_counter()
+        cache_key = None
+        text_output = None
+        raw: Dict[str, Any] = {}
+        if response_cache is not None:
+            cache_key = response_cache.make_key(
+                system_prompt=system_prompt if supports_system else None,
+                messages=contents,
+                **scope,
+            )
+            record = response_cache.get(cache_key)
+            if record is not None:
+                text_output = record["content"]
+                raw = {"cached": True, "cache_key": cache_key}
+
+        probe = _CallProbe()
+        if text_output is None:
+            generate = _with_attempt_probe(
+                lambda *_: (
+                    self._generate_text(
+                        model_id, supports_system, system_prompt, contents, gen_config
+                    ),
+                    None,
+                    None,
+                ),
+                probe,
+            )
+            try:
+                text_output = _rate_limiter(model_name).call(
+                    lambda: generate(contents, False)[0],
+                    estimated_tokens=estimate_tokens(
+                        "".join(p["text"] for c in contents for p in c["parts"])
+                    )
+                    + gen_config["max_output_tokens"],
+                )
+            except Exception as exc:
+                _record_turn(
+                    model_name, scope, 0, started,
+                    error=exc, attempts=probe.attempts, attempt_s=probe.attempt_s,
+                )
+                raise
+            if response_cache is not None and cache_key is not None:
+                response_cache.put(cache_key, _turn_to_record(text_output, None))
+        _record_turn(
+            model_name, scope, 0, started, turn=(text_output, None, raw),
+            attempts=probe.attempts, attempt_s=probe.attempt_s if probe.attempts else None,
+        )
+
+        tokens = text_output.split()
+
+        msg_stats = MessageStats(
+            content=text_output,
+            role="assistant",
+            token_logprobs=None,
+        )
+
+
+        return ConversationResult(
+            assistant_messages=[msg_stats],
+            model_name=model_name,
+        )
+
+    def _generate_text(
+        self,
+        model_id: str,
+        supports_system: bool,
+        system_prompt: Optional[str],
+        contents: List[Dict[str, Any]],
+        gen_config: Dict[str, Any],
+    ) -> str:
         # ------------------------------------------------------------------ #
         # Create the GenerativeModel and call generate_content
         # ------------------------------------------------------------------ #
@@ -511,26 +1902,35 @@ class GeminiChatClient:
         # Extract text
         # ------------------------------------------------------------------ #
         try:
-            text_output = response.text
+            return response.text
         except Exception:
             # Fallback: try candidates
             try:
-                text_output = response.candidates[0].content.parts[0].text
+                return response.candidates[0].content.parts[0].text
             except Exception:
-                text_output = ""
-
-        tokens = text_output.split()
+                return ""
 
-        msg_stats = MessageStats(
-            content=text_output,
-            role="assistant",
-            token_logprobs=None,
-        )
-
-
-        return ConversationResult(
-            assistant_messages=[msg_stats],
-            model_name=model_name,
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs,
+    ) -> ConversationResult:
+        # google.generativeai has no asyncio entry point we rely on; offload the
+        # blocking call to a worker thread so other conversations keep running.
+        return await asyncio.to_thread(
+            self.run_conversation,
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            response_cache,
+            run_index,
+            **gen_kwargs,
         )
 
 
@@ -544,12 +1944,28 @@ class MistralChatClient:
     Token-level logprobs are currently not requested; tokens/logprobs will be None.
     """
 
-    def __init__(self, api_key: str):
-        if Mistral is None:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        http_pool: Optional[HTTPPool] = None,
+    ):
+        if not mistralai.available():
             raise ImportError(
                 "mistralai package is not installed. Add 'mistralai' to requirements.txt."
             )
-        self._client = Mistral(api_key=api_key)
+        self._client = mistralai.Mistral(
+            api_key=api_key,
+            server_url=base_url,
+            client=http_pool.sync_client() if http_pool else None,
+        )
+        self._async_client = _PerLoop(
+            lambda: mistralai.Mistral(
+                api_key=api_key,
+                server_url=base_url,
+                async_client=http_pool.async_client() if http_pool else None,
+            )
+        )
 
     def run_conversation(
         self,
@@ -557,6 +1973,8 @@ class MistralChatClient:
         user_prompts: List[str],
         system_prompt: Optional[str] = None,
         request_logprobs: Optional[List[bool]] = None,  # ignored for now
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
         **gen_kwargs: Any,
     ) -> ConversationResult:
         if not user_prompts:
@@ -564,47 +1982,708 @@ class MistralChatClient:
 
         cfg = _get_model_config(model_name)
         model_id = cfg.get("model_id", model_name)
+        stream = _pop_stream(model_name, gen_kwargs)
+
+        def complete_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+            if stream:
+                state = _ChatStreamState(_TurnTimer())
+                for event in self._client.chat.stream(
+                    model=model_id,
+                    messages=messages,
+                    **gen_kwargs,
+                ):
+                    state.add(event.data)
+                return state.result()
 
-        messages: List[Dict[str, str]] = []
-        result_messages: List[MessageStats] = []
-        assistant_messages: List[MessageStats] = []
-        raw_responses: List[Any] = []
+            response = self._client.chat.complete(
+                model=model_id,
+                messages=messages,
+                **gen_kwargs,
+            )
+            return self._extract_content(response), None, response
+
+        return _run_chat_turns(
+            model_name,
+            user_prompts,
+            system_prompt,
+            [False] * len(user_prompts),
+            complete_turn,
+            response_cache,
+            _cache_scope("mistral", model_id, gen_kwargs, run_index),
+            _rate_limiter(model_name),
+        )
 
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-            result_messages.append(MessageStats(role="system", content=system_prompt))
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,  # ignored for now
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
 
-        for user_prompt in user_prompts:
-            messages.append({"role": "user", "content": user_prompt})
-            result_messages.append(MessageStats(role="user", content=user_prompt))
+        cfg = _get_model_config(model_name)
+        model_id = cfg.get("model_id", model_name)
+        stream = _pop_stream(model_name, gen_kwargs)
+
+        async def complete_turn(
+            messages: List[Dict[str, str]], want_logprobs: bool
+        ) -> TurnResult:
+            if stream:
+                state = _ChatStreamState(_TurnTimer())
+                async for event in await self._async_client.get().chat.stream_async(
+                    model=model_id,
+                    messages=messages,
+                    **gen_kwargs,
+                ):
+                    state.add(event.data)
+                return state.result()
 
-            response = self._client.chat.complete(
+            response = await self._async_client.get().chat.complete_async(
                 model=model_id,
                 messages=messages,
                 **gen_kwargs,
             )
-            raw_responses.append(response)
+            return self._extract_content(response), None, response
+
+        return await _run_chat_turns_async(
+            model_name,
+            user_prompts,
+            system_prompt,
+            [False] * len(user_prompts),
+            complete_turn,
+            response_cache,
+            _cache_scope("mistral", model_id, gen_kwargs, run_index),
+            _rate_limiter(model_name),
+        )
+
+    @staticmethod
+    def _extract_content(response: Any) -> str:
+        choice = response.choices[0]
+        return getattr(choice.message, "content", "") or ""
+
+
+# --- CPU inference profiles ----------------------------------------------------------
+
+
+_ATTENTION_IMPLEMENTATIONS = ("eager", "sdpa", "flash_attention_2")
 
-            choice = response.choices[0]
-            assistant_content = getattr(choice.message, "content", "") or ""
 
-            messages.append({"role": "assistant", "content": assistant_content})
+@dataclass(frozen=True)
+class InferenceProfile:
+    """
+    How a local HuggingFace model is loaded and run, from
+    MODEL_CONFIG[model]["inference_profile"] (a preset name or a dict):
+
+        "inference_profile": {
+            "dtype": "bfloat16",        # weight dtype (overrides the entry's "dtype")
+            "quantize": "int8",         # dynamic int8 quantization of nn.Linear (CPU, fp32)
+            "compile": True,            # torch.compile the forward pass
+            "compile_mode": None,       # e.g. "reduce-overhead", "max-autotune"
+            "num_threads": 16,          # torch intra-op threads
+            "num_interop_threads": 1,   # torch inter-op threads (settable once per process)
+            "attention": "sdpa",        # "eager" | "sdpa" | "flash_attention_2"
+            "mmap": True,               # map the safetensors weights instead of copying (CPU)
+        }
+
+    Thread counts are process-wide torch settings and are applied when a client
+    is created; all other fields are part of the LocalModelCache key.
+
+    With mmap=True the parameters are views of a private mapping of the
+    checkpoint's safetensors files, so every process on the machine that maps
+    the same model shares one copy of the weights in the page cache (see
+    replicas.LocalReplicaPool). Tensors whose dtype differs from the requested
+    one are converted and therefore copied; leave dtype unset to keep the
+    checkpoint's dtype.
+    """
 
-            msg_stats = MessageStats(
-                role="assistant",
-                content=assistant_content,
-                tokens=None,
-                token_logprobs=None,
+    dtype: Optional[str] = None
+    quantize: Optional[str] = None
+    compile: bool = False
+    compile_mode: Optional[str] = None
+    num_threads: Optional[int] = None
+    num_interop_threads: Optional[int] = None
+    attention: Optional[str] = None
+    mmap: bool = False
+
+    def __post_init__(self) -> None:
+        if self.quantize not in (None, "int8"):
+            raise ValueError(f"Unsupported quantize '{self.quantize}' (use 'int8' or None).")
+        if self.quantize and self.dtype not in (None, "float32"):
+            raise ValueError("Dynamic int8 quantization needs float32 weights; drop dtype.")
+        if self.quantize and self.mmap:
+            raise ValueError("int8 quantization rewrites the weights; it cannot use mmap.")
+        if self.attention not in (None,) + _ATTENTION_IMPLEMENTATIONS:
+            raise ValueError(
+                f"Unknown attention '{self.attention}' "
+                f"(expected one of {', '.join(_ATTENTION_IMPLEMENTATIONS)})."
             )
-            result_messages.append(msg_stats)
-            assistant_messages.append(msg_stats)
 
-        return ConversationResult(
-            model_name=model_name,
-            messages=result_messages,
-            assistant_messages=assistant_messages,
-            raw_responses=raw_responses,
+    @classmethod
+    def coerce(cls, profile: Any) -> "InferenceProfile":
+        """Accept an InferenceProfile, a preset name, a dict, or None (default)."""
+        if profile is None:
+            return cls()
+        if isinstance(profile, cls):
+            return profile
+        if isinstance(profile, str):
+            try:
+                return INFERENCE_PROFILES[profile]
+            except KeyError:
+                raise ValueError(
+                    f"Unknown inference profile '{profile}' "
+                    f"(presets: {', '.join(INFERENCE_PROFILES)})."
+                ) from None
+        if isinstance(profile, dict):
+            unknown = set(profile) - set(cls.__dataclass_fields__)
+            if unknown:
+                raise ValueError(f"Unknown inference_profile keys: {sorted(unknown)}.")
+            return cls(**profile)
+        raise TypeError(f"Cannot build an InferenceProfile from {type(profile).__name__}.")
+
+    @property
+    def load_key(self) -> str:
+        """The parts that change the loaded model, for cache keys ("default" if none)."""
+        parts = [
+            self.quantize,
+            f"compile:{self.compile_mode or 'default'}" if self.compile else None,
+            f"attn:{self.attention}" if self.attention else None,
+            "mmap" if self.mmap else None,
+        ]
+        return "+".join(p for p in parts if p) or "default"
+
+    def apply_threads(self) -> None:
+        if self.num_threads is not None:
+            torch.set_num_threads(int(self.num_threads))
+        if (
+            self.num_interop_threads is not None
+            and torch.get_num_interop_threads() != self.num_interop_threads
+        ):
+            try:
+                torch.set_num_interop_threads(int(self.num_interop_threads))
+            except RuntimeError:
+                # torch only allows this before the first inter-op parallel work
+                print(
+                    "[InferenceProfile] num_interop_threads can only be set once per "
+                    f"process; keeping {torch.get_num_interop_threads()}."
+                )
+
+
+INFERENCE_PROFILES: Dict[str, InferenceProfile] = {
+    "default": InferenceProfile(),
+    "sdpa": InferenceProfile(attention="sdpa"),
+    "bf16": InferenceProfile(dtype="bfloat16", attention="sdpa"),
+    "int8": InferenceProfile(quantize="int8", attention="sdpa"),
+    "bf16_compile": InferenceProfile(dtype="bfloat16", attention="sdpa", compile=True),
+    "int8_compile": InferenceProfile(quantize="int8", attention="sdpa", compile=True),
+}
+
+
+def _optimize_model(model: Any, profile: InferenceProfile, device: str) -> Any:
+    """Apply the post-load parts of a profile (quantization, compilation)."""
+    if profile.quantize == "int8":
+        if device != "cpu":
+            raise ValueError("Dynamic int8 quantization is only supported on CPU.")
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+    if profile.compile:
+        # generate() calls forward with a growing sequence: compile for dynamic shapes
+        model.forward = torch.compile(model.forward, mode=profile.compile_mode, dynamic=True)
+    return model
+
+
+# --- Local model cache ---------------------------------------------------------------
+
+
+class LocalModelCache:
+    """
+    LRU cache of loaded HuggingFace (tokenizer, model) pairs.
+
+    Entries are keyed by (model_id, device, dtype, profile), so repeated runs of
+    the same local model pay the from_pretrained + device transfer cost only once.
+    `profile` is InferenceProfile.load_key; the profile's dtype takes the place of
+    `dtype` when set.
+
+    - max_bytes: upper bound on the summed parameter/buffer memory of cached models.
+    - max_models: upper bound on the number of cached models.
+
+    When a limit is exceeded, least recently used models are evicted. A single
+    model larger than max_bytes is still loaded, but nothing else is kept with it.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, max_models: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self._entries: "OrderedDict[Tuple[str, str, str, str], Tuple[Any, Any, int]]" = (
+            OrderedDict()
         )
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by all cached models."""
+        return sum(size for _, _, size in self._entries.values())
+
+    def keys(self) -> List[Tuple[str, str, str, str]]:
+        return list(self._entries.keys())
+
+    def get(
+        self,
+        model_id: str,
+        device: str,
+        dtype: Optional[str] = None,
+        profile: Optional[InferenceProfile] = None,
+    ) -> Tuple[Any, Any]:
+        """Return (tokenizer, model), loading and caching them on first use."""
+        profile = profile or InferenceProfile()
+        dtype = profile.dtype or dtype
+        key = (model_id, device, dtype or "auto", profile.load_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0], entry[1]
+
+            load_kwargs: Dict[str, Any] = {}
+            if dtype is not None:
+                load_kwargs["torch_dtype"] = getattr(torch, dtype)
+            if profile.attention is not None:
+                load_kwargs["attn_implementation"] = profile.attention
+
+            tokenizer = transformers.AutoTokenizer.from_pretrained(model_id)
+            if profile.mmap:
+                if device != "cpu":
+                    raise ValueError("Memory-mapped weights are only supported on CPU.")
+                model = _load_mmap_model(model_id, dtype, profile.attention)
+            else:
+                model = transformers.AutoModelForCausalLM.from_pretrained(
+                    model_id, **load_kwargs
+                )
+                model.to(device)
+            model.eval()
+            model = _optimize_model(model, profile, device)
+
+            self._entries[key] = (tokenizer, model, _model_nbytes(model))
+            self._enforce_limits(keep=key)
+            return tokenizer, model
+
+    def evict(
+        self,
+        model_id: Optional[str] = None,
+        device: Optional[str] = None,
+        dtype: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> int:
+        """
+        Evict all entries matching the given fields (None matches anything;
+        `profile` is an InferenceProfile.load_key).
+
+        Returns the number of evicted models.
+        """
+        with self._lock:
+            doomed = [
+                key
+                for key in self._entries
+                if (model_id is None or key[0] == model_id)
+                and (device is None or key[1] == device)
+                and (dtype is None or key[2] == dtype)
+                and (profile is None or key[3] == profile)
+            ]
+            for key in doomed:
+                del self._entries[key]
+        if doomed:
+            _release_memory()
+        return len(doomed)
+
+    def clear(self) -> None:
+        self.evict()
+
+    def _enforce_limits(self, keep: Tuple[str, str, str, str]) -> None:
+        evicted = False
+        while len(self._entries) > 1:
+            too_many = self.max_models is not None and len(self._entries) > self.max_models
+            too_big = self.max_bytes is not None and self.nbytes > self.max_bytes
+            if not (too_many or too_big):
+                break
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            del self._entries[oldest]
+            evicted = True
+        if evicted:
+            _release_memory()
+
+
+# --- Memory-mapped safetensors weights ------------------------------------------------
+
+
+_SAFETENSORS_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def _safetensors_files(model_id: str) -> List[str]:
+    """Local paths of a checkpoint's safetensors files (downloading hub models)."""
+    directory = model_id
+    if not os.path.isdir(directory):
+        directory = huggingface_hub.snapshot_download(
+            model_id, allow_patterns=["*.safetensors", "*.safetensors.index.json"]
+        )
+    index = os.path.join(directory, "model.safetensors.index.json")
+    if os.path.exists(index):
+        with open(index, "r", encoding="utf-8") as fh:
+            names = sorted(set(json.load(fh)["weight_map"].values()))
+    elif os.path.exists(os.path.join(directory, "model.safetensors")):
+        names = ["model.safetensors"]
+    else:
+        raise ValueError(f"Model '{model_id}' has no safetensors weights to memory-map.")
+    return [os.path.join(directory, name) for name in names]
+
+
+def _mmap_safetensors(path: str) -> Dict[str, Any]:
+    """Zero-copy tensors over a private (copy-on-write) mapping of one file."""
+    with open(path, "rb") as fh:
+        header_len = int.from_bytes(fh.read(8), "little")
+        header = json.loads(fh.read(header_len))
+        # Pages stay shared with every other process mapping the file as long as
+        # nobody writes to them, which inference never does.
+        mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_COPY)
+    base = 8 + header_len
+    tensors: Dict[str, Any] = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        if end == start:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        flat = torch.frombuffer(
+            mapped, dtype=dtype, count=(end - start) // itemsize, offset=base + start
+        )
+        tensors[name] = flat.view(info["shape"])
+    return tensors
+
+
+@contextlib.contextmanager
+def _parameters_on_meta() -> Iterator[None]:
+    """Create module parameters on the meta device (buffers stay real)."""
+    register = torch.nn.Module.register_parameter
+
+    def register_on_meta(module: Any, name: str, param: Any) -> None:
+        register(module, name, param)
+        if param is not None:
+            module._parameters[name] = type(param)(
+                param.to("meta"), requires_grad=param.requires_grad
+            )
+
+    torch.nn.Module.register_parameter = register_on_meta
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register
+
+
+def _load_mmap_model(model_id: str, dtype: Optional[str], attention: Optional[str]) -> Any:
+    """
+    Build a causal LM whose parameters are views of the memory-mapped checkpoint.
+
+    dtype None keeps the checkpoint's floating point dtype, so nothing is copied.
+    The loaded model records the bytes it shares with the mapping in
+    `model.mmap_shared_bytes`.
+    """
+    state: Dict[str, Any] = {}
+    for path in _safetensors_files(model_id):
+        state.update(_mmap_safetensors(path))
+    stored = next((t.dtype for t in state.values() if t.is_floating_point()), None)
+    target = getattr(torch, dtype) if dtype is not None else stored
+
+    config = transformers.AutoConfig.from_pretrained(model_id)
+    if attention is not None:
+        config._attn_implementation = attention
+    with _parameters_on_meta():
+        model = transformers.AutoModelForCausalLM.from_config(config)
+    mapped = {t.data_ptr() for t in state.values()}
+    if target is not None:
+        state = {
+            name: t.to(target) if t.is_floating_point() else t for name, t in state.items()
+        }
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+
+    missing = [name for name, p in model.named_parameters() if p.is_meta]
+    if missing:
+        raise ValueError(
+            f"Checkpoint of '{model_id}' does not provide {len(missing)} parameters "
+            f"(e.g. {missing[0]}); it cannot be loaded with mmap."
+        )
+    model.mmap_shared_bytes = sum(
+        p.numel() * p.element_size() for p in model.parameters() if p.data_ptr() in mapped
+    )
+    return model
+
+
+def _model_nbytes(model: Any) -> int:
+    """Parameter + buffer memory of a torch module in bytes."""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _release_memory() -> None:
+    gc.collect()
+    # never import torch just to find out there is nothing to release
+    if torch.loaded and torch.cuda.is_available():
+        torch.cuda.empty_cache()  # type: ignore[attr-defined]
+
+
+_LOCAL_MODEL_CACHE: Optional[LocalModelCache] = None
+
+
+def local_model_cache() -> LocalModelCache:
+    """Process-wide model cache used by HuggingFaceLocalClient by default."""
+    global _LOCAL_MODEL_CACHE
+    if _LOCAL_MODEL_CACHE is None:
+        _LOCAL_MODEL_CACHE = LocalModelCache()
+    return _LOCAL_MODEL_CACHE
+
+
+@dataclass
+class _KVCacheState:
+    """Token ids already encoded in `past` (the model's past_key_values)."""
+
+    ids: List[int] = field(default_factory=list)
+    past: Any = None
+
+
+def _common_prefix_len(a: List[int], b: List[int]) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def _cache_seq_len(past: Any) -> int:
+    if hasattr(past, "get_seq_length"):
+        return int(past.get_seq_length())
+    return int(past[0][0].shape[-2])  # legacy tuple-of-tuples cache
+
+
+def _cache_nbytes(past: Any) -> int:
+    """Memory held by the key/value tensors of a KV cache."""
+    if hasattr(past, "layers"):  # transformers >= 4.56
+        tensors = [t for layer in past.layers for t in (layer.keys, layer.values)]
+    elif hasattr(past, "key_cache"):
+        tensors = list(past.key_cache) + list(past.value_cache)
+    else:
+        tensors = [t for layer in past for t in layer]
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None)
+
+
+class PrefixKVCache:
+    """
+    LRU store of prefilled KV caches for shared prompt prefixes.
+
+    All runs of a scenario start from the same system + first user prompt, so
+    the KV state for that prefix is computed once and a private copy is handed
+    to every run. Lookups also reuse the longest common prefix of a stored
+    entry (cropped), so scenarios sharing a persona instruction benefit too.
+
+    Entries are evicted least-recently-used first once their summed size
+    exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 1 << 30):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Any, Tuple[int, ...]], Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, model_key: Any, prompt_ids: List[int]) -> Optional[Any]:
+        """
+        Return a private copy of the cache sharing the longest prefix with
+        prompt_ids (always leaving at least one prompt token uncached), or None.
+        """
+        with self._lock:
+            best_key, best_n = None, 0
+            for key, (past, _) in self._entries.items():
+                if key[0] != model_key:
+                    continue
+                n = min(_common_prefix_len(list(key[1]), prompt_ids), len(prompt_ids) - 1)
+                if n < len(key[1]) and not hasattr(past, "crop"):
+                    continue
+                if n > best_n:
+                    best_key, best_n = key, n
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            clone = copy.deepcopy(self._entries[best_key][0])
+
+        if best_n < len(best_key[1]):
+            clone.crop(best_n)
+        return clone
+
+    def store(self, model_key: Any, prefix_ids: List[int], past: Any) -> None:
+        """Keep a copy of `past`, the KV cache encoding exactly prefix_ids."""
+        key = (model_key, tuple(prefix_ids))
+        entry = (copy.deepcopy(past), _cache_nbytes(past))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > 1 and self.nbytes > self.max_bytes:
+                self._entries.popitem(last=False)
+            if self.nbytes > self.max_bytes:
+                self._entries.clear()  # a single prefix larger than the budget
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_PREFIX_KV_CACHE: Optional[PrefixKVCache] = None
+
+
+def prefix_kv_cache() -> PrefixKVCache:
+    """Process-wide prefix cache used by HuggingFaceLocalClient by default."""
+    global _PREFIX_KV_CACHE
+    if _PREFIX_KV_CACHE is None:
+        _PREFIX_KV_CACHE = PrefixKVCache()
+    return _PREFIX_KV_CACHE
+
+
+class _TimingStreamer:
+    """
+    Minimal generate() streamer that only timestamps tokens.
+
+    generate() first puts the prompt ids, then every new token as it is sampled.
+    """
+
+    def __init__(self, timer: _TurnTimer):
+        self.timer = timer
+        self._prompt_seen = False
+
+    def put(self, value: Any) -> None:
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        self.timer.mark_token()
+
+    def end(self) -> None:
+        pass
+
+
+# Role markers of the local transcript format; a base model that emits one has
+# started to write the next turn itself.
+_TRANSCRIPT_STOPS = ("[USER]:", "[SYSTEM]:", "[ASSISTANT]:")
+
+
+@dataclass(frozen=True)
+class _StopSpec:
+    """Stop strings and stop token ids of one generation call."""
+
+    strings: Tuple[str, ...] = ()
+    token_ids: Tuple[int, ...] = ()
+
+    @classmethod
+    def from_kwarg(cls, stop: Any) -> "_StopSpec":
+        """
+        Parse gen_kwargs["stop"]: None -> transcript role markers, False or []
+        -> no stopping, otherwise a string, a token id or a list mixing both.
+        """
+        if stop is None:
+            return cls(strings=_TRANSCRIPT_STOPS)
+        if stop is False:
+            return cls()
+        if isinstance(stop, (str, int)):
+            stop = [stop]
+        strings = tuple(x for x in stop if isinstance(x, str) and x)
+        token_ids = tuple(int(x) for x in stop if isinstance(x, int) and not isinstance(x, bool))
+        if len(strings) + len(token_ids) != len(stop):
+            raise ValueError("stop must hold non-empty strings and/or integer token ids.")
+        return cls(strings=strings, token_ids=token_ids)
+
+    def __bool__(self) -> bool:
+        return bool(self.strings or self.token_ids)
+
+    @property
+    def cache_value(self) -> List[Any]:
+        return list(self.strings) + list(self.token_ids)
+
+
+class _StopStringCriteria:
+    """
+    generate() stopping criterion for stop strings, checked incrementally.
+
+    Every step decodes only the tokens appended since the previous step plus
+    `window` tokens before them, enough to hold the longest stop string and a
+    token straddling its start (every token decodes to at least one character),
+    so the per-step cost does not grow with the output. Assisted decoding may
+    append several tokens per step; they are all covered. Rows that produced a
+    stop string are reported done; generate() pads them until the whole batch
+    has finished.
+    """
+
+    def __init__(self, tokenizer: Any, strings: Tuple[str, ...], prompt_len: int):
+        self.tokenizer = tokenizer
+        self.strings = strings
+        self.prompt_len = prompt_len
+        self.window = max(len(s) for s in strings) + 1
+        self._checked_len = prompt_len
+
+    def __call__(self, input_ids: Any, scores: Any, **kwargs: Any) -> Any:
+        start = max(self.prompt_len, min(self._checked_len, input_ids.shape[1]) - self.window)
+        self._checked_len = input_ids.shape[1]
+        tails = self.tokenizer.batch_decode(input_ids[:, start:], skip_special_tokens=True)
+        done = [any(s in tail for s in self.strings) for tail in tails]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class _ForwardCounter:
+    """Counts forward passes of torch modules while active (a context manager)."""
+
+    def __init__(self, *modules: Any):
+        self.modules = modules
+        self.counts = [0] * len(modules)
+        self._handles: List[Any] = []
+
+    def __enter__(self) -> "_ForwardCounter":
+        for i, module in enumerate(self.modules):
+            self._handles.append(module.register_forward_hook(self._hook(i)))
+        return self
+
+    def _hook(self, i: int) -> Callable[..., None]:
+        def hook(*_: Any) -> None:
+            self.counts[i] += 1
+
+        return hook
+
+    def __exit__(self, *exc_info: Any) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles.clear()
 
 
 # --- HuggingFace local client (LLaMA / Mistral etc.) ---------------------------------
@@ -617,11 +2696,50 @@ class HuggingFaceLocalClient:
     This implementation:
     - builds a text prompt from (optional) system + conversation transcript,
     - generates new tokens with `model.generate`,
-    - uses `output_scores=True` to compute token-level log-probs for the generated tokens.
+    - keeps generation scores only for turns that request log-probs, and turns them
+      into log-probs of the chosen tokens in one vectorized pass.
+
+    Weights come from a LocalModelCache (the process-wide one by default), so
+    constructing several clients for the same model does not reload it.
+
+    With reuse_kv_cache=True, the past_key_values of the previous turn are kept
+    and only the tokens that are new since then (the assistant tail and the next
+    user message) are encoded, instead of the whole transcript every turn.
+    The first turn additionally starts from a PrefixKVCache, so the shared
+    system/first prompt is prefilled once for all runs of a scenario.
+
+    inference_profile (an InferenceProfile, preset name or dict) selects
+    dtype, int8 quantization, torch.compile, thread counts and the attention
+    implementation; see InferenceProfile and benchmark.benchmark_profiles.
+
+    Generation stops at the transcript role markers ("[USER]:", ...) so base
+    models do not write the next turn themselves; pass stop=[...] (strings
+    and/or token ids) to change them, or stop=False to disable.
+
+    With draft_model_id (a smaller model sharing the tokenizer), turns use
+    assisted generation: the draft proposes tokens and the target verifies
+    them in one forward pass. Tokens and log-probs still come from the target
+    model's scores, so results keep their meaning (greedy output is unchanged,
+    sampling keeps the target distribution). Each assistant message's usage
+    records draft_tokens, accepted_draft_tokens, target_forwards, generate_us
+    and target_only_us; ConversationResult.assisted_decoding() summarizes
+    acceptance rate and speedup. Assisted turns do not reuse KV caches, and
+    batched generation does not use the draft.
     """
 
-    def __init__(self, model_id: str, device: Optional[str] = None):
-        if AutoModelForCausalLM is None or AutoTokenizer is None or torch is None:
+    def __init__(
+        self,
+        model_id: str,
+        device: Optional[str] = None,
+        dtype: Optional[str] = None,
+        model_cache: Optional[LocalModelCache] = None,
+        reuse_kv_cache: bool = True,
+        prefix_cache: Optional[PrefixKVCache] = None,
+        share_prefix_cache: bool = True,
+        inference_profile: Any = None,
+        draft_model_id: Optional[str] = None,
+    ):
+        if not (torch.available() and transformers.available()):
             raise ImportError(
                 "transformers and torch are required for HuggingFaceLocalClient. "
                 "Install them (e.g. 'pip install transformers torch')."
@@ -631,11 +2749,32 @@ class HuggingFaceLocalClient:
         self.device = device or (
             "cuda" if torch.cuda.is_available() else "cpu"  # type: ignore[attr-defined]
         )
-
-        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
-        self.model = AutoModelForCausalLM.from_pretrained(model_id)
-        self.model.to(self.device)
-        self.model.eval()
+        self.profile = InferenceProfile.coerce(inference_profile)
+        self.dtype = self.profile.dtype or dtype
+        self.profile.apply_threads()
+
+        self.reuse_kv_cache = reuse_kv_cache
+        self.prefix_cache: Optional[PrefixKVCache] = None
+        if reuse_kv_cache and share_prefix_cache:
+            self.prefix_cache = prefix_cache if prefix_cache is not None else prefix_kv_cache()
+
+        cache = model_cache if model_cache is not None else local_model_cache()
+        self.tokenizer, self.model = cache.get(model_id, self.device, dtype, self.profile)
+        # identifies the loaded weights for PrefixKVCache and ResponseCache keys
+        self._model_key = (model_id, self.device, self.dtype or "auto", self.profile.load_key)
+
+        self.draft_model_id = draft_model_id
+        self.draft_model = None
+        self._target_step_s: Optional[float] = None
+        if draft_model_id is not None:
+            draft_tokenizer, self.draft_model = cache.get(
+                draft_model_id, self.device, dtype, self.profile
+            )
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                raise ValueError(
+                    f"Draft model '{draft_model_id}' does not share the tokenizer of "
+                    f"'{model_id}'; use a draft model from the same family."
+                )
 
     def run_conversation(
         self,
@@ -643,15 +2782,21 @@ class HuggingFaceLocalClient:
         user_prompts: List[str],
         system_prompt: Optional[str] = None,
         request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
         **gen_kwargs: Any,
     ) -> ConversationResult:
         if not user_prompts:
             raise ValueError("user_prompts must contain at least one prompt string.")
 
         request_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        max_new_tokens = gen_kwargs.pop("max_new_tokens", 256)
+        stop = _StopSpec.from_kwarg(gen_kwargs.pop("stop", None))
+        stream = _pop_stream(model_name, gen_kwargs)
 
         result_messages: List[MessageStats] = []
         assistant_messages: List[MessageStats] = []
+        kv_state = _KVCacheState() if self.reuse_kv_cache else None
 
         transcript = ""
 
@@ -667,77 +2812,892 @@ class HuggingFaceLocalClient:
 
             full_prompt = transcript + "[ASSISTANT]:"
 
+            scope = _cache_scope(
+                "huggingface",
+                self.model_id,
+                self._scope_kwargs(gen_kwargs, max_new_tokens, stop),
+                run_index,
+            )
+            started = time.perf_counter()
+            cache_key = None
+            record = None
+            if response_cache is not None:
+                cache_key = response_cache.make_key(
+                    messages=full_prompt,
+                    want_logprobs=request_logprobs[idx],
+                    **scope,
+                )
+                record = response_cache.get(cache_key)
+
+            if record is not None:
+                # The KV state stays valid: the next prompt still extends its ids.
+                content, token_stats, raw = _turn_from_record(record, cache_key)
+                msg_stats = MessageStats(
+                    role="assistant",
+                    content=content,
+                    tokens=list(token_stats.tokens) if token_stats else None,
+                    token_logprobs=token_stats,
+                )
+            else:
+                try:
+                    msg_stats, raw = self._generate_turn(
+                        full_prompt,
+                        kv_state,
+                        request_logprobs[idx],
+                        max_new_tokens,
+                        gen_kwargs,
+                        stream=stream,
+                        stop=stop,
+                    )
+                except Exception as exc:
+                    _record_turn(model_name, scope, idx, started, error=exc)
+                    raise
+                if response_cache is not None and cache_key is not None:
+                    response_cache.put(
+                        cache_key, _turn_to_record(msg_stats.content, msg_stats.token_logprobs)
+                    )
+            generated = raw.get("generated_ids")
+            usage = {"output_tokens": len(generated)} if generated is not None else None
+            _record_turn(
+                model_name, scope, idx, started, turn=(msg_stats.content, None, raw, None, usage)
+            )
+
+            transcript += f" {msg_stats.content}\n"
+
+            result_messages.append(msg_stats)
+            assistant_messages.append(msg_stats)
+            raw_responses.append(raw)
+
+        return ConversationResult(
+            model_name=model_name,
+            messages=result_messages,
+            assistant_messages=assistant_messages,
+            raw_responses=raw_responses,
+        )
+
+    def _scope_kwargs(
+        self, gen_kwargs: Dict[str, Any], max_new_tokens: int, stop: _StopSpec
+    ) -> Dict[str, Any]:
+        """Generation settings for the ResponseCache scope (quantization changes outputs)."""
+        scope = dict(
+            gen_kwargs, max_new_tokens=max_new_tokens, dtype=self.dtype, stop=stop.cache_value
+        )
+        if self.profile.quantize:
+            scope["quantize"] = self.profile.quantize
+        return scope
+
+    def _generate_kwargs(
+        self, gen_kwargs: Dict[str, Any], stop: _StopSpec, prompt_len: int
+    ) -> Dict[str, Any]:
+        """gen_kwargs plus what generate() needs to honour `stop`."""
+        if not stop:
+            return gen_kwargs
+        kwargs = dict(gen_kwargs)
+        if stop.strings:
+            kwargs["stopping_criteria"] = transformers.StoppingCriteriaList(
+                list(gen_kwargs.get("stopping_criteria") or [])
+                + [_StopStringCriteria(self.tokenizer, stop.strings, prompt_len)]
+            )
+        if stop.token_ids:
+            # generate() already ends a row at any of its eos ids
+            kwargs["eos_token_id"] = sorted(self._eos_token_ids() | set(stop.token_ids))
+        return kwargs
+
+    def _generate_turn(
+        self,
+        full_prompt: str,
+        kv_state: Optional[_KVCacheState],
+        want_logprobs: bool,
+        max_new_tokens: int,
+        gen_kwargs: Dict[str, Any],
+        stream: bool = False,
+        stop: _StopSpec = _StopSpec(),
+    ) -> Tuple[MessageStats, Dict[str, Any]]:
+        """
+        Generate one assistant turn for full_prompt, updating kv_state in place.
+
+        With stream=True a streamer timestamps every generated token, so the
+        turn carries a MessageTiming (ttft covers tokenization + prefill).
+        Generation ends at the first stop string / token and the output is
+        trimmed there (see _StopSpec).
+        """
+        timer = _TurnTimer() if stream else None
+        inputs = self.tokenizer(
+            full_prompt, return_tensors="pt", add_special_tokens=False
+        ).to(self.device)
+
+        past = None
+        # Assisted generation does not continue correctly from a supplied KV
+        # cache (the output drifts from plain greedy decoding), so assisted
+        # turns always encode their full prompt.
+        if kv_state is not None and self.draft_model is None:
+            prompt_ids = inputs["input_ids"][0].tolist()
+            past = self._reusable_kv_cache(kv_state, prompt_ids)
+            if past is None and self.prefix_cache is not None:
+                past = self._shared_prefix_kv_cache(prompt_ids)
+
+        counter = _ForwardCounter(self.model, self.draft_model) if self.draft_model else None
+        started = time.perf_counter()
+        with torch.no_grad(), counter or contextlib.nullcontext():  # type: ignore[attr-defined]
+            output = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                return_dict_in_generate=True,
+                output_scores=want_logprobs,
+                past_key_values=past,
+                use_cache=True,
+                streamer=_TimingStreamer(timer) if timer is not None else None,
+                assistant_model=self.draft_model,
+                **self._generate_kwargs(gen_kwargs, stop, inputs["input_ids"].shape[1]),
+            )
+        generate_s = time.perf_counter() - started
+
+        if kv_state is not None and output.past_key_values is not None:
+            kv_state.past = output.past_key_values
+            kv_state.ids = output.sequences[0].tolist()[: _cache_seq_len(kv_state.past)]
+
+        seq = output.sequences[0]
+        input_len = inputs["input_ids"].shape[1]
+        generated_ids = seq[input_len:]
+
+        logprobs = self._chosen_token_logprobs(output)[0] if want_logprobs else None
+        msg_stats, raw = self._finish_turn(generated_ids, logprobs, stop)
+        if timer is not None:
+            msg_stats.timing = timer.finish(len(generated_ids))
+        if counter is not None:
+            msg_stats.usage = self._assisted_usage(counter, len(generated_ids), generate_s)
+        return msg_stats, raw
+
+    def _assisted_usage(
+        self, counter: _ForwardCounter, decoded: int, generate_s: float
+    ) -> Dict[str, int]:
+        """
+        Draft / verification counts of one assisted turn. Every target forward
+        yields one token of its own, so accepted drafts = decoded - forwards.
+        target_only_us estimates the same turn without the draft from a
+        calibrated single-token decode step of the target.
+        """
+        target_forwards, draft_tokens = counter.counts
+        return {
+            "output_tokens": decoded,
+            "draft_tokens": draft_tokens,
+            "accepted_draft_tokens": max(0, min(draft_tokens, decoded - target_forwards)),
+            "target_forwards": target_forwards,
+            "generate_us": int(generate_s * 1e6),
+            "target_only_us": int(decoded * self._target_decode_step_s() * 1e6),
+        }
+
+    def _target_decode_step_s(self, context: int = 64, steps: int = 8) -> float:
+        """Median time of one single-token decode step of the target (measured once)."""
+        if self._target_step_s is None:
+            vocab = int(self.model.config.vocab_size)
+            ids = torch.arange(context, device=self.device).unsqueeze(0) % vocab
+            times = []
+            with torch.no_grad():  # type: ignore[attr-defined]
+                out = self.model(input_ids=ids, use_cache=True)
+                past = out.past_key_values
+                next_id = ids[:, -1:]
+                for _ in range(steps):
+                    started = time.perf_counter()
+                    out = self.model(input_ids=next_id, past_key_values=past, use_cache=True)
+                    times.append(time.perf_counter() - started)
+                    past = out.past_key_values
+            self._target_step_s = sorted(times)[len(times) // 2]
+        return self._target_step_s
+
+    def run_conversations_batched(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        n_conversations: int,
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        **gen_kwargs: Any,
+    ) -> List[ConversationResult]:
+        """
+        Advance n_conversations independent conversations together, turn by turn.
+
+        Every turn is a single left-padded `generate` call over the whole batch.
+        Each sequence is cut after its own EOS before decoding, so every returned
+        ConversationResult looks exactly like one produced by run_conversation.
+        Only meaningful with sampling (do_sample=True); greedy runs are identical.
+        """
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
+        if n_conversations < 1:
+            raise ValueError(f"n_conversations must be >= 1 (got {n_conversations}).")
+
+        request_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        max_new_tokens = gen_kwargs.pop("max_new_tokens", 256)
+        stop = _StopSpec.from_kwarg(gen_kwargs.pop("stop", None))
+        if _pop_stream(model_name, gen_kwargs):
+            raise ValueError("stream=True is not supported for batched generation.")
+
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        results = [
+            ConversationResult(model_name=model_name, messages=[], assistant_messages=[])
+            for _ in range(n_conversations)
+        ]
+        transcripts = [""] * n_conversations
+
+        if system_prompt:
+            for b, conv in enumerate(results):
+                transcripts[b] += f"[SYSTEM]: {system_prompt}\n"
+                conv.messages.append(MessageStats(role="system", content=system_prompt))
+
+        for idx, user_prompt in enumerate(user_prompts):
+            full_prompts = []
+            for b, conv in enumerate(results):
+                transcripts[b] += f"[USER]: {user_prompt}\n"
+                conv.messages.append(MessageStats(role="user", content=user_prompt))
+                full_prompts.append(transcripts[b] + "[ASSISTANT]:")
+
             inputs = self.tokenizer(
-                full_prompt, return_tensors="pt", add_special_tokens=False
+                full_prompts,
+                return_tensors="pt",
+                padding=True,
+                padding_side="left",  # generation continues from the right edge
+                add_special_tokens=False,
             ).to(self.device)
 
-            max_new_tokens = gen_kwargs.pop("max_new_tokens", 256)
-
             with torch.no_grad():  # type: ignore[attr-defined]
                 output = self.model.generate(
                     **inputs,
                     max_new_tokens=max_new_tokens,
                     return_dict_in_generate=True,
-                    output_scores=True,
-                    **gen_kwargs,
+                    output_scores=request_logprobs[idx],
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    **self._generate_kwargs(gen_kwargs, stop, inputs["input_ids"].shape[1]),
                 )
 
-            seq = output.sequences[0]
             input_len = inputs["input_ids"].shape[1]
-            generated_ids = seq[input_len:]
-
-            scores = output.scores  # list[tensor[batch, vocab]]
-            tokens = self.tokenizer.convert_ids_to_tokens(generated_ids)
-
-            token_stats: List[TokenLogProb] = []
-            if request_logprobs[idx]:
-                for pos, (tok_id, logits) in enumerate(zip(generated_ids, scores)):
-                    log_probs = torch.nn.functional.log_softmax(logits[0], dim=-1)  # type: ignore[attr-defined]
-                    lp = float(log_probs[tok_id])
-                    token_stats.append(
-                        TokenLogProb(
-                            token=tokens[pos],
-                            logprob=lp,
-                            position=pos,
-                        )
-                    )
+            batch_logprobs = (
+                self._chosen_token_logprobs(output) if request_logprobs[idx] else None
+            )
+            for b, conv in enumerate(results):
+                generated_ids = self._trim_at_eos(output.sequences[b, input_len:])
+                logprobs = (
+                    batch_logprobs[b, : len(generated_ids)]
+                    if batch_logprobs is not None
+                    else None
+                )
+                msg_stats, raw = self._finish_turn(generated_ids, logprobs, stop)
+                transcripts[b] += f" {msg_stats.content}\n"
+
+                conv.messages.append(msg_stats)
+                conv.assistant_messages.append(msg_stats)
+                conv.raw_responses.append(raw)
+
+        return results
+
+    def run_conversations_continuous(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        n_conversations: int,
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        max_batch_size: int = 16,
+        max_kv_bytes: Optional[int] = None,
+        on_result: Optional[Callable[[ConversationResult], None]] = None,
+        **gen_kwargs: Any,
+    ) -> List[ConversationResult]:
+        """
+        Generate n_conversations conversations with continuous batching.
+
+        Up to max_batch_size turns are decoded together; a turn that finishes
+        frees its slot at once for the next queued turn (of any conversation),
+        and max_kv_bytes caps the KV cache memory. See
+        scheduler.ContinuousBatchScheduler.
+        """
+        from .scheduler import ContinuousBatchScheduler  # avoid circular import at import time
+
+        scheduler = ContinuousBatchScheduler(self, max_batch_size, max_kv_bytes)
+        return scheduler.run(
+            model_name,
+            user_prompts,
+            n_conversations,
+            system_prompt=system_prompt,
+            request_logprobs=request_logprobs,
+            on_result=on_result,
+            **gen_kwargs,
+        )
+
+    @staticmethod
+    def _reusable_kv_cache(state: _KVCacheState, prompt_ids: List[int]) -> Any:
+        """
+        Return a KV cache covering a verified prefix of prompt_ids, or None.
+
+        Correctness check: the cache is only reused for the leading tokens that
+        are identical to the freshly tokenized full transcript. Anything after the
+        first mismatch (e.g. where the decoded assistant text re-tokenizes
+        differently) is cropped and re-encoded. The model therefore always sees
+        exactly the token sequence of the full-recompute path.
+        """
+        if state.past is None:
+            return None
+
+        # generate() needs at least one uncached prompt token to start from
+        n = min(_common_prefix_len(state.ids, prompt_ids), len(prompt_ids) - 1)
+        if n <= 0:
+            state.past, state.ids = None, []
+            return None
+
+        if n < len(state.ids):
+            if not hasattr(state.past, "crop"):
+                # legacy tuple caches cannot be truncated; recompute from scratch
+                state.past, state.ids = None, []
+                return None
+            state.past.crop(n)
+            state.ids = state.ids[:n]
+
+        return state.past
+
+    def _shared_prefix_kv_cache(self, prompt_ids: List[int]) -> Any:
+        """
+        KV cache for prompt_ids[:-1] from the prefix cache, prefilling it on a miss.
+        The returned cache is private to the caller and may be extended in place.
+        """
+        if len(prompt_ids) < 2:
+            return None
+
+        model_key = self._model_key
+        past = self.prefix_cache.lookup(model_key, prompt_ids)  # type: ignore[union-attr]
+        if past is not None:
+            return past
+
+        prefix = prompt_ids[:-1]
+        with torch.no_grad():  # type: ignore[attr-defined]
+            out = self.model(
+                input_ids=torch.tensor([prefix], device=self.device),  # type: ignore[attr-defined]
+                use_cache=True,
+            )
+        self.prefix_cache.store(model_key, prefix, out.past_key_values)  # type: ignore[union-attr]
+        return out.past_key_values
+
+    def _eos_token_ids(self) -> set:
+        eos = getattr(self.model.generation_config, "eos_token_id", None)
+        if eos is None:
+            eos = self.tokenizer.eos_token_id
+        if eos is None:
+            return set()
+        return set(eos) if isinstance(eos, (list, tuple)) else {eos}
+
+    def _trim_at_eos(self, generated_ids: Any) -> Any:
+        """Cut a batch row after its first EOS; what follows is only padding."""
+        eos_ids = self._eos_token_ids()
+        for pos, tok_id in enumerate(generated_ids.tolist()):
+            if tok_id in eos_ids:
+                return generated_ids[: pos + 1]
+        return generated_ids
+
+    def _chosen_token_logprobs(self, output: Any) -> Any:
+        """
+        Log-probs of the generated tokens as a float32 array [batch, new_tokens].
+
+        compute_transition_scores gathers the chosen token's log-softmax score for
+        every step in one vectorized call, instead of a per-token Python loop over
+        full-vocabulary tensors.
+        """
+        scores = self.model.compute_transition_scores(
+            output.sequences, output.scores, normalize_logits=True
+        )
+        return scores.float().cpu().numpy()
+
+    def _cut_at_stop(
+        self, generated_ids: Any, stop: _StopSpec
+    ) -> Tuple[Any, Any, Optional[str]]:
+        """
+        Remove the first stop token / string and everything after it.
+
+        Returns (kept ids, matched stop or None, text or None). Only tokens that
+        lie entirely before a stop string are kept; the text is cut exactly at
+        the string (trailing whitespace dropped).
+        """
+        ids = generated_ids.tolist()
+        for pos, tok_id in enumerate(ids):
+            if tok_id in stop.token_ids:
+                return generated_ids[:pos], tok_id, None
+        if not stop.strings:
+            return generated_ids, None, None
+
+        text = self.tokenizer.decode(ids, skip_special_tokens=True)
+        hits = [(text.find(s), s) for s in stop.strings if s in text]
+        if not hits:
+            return generated_ids, None, text
+        cut, matched = min(hits)
+
+        # largest k whose decoded prefix ends at or before the cut
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if len(self.tokenizer.decode(ids[:mid], skip_special_tokens=True)) <= cut:
+                lo = mid
+            else:
+                hi = mid - 1
+        return generated_ids[:lo], matched, text[:cut].rstrip()
+
+    def _finish_turn(
+        self,
+        generated_ids: Any,
+        logprobs: Any = None,
+        stop: _StopSpec = _StopSpec(),
+    ) -> Tuple[MessageStats, Dict[str, Any]]:
+        """
+        Build the assistant MessageStats and raw record for one generated sequence.
+
+        logprobs is this sequence's row of _chosen_token_logprobs (or None when
+        log-probs were not requested for the turn). With a stop spec, the
+        sequence (and its log-probs) end before the first stop.
+        """
+        decoded = len(generated_ids)
+        matched, assistant_text = None, None
+        if stop:
+            generated_ids, matched, assistant_text = self._cut_at_stop(generated_ids, stop)
+            if logprobs is not None:
+                logprobs = logprobs[: len(generated_ids)]
+        tokens = self.tokenizer.convert_ids_to_tokens(generated_ids)
+
+        # wraps the float32 row as is; no per-token Python objects
+        token_stats = TokenLogProbs(tokens, logprobs) if logprobs is not None else None
+
+        if assistant_text is None:
+            assistant_text = self.tokenizer.decode(generated_ids, skip_special_tokens=True)
+
+        msg_stats = MessageStats(
+            role="assistant",
+            content=assistant_text,
+            tokens=tokens if token_stats else None,
+            token_logprobs=token_stats if token_stats else None,
+        )
+        raw = {
+            "generated_ids": generated_ids.tolist(),
+            "tokens": tokens,
+            "token_logprobs": logprobs,  # float32 array or None
+        }
+        if matched is not None:
+            raw.update(finish_reason="stop", stop=matched, num_decoded_tokens=decoded)
+        return msg_stats, raw
+
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        """
+        Run run_conversation in a worker thread.
+
+        Generation is compute-bound, so concurrency here only overlaps Python
+        overhead; torch releases the GIL inside its kernels.
+        """
+        return await asyncio.to_thread(
+            self.run_conversation,
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            response_cache,
+            run_index,
+            **gen_kwargs,
+        )
+
+
+# --- Simulated offline client --------------------------------------------------------
+
+
+class SimulatedProviderError(RuntimeError):
+    """Error injected by SimulatedChatClient; mirrors an HTTP error status."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+_SIM_SENTENCES = [
+    "I understand how you feel right now.",
+    "Physiotherapy can help you regain strength and mobility.",
+    "Let's take it one step at a time together.",
+    "Your well-being is the most important thing to me.",
+    "Would you like to talk about what is bothering you?",
+    "We can adjust the session so it feels more comfortable.",
+    "It's completely normal to have days like this.",
+    "Rest is important, and we can reschedule if needed.",
+    "I'm here to support you every step of the way.",
+    "Small steps today make a big difference tomorrow.",
+]
+_SIM_CUES = [
+    "[Neutral speech] [Neutral facial expression]",
+    "[Slow speech] [Sadness facial expression]",
+    "[Fast speech] [Happiness facial expression]",
+    "[Neutral speech] [Surprise facial expression]",
+]
+
+
+class SimulatedChatClient:
+    """
+    Offline stand-in provider for load tests and air-gapped CI.
+
+    Replies are drawn from seeded templates or from a recorded corpus, and every
+    reply is a deterministic function of (seed, run_index, message history), so
+    runs are reproducible. Optional MODEL_CONFIG keys (all default to "off"):
+
+        "corpus": path to a JSON file, or an inline list. Either a list of replies
+                  (sampled per turn) or a list of recorded conversations
+                  (list of replies, turn i uses reply i)
+        "supports_logprobs": emit synthetic per-token logprobs
+        "seed": base seed (default 0)
+        "latency": {"distribution": "constant" | "uniform" | "normal" | "lognormal",
+                    "mean": seconds, "jitter": seconds}   # per request
+        "per_token_latency": extra seconds per generated token (decode time)
+        "rate_limit_rate": probability that a request fails with status 429
+        "retry_after": Retry-After seconds reported with injected 429s
+        "failure_rate": probability that a request fails with status 500
+
+    With stream=True the request latency is served before the first token and
+    the per-token latency after it, so the reported MessageTiming matches the
+    configured prefill / decode split.
+    """
+
+    def __init__(self, cfg: Dict[str, Any]):
+        self._cfg = cfg
+        self._corpus = self._load_corpus(cfg.get("corpus"))
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_corpus(corpus: Any) -> Optional[List[Any]]:
+        if corpus is None:
+            return None
+        if isinstance(corpus, (str, os.PathLike)):
+            with open(corpus, "r", encoding="utf-8") as fh:
+                corpus = json.load(fh)
+        if not isinstance(corpus, list) or not corpus:
+            raise ValueError("Simulated corpus must be a non-empty list.")
+        return corpus
+
+    def run_conversation(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
+
+        request_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        model_id = self._cfg.get("model_id", model_name)
+        stream = _pop_stream(model_name, gen_kwargs)
+
+        def complete_turn(messages: List[Dict[str, str]], want_logprobs: bool) -> TurnResult:
+            turn, first_token_delay, decode_delay = self._sample_turn(
+                messages, want_logprobs, run_index
+            )
+            if not stream:
+                time.sleep(first_token_delay + decode_delay)
+                return turn
+            timer = _TurnTimer()
+            time.sleep(first_token_delay)
+            timer.mark_token()
+            time.sleep(decode_delay)
+            return turn + (timer.finish(turn[2]["usage"]["output_tokens"]),)
+
+        return _run_chat_turns(
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            complete_turn,
+            response_cache,
+            _cache_scope("simulated", model_id, gen_kwargs, run_index),
+            _rate_limiter(model_name),
+        )
+
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
 
-            assistant_text = self.tokenizer.decode(
-                generated_ids, skip_special_tokens=True
+        request_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        model_id = self._cfg.get("model_id", model_name)
+        stream = _pop_stream(model_name, gen_kwargs)
+
+        async def complete_turn(
+            messages: List[Dict[str, str]], want_logprobs: bool
+        ) -> TurnResult:
+            turn, first_token_delay, decode_delay = self._sample_turn(
+                messages, want_logprobs, run_index
             )
-            transcript += f" {assistant_text}\n"
+            if not stream:
+                await asyncio.sleep(first_token_delay + decode_delay)
+                return turn
+            timer = _TurnTimer()
+            await asyncio.sleep(first_token_delay)
+            timer.mark_token()
+            await asyncio.sleep(decode_delay)
+            return turn + (timer.finish(turn[2]["usage"]["output_tokens"]),)
+
+        return await _run_chat_turns_async(
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            complete_turn,
+            response_cache,
+            _cache_scope("simulated", model_id, gen_kwargs, run_index),
+            _rate_limiter(model_name),
+        )
+
+    def complete(
+        self, messages: List[Dict[str, str]], want_logprobs: bool = False, run_index: int = 0
+    ) -> TurnResult:
+        """One simulated reply without latency or error injection (batch stand-ins)."""
+        rng = random.Random(self._request_key(messages, run_index))
+        return self._sample_text(rng, messages, want_logprobs)
+
+    def _request_key(self, messages: List[Dict[str, str]], run_index: int) -> str:
+        payload = json.dumps([self._cfg.get("seed", 0), run_index, messages])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _sample_turn(
+        self, messages: List[Dict[str, str]], want_logprobs: bool, run_index: int
+    ) -> Tuple[TurnResult, float, float]:
+        """
+        Return (turn, first_token_delay, decode_delay) in seconds, or raise an
+        injected SimulatedProviderError.
+
+        Injected errors use a separate random stream that also depends on how
+        often this exact request was attempted, so a retried request can succeed.
+        """
+        request_key = self._request_key(messages, run_index)
+        rng = random.Random(request_key)
+        text, token_stats, raw = self._sample_text(rng, messages, want_logprobs)
+
+        # --- Latency ----------------------------------------------------------------
+        first_token_delay = self._sample_latency(rng)
+        decode_delay = max(0, len(text.split()) - 1) * float(
+            self._cfg.get("per_token_latency", 0.0)
+        )
 
-            msg_stats = MessageStats(
-                role="assistant",
-                content=assistant_text,
-                tokens=tokens if token_stats else None,
-                token_logprobs=token_stats if token_stats else None,
+        # --- Injected errors --------------------------------------------------------
+        with self._lock:
+            attempt = self._attempts.get(request_key, 0) + 1
+            self._attempts[request_key] = attempt
+        err_rng = random.Random(f"{request_key}:{attempt}")
+        if err_rng.random() < float(self._cfg.get("rate_limit_rate", 0.0)):
+            raise SimulatedProviderError(
+                "Simulated rate limit exceeded.",
+                status_code=429,
+                retry_after=self._cfg.get("retry_after"),
             )
-            result_messages.append(msg_stats)
-            assistant_messages.append(msg_stats)
+        if err_rng.random() < float(self._cfg.get("failure_rate", 0.0)):
+            raise SimulatedProviderError("Simulated server error.", status_code=500)
+
+        return (text, token_stats, raw), first_token_delay, decode_delay
+
+    def _sample_text(
+        self, rng: random.Random, messages: List[Dict[str, str]], want_logprobs: bool
+    ) -> TurnResult:
+        turn_idx = sum(1 for m in messages if m["role"] == "user") - 1
+
+        if self._corpus is None:
+            n_sentences = rng.randint(2, 6)
+            text = " ".join(
+                [rng.choice(_SIM_CUES)] + [rng.choice(_SIM_SENTENCES) for _ in range(n_sentences)]
+            )
+        else:
+            entry = rng.choice(self._corpus)
+            if isinstance(entry, list):
+                text = str(entry[min(turn_idx, len(entry) - 1)])
+            else:
+                text = str(entry)
+
+        tokens = text.split()
+        token_stats = None
+        if want_logprobs and self._cfg.get("supports_logprobs", False):
+            token_stats = TokenLogProbs(
+                tokens, [min(0.0, rng.gauss(-0.8, 0.6)) for _ in tokens]
+            )
+
+        raw = {"simulated": True, "usage": {"output_tokens": len(tokens)}}
+        return text, token_stats, raw
 
-            raw_responses.append(
+    def _sample_latency(self, rng: random.Random) -> float:
+        spec = self._cfg.get("latency") or {}
+        mean = float(spec.get("mean", 0.0))
+        jitter = float(spec.get("jitter", 0.0))
+        dist = spec.get("distribution", "constant")
+
+        if dist == "constant" or mean <= 0.0:
+            value = mean
+        elif dist == "uniform":
+            value = rng.uniform(mean - jitter, mean + jitter)
+        elif dist == "normal":
+            value = rng.gauss(mean, jitter)
+        elif dist == "lognormal":
+            # parametrized so that the distribution's mean/std are (mean, jitter)
+            sigma2 = math.log(1.0 + (jitter / mean) ** 2)
+            value = rng.lognormvariate(math.log(mean) - sigma2 / 2.0, math.sqrt(sigma2))
+        else:
+            raise ValueError(f"Unknown simulated latency distribution '{dist}'.")
+        return max(0.0, value)
+
+
+# --- Raw response retention ----------------------------------------------------------
+
+
+RawPolicy = Literal["none", "summary", "full", "spill"]
+_RAW_POLICIES = ("none", "summary", "full", "spill")
+
+
+class RawResponseSpill:
+    """
+    Gzip-compressed JSONL sidecar for full raw provider responses (raw="spill").
+
+    Each line is {"model_name", "run_index", "turn", "raw"} with the response
+    converted to plain JSON; the ConversationResult keeps a summary plus
+    {"spill": path, "line": n} pointing at the record. Thread-safe; close()
+    (or use as a context manager) to finish the gzip stream.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        self._fh: Any = None
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> int:
+        line = json.dumps(record, ensure_ascii=False, default=repr)
+        with self._lock:
+            if self._fh is None:
+                self._fh = gzip.open(self.path, "at", encoding="utf-8")
+            self._fh.write(line + "\n")
+            self._lines += 1
+            return self._lines - 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def __enter__(self) -> "RawResponseSpill":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def _raw_field(raw: Any, name: str) -> Any:
+    return raw.get(name) if isinstance(raw, dict) else getattr(raw, name, None)
+
+
+def _raw_summary(raw: Any) -> Optional[Dict[str, Any]]:
+    """Usage, finish reason and ids of a raw response, without the payload."""
+    if raw is None:
+        return None
+    if isinstance(raw, dict) and (raw.get("cached") or raw.get("simulated")):
+        return dict(raw)  # already small
+
+    finish_reason = _raw_field(raw, "finish_reason") or _raw_field(raw, "stop_reason")
+    choices = _raw_field(raw, "choices")
+    if finish_reason is None and choices:
+        finish_reason = _raw_field(choices[0], "finish_reason")
+
+    summary = {
+        "id": _raw_field(raw, "id"),
+        "model": _raw_field(raw, "model"),
+        "finish_reason": finish_reason or _raw_field(raw, "status"),
+        "usage": _usage_dict(_raw_field(raw, "usage")),
+    }
+    generated_ids = _raw_field(raw, "generated_ids")
+    if generated_ids is not None:
+        summary["num_generated_tokens"] = len(generated_ids)
+    return {k: v for k, v in summary.items() if v is not None}
+
+
+def _raw_payload(raw: Any) -> Any:
+    """Plain-JSON form of a raw response (SDK objects, dicts, numpy arrays)."""
+    if hasattr(raw, "model_dump"):
+        return raw.model_dump(mode="json")
+    if isinstance(raw, dict):
+        return {k: _raw_payload(v) for k, v in raw.items()}
+    if isinstance(raw, (list, tuple)):
+        return [_raw_payload(v) for v in raw]
+    if hasattr(raw, "tolist"):
+        return raw.tolist()
+    return raw
+
+
+def retain_raw_responses(
+    result: ConversationResult,
+    raw: RawPolicy = "summary",
+    spill: Optional[RawResponseSpill] = None,
+    run_index: int = 0,
+) -> ConversationResult:
+    """
+    Apply a retention policy to result.raw_responses in place and return result.
+
+        "none":    drop them (None per assistant message)
+        "summary": keep only id, model, finish reason and usage
+        "full":    keep the provider objects unchanged
+        "spill":   write full payloads to `spill` and keep summary + location
+    """
+    if raw not in _RAW_POLICIES:
+        raise ValueError(f"raw must be one of {list(_RAW_POLICIES)} (got {raw!r}).")
+    if raw == "full":
+        return result
+    if raw == "none":
+        result.raw_responses = [None] * len(result.raw_responses)
+        return result
+    if raw == "spill" and spill is None:
+        raise ValueError("raw='spill' requires a RawResponseSpill (raw_spill=...).")
+
+    retained: List[Any] = []
+    for turn, response in enumerate(result.raw_responses):
+        summary = _raw_summary(response)
+        if raw == "spill" and response is not None:
+            line = spill.write(  # type: ignore[union-attr]
                 {
-                    "generated_ids": generated_ids.tolist(),
-                    "tokens": tokens,
-                    "token_logprobs": [t.logprob for t in token_stats]
-                    if token_stats
-                    else None,
+                    "model_name": result.model_name,
+                    "run_index": run_index,
+                    "turn": turn,
+                    "raw": _raw_payload(response),
                 }
             )
-
-        return ConversationResult(
-            model_name=model_name,
-            messages=result_messages,
-            assistant_messages=assistant_messages,
-            raw_responses=raw_responses,
-        )
+            summary = dict(summary or {}, spill=spill.path, line=line)  # type: ignore[union-attr]
+        retained.append(summary)
+    result.raw_responses = retained
+    return result
 
 
 # --- Factory / public API ------------------------------------------------------------
 
 
-def create_llm_client(model_name: str, api_key: Optional[str] = None) -> LLMClient:
+def create_llm_client(
+    model_name: str,
+    api_key: Optional[str] = None,
+    http_pool: Optional[HTTPPool] = None,
+) -> LLMClient:
     """
     Factory that returns an LLM client appropriate for the configured provider.
 
@@ -746,26 +3706,49 @@ def create_llm_client(model_name: str, api_key: Optional[str] = None) -> LLMClie
         - "gpt-3.5-turbo", "gpt-4.1", "gpt-5.1-thinking" (OpenAI)
         - "gemini-1.0-pro", "gemini-1.5-pro" (Gemini)
         - "claude-3-opus", "claude-3.5-sonnet" (Anthropic)
+
+    Always builds a new client; use get_llm_client() / ClientRegistry to reuse
+    long-lived clients and their pooled connections.
+
+    Local HuggingFace models are served by the local model daemon when one is
+    running (see daemon.py), so the weights stay loaded across scripts;
+    otherwise they are loaded in this process. Set "daemon": False in the
+    entry to always load in-process, or "daemon_socket" to use another daemon.
     """
     cfg = _get_model_config(model_name)
     provider = cfg.get("provider")
 
-    if provider in ("openai", "anthropic", "gemini", "mistral"):
+    if provider in ("openai", "anthropic", "gemini", "mistral", "openai_compatible"):
         key = _resolve_api_key(cfg, api_key)
     else:
         key = api_key or ""
 
+    base_url = cfg.get("base_url")
+
     if provider == "openai":
-        return OpenAIChatClient(api_key=key)
+        return OpenAIChatClient(api_key=key, base_url=base_url, http_pool=http_pool)
+    if provider == "openai_compatible":
+        if not base_url:
+            raise ValueError(
+                f"Model '{model_name}' uses provider 'openai_compatible' but has no base_url."
+            )
+        return OpenAICompatibleChatClient(api_key=key, base_url=base_url, http_pool=http_pool)
     if provider == "anthropic":
-        return AnthropicChatClient(api_key=key)
+        return AnthropicChatClient(api_key=key, base_url=base_url, http_pool=http_pool)
     if provider == "gemini":
         return GeminiChatClient(api_key=key)
     if provider == "mistral":
-        return MistralChatClient(api_key=key)
+        return MistralChatClient(api_key=key, base_url=base_url, http_pool=http_pool)
+    if provider == "simulated":
+        return SimulatedChatClient(cfg)
     if provider in ("huggingface", "local", "llama_local"):
-        model_id = cfg.get("model_id", model_name)
-        return HuggingFaceLocalClient(model_id=model_id)
+        if cfg.get("daemon", True):
+            from .daemon import connect_local_daemon  # avoid circular import at import time
+
+            client = connect_local_daemon(model_name, cfg)
+            if client is not None:
+                return client
+        return _create_local_client(model_name, cfg)
 
     raise NotImplementedError(
         f"Provider '{provider}' is not implemented yet in client.py. "
@@ -773,12 +3756,111 @@ def create_llm_client(model_name: str, api_key: Optional[str] = None) -> LLMClie
     )
 
 
+def _create_local_client(model_name: str, cfg: Dict[str, Any]) -> HuggingFaceLocalClient:
+    """In-process client for a local HuggingFace MODEL_CONFIG entry."""
+    return HuggingFaceLocalClient(
+        model_id=cfg.get("model_id", model_name),
+        device=cfg.get("device"),
+        dtype=cfg.get("dtype"),
+        reuse_kv_cache=bool(cfg.get("reuse_kv_cache", True)),
+        share_prefix_cache=bool(cfg.get("share_prefix_cache", True)),
+        inference_profile=cfg.get("inference_profile"),
+        draft_model_id=cfg.get("draft_model_id"),
+    )
+
+
+class ClientRegistry:
+    """
+    Process-wide cache of long-lived LLM clients.
+
+    Clients are keyed by (provider, api key, base url), so all models of one
+    provider account share a single SDK client, and every SDK client shares one
+    pooled keep-alive HTTP transport. Use as a context manager or call close()
+    to release connections:
+
+        with ClientRegistry(max_connections=50) as registry:
+            client = registry.get("gpt-4.1")
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+    ):
+        self._pool_kwargs = dict(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._pool: Optional[HTTPPool] = None
+        self._clients: Dict[Tuple[Any, str, Optional[str]], LLMClient] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, model_name: str, api_key: Optional[str]) -> Tuple[Any, str, Optional[str]]:
+        cfg = _get_model_config(model_name)
+        provider = cfg.get("provider")
+        if provider in ("openai", "anthropic", "gemini", "mistral", "openai_compatible"):
+            return provider, _resolve_api_key(cfg, api_key), cfg.get("base_url")
+        # Local clients are configured per entry (device, dtype), so key by entry;
+        # their weights are shared through the LocalModelCache anyway.
+        return provider, api_key or "", model_name
+
+    def get(self, model_name: str, api_key: Optional[str] = None) -> LLMClient:
+        """Return the shared client for model_name, creating it on first use."""
+        key = self._key(model_name, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if self._pool is None and httpx.available():
+                    self._pool = HTTPPool(**self._pool_kwargs)
+                client = create_llm_client(
+                    model_name, api_key=key[1] or api_key, http_pool=self._pool
+                )
+                self._clients[key] = client
+            return client
+
+    def close(self) -> None:
+        """Drop all cached clients and close the shared HTTP transport."""
+        with self._lock:
+            self._clients.clear()
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def __enter__(self) -> "ClientRegistry":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+_DEFAULT_REGISTRY: Optional[ClientRegistry] = None
+
+
+def default_registry() -> ClientRegistry:
+    """The registry used by run_conversation / run_conversation_async."""
+    global _DEFAULT_REGISTRY
+    if _DEFAULT_REGISTRY is None:
+        _DEFAULT_REGISTRY = ClientRegistry()
+    return _DEFAULT_REGISTRY
+
+
+def get_llm_client(model_name: str, api_key: Optional[str] = None) -> LLMClient:
+    """Return a long-lived client for model_name from the default registry."""
+    return default_registry().get(model_name, api_key=api_key)
+
+
 def run_conversation(
     model_name: str,
     user_prompts: List[str],
     api_key: Optional[str] = None,
     system_prompt: Optional[str] = None,
     request_logprobs: Optional[List[bool]] = None,
+    response_cache: Optional[ResponseCache] = None,
+    run_index: int = 0,
+    raw: RawPolicy = "summary",
+    raw_spill: Optional[RawResponseSpill] = None,
     **gen_kwargs: Any,
 ) -> ConversationResult:
     """
@@ -792,6 +3874,12 @@ def run_conversation(
         - request_logprobs: optional list of booleans, one per user prompt, or length 1.
           True means: request or compute token log-probs for that assistant reply
           (where the model/client supports it).
+        - response_cache: optional ResponseCache; turns already generated for the same
+          (provider, model, history, gen_kwargs, run_index) are read from disk
+        - run_index: index of this run among repeated samples (part of the cache key)
+        - raw: what to keep in .raw_responses: "summary" (default: id, model,
+          finish reason, usage), "none", "full" (provider SDK objects) or
+          "spill" (full payloads written to raw_spill, a RawResponseSpill)
         - gen_kwargs: extra generation kwargs (temperature, max_tokens, etc.)
 
     Output:
@@ -800,21 +3888,76 @@ def run_conversation(
         - .assistant_messages: only the generated messages
         - token-level log-probs where available (None otherwise)
     """
-    client = create_llm_client(model_name, api_key=api_key)
-    return client.run_conversation(
+    client = get_llm_client(model_name, api_key=api_key)
+    result = client.run_conversation(
+        model_name=model_name,
+        user_prompts=user_prompts,
+        system_prompt=system_prompt,
+        request_logprobs=request_logprobs,
+        response_cache=response_cache,
+        run_index=run_index,
+        **gen_kwargs,
+    )
+    return retain_raw_responses(result, raw, raw_spill, run_index)
+
+
+async def run_conversation_async(
+    model_name: str,
+    user_prompts: List[str],
+    api_key: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+    request_logprobs: Optional[List[bool]] = None,
+    response_cache: Optional[ResponseCache] = None,
+    run_index: int = 0,
+    raw: RawPolicy = "summary",
+    raw_spill: Optional[RawResponseSpill] = None,
+    **gen_kwargs: Any,
+) -> ConversationResult:
+    """
+    Asyncio counterpart of run_conversation.
+
+    Same inputs and output. Turns inside the conversation are awaited in order,
+    so several conversations can be gathered concurrently, e.g.:
+
+        results = await asyncio.gather(
+            *(run_conversation_async("gpt-4.1", prompts) for _ in range(10))
+        )
+    """
+    client = get_llm_client(model_name, api_key=api_key)
+    result = await client.run_conversation_async(
         model_name=model_name,
         user_prompts=user_prompts,
         system_prompt=system_prompt,
         request_logprobs=request_logprobs,
+        response_cache=response_cache,
+        run_index=run_index,
         **gen_kwargs,
     )
+    return retain_raw_responses(result, raw, raw_spill, run_index)
 
 
 __all__ = [
     "TokenLogProb",
+    "TokenLogProbs",
     "MessageStats",
+    "MessageTiming",
     "ConversationResult",
     "LLMClient",
+    "SimulatedChatClient",
+    "SimulatedProviderError",
+    "HTTPPool",
+    "ClientRegistry",
+    "default_registry",
+    "get_llm_client",
+    "InferenceProfile",
+    "INFERENCE_PROFILES",
+    "LocalModelCache",
+    "local_model_cache",
+    "PrefixKVCache",
+    "prefix_kv_cache",
     "create_llm_client",
     "run_conversation",
+    "run_conversation_async",
+    "RawResponseSpill",
+    "retain_raw_responses",
 ]
@@ -2,51 +2,52 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import itertools
 import math
-from typing import Any, Callable, Dict, List, Optional, Tuple
-
-import pandas as pd
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+from .batch import run_conversations_batch
+from .cache import ResponseCache
 from .config import MODEL_CONFIG
-from .client import run_conversation, ConversationResult, MessageStats
-
-# External metric libs
-import sacrebleu
-from rouge_score import rouge_scorer
-
-# Readability
-try:
-    import textstat
-
-    _HAS_TEXTSTAT = True
-except ImportError:  # pragma: no cover
-    _HAS_TEXTSTAT = False
-
-# TF-IDF
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-
-    _HAS_SKLEARN = True
-except ImportError:  # pragma: no cover
-    _HAS_SKLEARN = False
-
-# POS tagging
-try:
-    import nltk
-    from nltk import pos_tag, word_tokenize
-
-    _HAS_NLTK = True
-except ImportError:  # pragma: no cover
-    _HAS_NLTK = False
-
-# Progress bar
-try:
-    from tqdm.auto import tqdm
-
-    _HAS_TQDM = True
-except ImportError:  # pragma: no cover
-    _HAS_TQDM = False
+from .client import (
+    ConversationResult,
+    MessageStats,
+    RawResponseSpill,
+    TokenLogProbs,
+    get_llm_client,
+    retain_raw_responses,
+    run_conversation,
+    run_conversation_async,
+)
+
+from .lazy import LazyModule
+from .replicas import LocalReplicaPool
+from .telemetry import collect_telemetry
+
+# Metric libraries are imported on first use, so runs that only generate (or
+# compute a single metric) do not pay for sklearn / nltk / pandas start-up.
+pd = LazyModule("pandas", "pandas package is not installed. Add 'pandas' to requirements.txt.")
+
+# External metric libs (required for BLEU / ROUGE-L)
+sacrebleu = LazyModule(
+    "sacrebleu", "sacrebleu package is not installed. Add 'sacrebleu' to requirements.txt."
+)
+rouge_scorer = LazyModule(
+    "rouge_score.rouge_scorer",
+    "rouge-score package is not installed. Add 'rouge-score' to requirements.txt.",
+)
+
+# Optional: readability, TF-IDF, POS tagging, progress bar
+textstat = LazyModule("textstat")
+sklearn_text = LazyModule("sklearn.feature_extraction.text")
+nltk = LazyModule("nltk")
+tqdm_auto = LazyModule("tqdm.auto")
+
+# Slots of batching="continuous" without batch_size (ContinuousBatchScheduler's default).
+CONTINUOUS_BATCH_SLOTS = 16
 
 
 # ---------------------------------------------------------------------------
@@ -120,15 +121,15 @@ def _pos_distribution(text: str) -> Dict[str, float]:
     Coarse POS distribution: NOUN, VERB, ADJ, ADV, OTHER.
     Uses NLTK if available; otherwise returns a flat distribution.
     """
-    if not _HAS_NLTK:
+    if not nltk.available():
         # Fallback: pretend we don't know, return equal mass.
         return {"NOUN": 0.2, "VERB": 0.2, "ADJ": 0.2, "ADV": 0.2, "OTHER": 0.2}
 
-    tokens = word_tokenize(text)
+    tokens = nltk.word_tokenize(text)
     if not tokens:
         return {"NOUN": 0.0, "VERB": 0.0, "ADJ": 0.0, "ADV": 0.0, "OTHER": 0.0}
 
-    tags = pos_tag(tokens)
+    tags = nltk.pos_tag(tokens)
 
     counts = {"NOUN": 0, "VERB": 0, "ADJ": 0, "ADV": 0, "OTHER": 0}
 
@@ -207,12 +208,12 @@ def _ngram_jaccard_bigram(t1: str, t2: str) -> float:
 
 
 def _tfidf_cosine_internal(texts: List[str]) -> Optional[float]:
-    if not _HAS_SKLEARN:
+    if not sklearn_text.available():
         return None
     if len(texts) < 2:
         return None
 
-    vectorizer = TfidfVectorizer()
+    vectorizer = sklearn_text.TfidfVectorizer()
     X = vectorizer.fit_transform(texts)  # [n_runs, vocab]
 
     vals: List[float] = []
@@ -232,7 +233,7 @@ def _tfidf_cosine_internal(texts: List[str]) -> Optional[float]:
 def _tfidf_cosine_reference(
     texts: List[str], reference: Optional[str]
 ) -> Optional[float]:
-    if not _HAS_SKLEARN:
+    if not sklearn_text.available():
         return None
     if reference is None or reference == "":
         return None
@@ -240,7 +241,7 @@ def _tfidf_cosine_reference(
         return None
 
     corpus = [reference] + texts
-    vectorizer = TfidfVectorizer()
+    vectorizer = sklearn_text.TfidfVectorizer()
     X = vectorizer.fit_transform(corpus)
 
     ref_vec = X[0]
@@ -280,12 +281,14 @@ def _bleu_reference(texts: List[str], reference: Optional[str]) -> Optional[floa
     return score
 
 
-_ROUGE_SCORER = rouge_scorer.RougeScorer(["rougeL"], use_stemmer=True)
+@functools.lru_cache(maxsize=None)
+def _rouge_scorer() -> Any:
+    return rouge_scorer.RougeScorer(["rougeL"], use_stemmer=True)
 
 
 def _rougeL_f1(t1: str, t2: str) -> float:
     """ROUGE-L F1 between t1 (reference) and t2 (hypothesis)."""
-    scores = _ROUGE_SCORER.score(t1, t2)
+    scores = _rouge_scorer().score(t1, t2)
     return float(scores["rougeL"].fmeasure)
 
 
@@ -349,7 +352,7 @@ def _readability(text: str) -> Tuple[float, float]:
     Returns (flesch_reading_ease, flesch_kincaid_grade).
     If textstat is not available, returns (nan, nan).
     """
-    if not _HAS_TEXTSTAT or not text.strip():
+    if not text.strip() or not textstat.available():
         return float("nan"), float("nan")
 
     try:
@@ -376,22 +379,343 @@ def _mean_std(values: List[float]) -> Tuple[float, float]:
 
 
 def _average_logprob_for_messages(msgs: List[MessageStats]) -> Optional[float]:
-    all_lps: List[float] = []
+    # token-weighted mean over all messages: sum of per-message array sums / count
+    total = 0.0
+    count = 0
     for msg in msgs:
-        if msg.token_logprobs:
-            all_lps.extend(t.logprob for t in msg.token_logprobs)
-    if not all_lps:
+        lps = TokenLogProbs.coerce(msg.token_logprobs)
+        if lps is not None:
+            total += lps.sum()
+            count += len(lps)
+    if not count:
         return None
-    return sum(all_lps) / len(all_lps)
+    return total / count
 
 
 def _average_logprob_for_message(msg: MessageStats) -> Optional[float]:
-    if not msg.token_logprobs:
-        return None
-    vals = [t.logprob for t in msg.token_logprobs]
-    if not vals:
+    lps = TokenLogProbs.coerce(msg.token_logprobs)
+    return lps.mean() if lps is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Timing helpers (streaming mode)
+# ---------------------------------------------------------------------------
+
+_TIMING_METRICS = ("queued_s", "ttft_s", "latency_s", "decode_tokens_per_s")
+
+
+def _timing_for_messages(msgs: List[MessageStats]) -> Optional[Dict[str, float]]:
+    """
+    Timing of one run (or one message) from MessageStats.timing.
+
+    For several messages: ttft is that of the first message, queueing and
+    latency are summed, and decode speed is total decode tokens / decode time.
+    """
+    timings = [m.timing for m in msgs if m.timing is not None]
+    if not timings:
         return None
-    return sum(vals) / len(vals)
+
+    nan = float("nan")
+    decode_tokens = 0.0
+    decode_s = 0.0
+    for t in timings:
+        if t.ttft_s is not None and t.output_tokens and t.output_tokens > 1:
+            decode_tokens += t.output_tokens - 1
+            decode_s += t.total_s - t.ttft_s
+    first_ttft = timings[0].ttft_s
+    return {
+        "queued_s": sum(t.queued_s for t in timings),
+        "ttft_s": first_ttft if first_ttft is not None else nan,
+        "latency_s": sum(t.total_s for t in timings),
+        "decode_tokens_per_s": decode_tokens / decode_s if decode_s > 0 else nan,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Run generation (sequential / concurrent / batched)
+# ---------------------------------------------------------------------------
+
+
+def _generate_runs(
+    model: str,
+    user_prompts: List[str],
+    n_runs: int,
+    progress_desc: Optional[str],
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    execution: str = "sync",
+    replicas: Optional[Union[int, LocalReplicaPool]] = None,
+    batching: str = "static",
+    **conv_kwargs: Any,
+) -> List[ConversationResult]:
+    """
+    Generate n_runs independent conversations and return them in run order.
+
+    With concurrency > 1, up to `concurrency` conversations are kept in flight
+    at once through the asyncio client path; turns inside each conversation
+    are still generated strictly in order.
+
+    With batch_size > 1, clients that support it (local HuggingFace models)
+    advance `batch_size` conversations together in one batched generate call
+    per turn. batching="continuous" instead keeps `batch_size` slots
+    (default CONTINUOUS_BATCH_SLOTS) busy: finished turns leave the batch at
+    once and queued turns of any run take their place (see scheduler.py).
+
+    With execution="batch", each turn of all runs is submitted as one provider
+    batch job (see batch.py) and all conversations advance together.
+
+    With replicas (a worker count or a running LocalReplicaPool), runs of a
+    local HuggingFace model are spread over worker processes that share
+    memory-mapped weights (see replicas.py).
+    """
+    if execution not in ("sync", "batch"):
+        raise ValueError(f"execution must be 'sync' or 'batch' (got {execution!r}).")
+    if batching not in ("static", "continuous"):
+        raise ValueError(f"batching must be 'static' or 'continuous' (got {batching!r}).")
+    if concurrency is not None and concurrency < 1:
+        raise ValueError(f"concurrency must be a positive integer (got {concurrency}).")
+    if batch_size is not None and batch_size < 1:
+        raise ValueError(f"batch_size must be a positive integer (got {batch_size}).")
+
+    if replicas is not None:
+        if (
+            execution != "sync"
+            or batching != "static"
+            or (batch_size or 1) > 1
+            or (concurrency or 1) > 1
+        ):
+            raise ValueError(
+                "replicas cannot be combined with concurrency, batch_size, "
+                "batching='continuous' or execution='batch'."
+            )
+        return _generate_runs_replicas(
+            model, user_prompts, n_runs, progress_desc, replicas, **conv_kwargs
+        )
+
+    if execution == "batch":
+        return _generate_runs_provider_batch(model, user_prompts, n_runs, **conv_kwargs)
+
+    if batching == "continuous":
+        slots = batch_size or CONTINUOUS_BATCH_SLOTS
+        return _generate_runs_batched(
+            model, user_prompts, n_runs, progress_desc, slots, batching, **conv_kwargs
+        )
+    if batch_size is not None and batch_size > 1:
+        return _generate_runs_batched(
+            model, user_prompts, n_runs, progress_desc, batch_size, batching, **conv_kwargs
+        )
+
+    if concurrency is not None and concurrency > 1:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError(
+                "int_consist(concurrency=...) cannot be called from a running event "
+                "loop (e.g. Jupyter). Run it in a script or use concurrency=None."
+            )
+        return asyncio.run(
+            _generate_runs_async(
+                model, user_prompts, n_runs, progress_desc, concurrency, **conv_kwargs
+            )
+        )
+
+    if progress_desc and n_runs > 1 and tqdm_auto.available():
+        run_iter = tqdm_auto.tqdm(range(n_runs), desc=progress_desc, unit="run")
+    else:
+        run_iter = range(n_runs)
+
+    return [
+        run_conversation(
+            model_name=model, user_prompts=user_prompts, run_index=i, **conv_kwargs
+        )
+        for i in run_iter
+    ]
+
+
+def _generate_runs_batched(
+    model: str,
+    user_prompts: List[str],
+    n_runs: int,
+    progress_desc: Optional[str],
+    batch_size: int,
+    batching: str = "static",
+    api_key: Optional[str] = None,
+    response_cache: Optional[ResponseCache] = None,
+    raw: str = "summary",
+    raw_spill: Optional[RawResponseSpill] = None,
+    **conv_kwargs: Any,
+) -> List[ConversationResult]:
+    if response_cache is not None:
+        raise ValueError("response_cache is not supported together with batch_size.")
+
+    client = get_llm_client(model, api_key=api_key)
+    if batching == "continuous":
+        return _generate_runs_continuous(
+            client,
+            model,
+            user_prompts,
+            n_runs,
+            progress_desc,
+            batch_size,
+            raw,
+            raw_spill,
+            **conv_kwargs,
+        )
+    if not hasattr(client, "run_conversations_batched"):
+        raise ValueError(
+            f"Model '{model}' does not support batched generation; "
+            "use batch_size=None (or concurrency=...) instead."
+        )
+
+    pbar = (
+        tqdm_auto.tqdm(total=n_runs, desc=progress_desc, unit="run")
+        if progress_desc and n_runs > 1 and tqdm_auto.available()
+        else None
+    )
+    conversations: List[ConversationResult] = []
+    try:
+        while len(conversations) < n_runs:
+            k = min(batch_size, n_runs - len(conversations))
+            batch = client.run_conversations_batched(  # type: ignore[attr-defined]
+                model_name=model,
+                user_prompts=user_prompts,
+                n_conversations=k,
+                **conv_kwargs,
+            )
+            conversations.extend(
+                retain_raw_responses(conv, raw, raw_spill, len(conversations) + j)
+                for j, conv in enumerate(batch)
+            )
+            if pbar is not None:
+                pbar.update(k)
+    finally:
+        if pbar is not None:
+            pbar.close()
+    return conversations
+
+
+def _generate_runs_continuous(
+    client: Any,
+    model: str,
+    user_prompts: List[str],
+    n_runs: int,
+    progress_desc: Optional[str],
+    batch_size: int,
+    raw: str,
+    raw_spill: Optional[RawResponseSpill],
+    **conv_kwargs: Any,
+) -> List[ConversationResult]:
+    if not hasattr(client, "run_conversations_continuous"):
+        raise ValueError(
+            f"Model '{model}' does not support continuous batching; "
+            "use batching='static' instead."
+        )
+
+    pbar = (
+        tqdm_auto.tqdm(total=n_runs, desc=progress_desc, unit="run")
+        if progress_desc and n_runs > 1 and tqdm_auto.available()
+        else None
+    )
+    try:
+        conversations = client.run_conversations_continuous(
+            model_name=model,
+            user_prompts=user_prompts,
+            n_conversations=n_runs,
+            max_batch_size=batch_size,
+            max_kv_bytes=MODEL_CONFIG[model].get("max_kv_cache_bytes"),
+            on_result=(lambda _conv: pbar.update(1)) if pbar is not None else None,
+            **conv_kwargs,
+        )
+    finally:
+        if pbar is not None:
+            pbar.close()
+    return [
+        retain_raw_responses(conv, raw, raw_spill, run_index)
+        for run_index, conv in enumerate(conversations)
+    ]
+
+
+def _generate_runs_provider_batch(
+    model: str,
+    user_prompts: List[str],
+    n_runs: int,
+    response_cache: Optional[ResponseCache] = None,
+    raw: str = "summary",
+    raw_spill: Optional[RawResponseSpill] = None,
+    **conv_kwargs: Any,
+) -> List[ConversationResult]:
+    if response_cache is not None:
+        raise ValueError("response_cache is not supported together with execution='batch'.")
+    if conv_kwargs.pop("stream", False):
+        raise ValueError("stream=True is not supported together with execution='batch'.")
+    conversations = run_conversations_batch(model, user_prompts, n_runs, **conv_kwargs)
+    return [
+        retain_raw_responses(conv, raw, raw_spill, i) for i, conv in enumerate(conversations)
+    ]
+
+
+def _generate_runs_replicas(
+    model: str,
+    user_prompts: List[str],
+    n_runs: int,
+    progress_desc: Optional[str],
+    replicas: Union[int, LocalReplicaPool],
+    api_key: Optional[str] = None,
+    **conv_kwargs: Any,
+) -> List[ConversationResult]:
+    if isinstance(replicas, LocalReplicaPool) and replicas.model_name != model:
+        raise ValueError(f"The replica pool serves '{replicas.model_name}', not '{model}'.")
+    pbar = (
+        tqdm_auto.tqdm(total=n_runs, desc=progress_desc, unit="run")
+        if progress_desc and n_runs > 1 and tqdm_auto.available()
+        else None
+    )
+    on_result = (lambda conv: pbar.update(1)) if pbar is not None else None
+    try:
+        if isinstance(replicas, LocalReplicaPool):
+            return replicas.run(user_prompts, n_runs, on_result=on_result, **conv_kwargs)
+        with LocalReplicaPool(model, n_workers=replicas) as pool:
+            return pool.run(user_prompts, n_runs, on_result=on_result, **conv_kwargs)
+    finally:
+        if pbar is not None:
+            pbar.close()
+
+
+async def _generate_runs_async(
+    model: str,
+    user_prompts: List[str],
+    n_runs: int,
+    progress_desc: Optional[str],
+    concurrency: int,
+    **conv_kwargs: Any,
+) -> List[ConversationResult]:
+    semaphore = asyncio.Semaphore(concurrency)
+    pbar = (
+        tqdm_auto.tqdm(total=n_runs, desc=progress_desc, unit="run")
+        if progress_desc and n_runs > 1 and tqdm_auto.available()
+        else None
+    )
+
+    async def one_run(run_index: int) -> ConversationResult:
+        async with semaphore:
+            conv = await run_conversation_async(
+                model_name=model,
+                user_prompts=user_prompts,
+                run_index=run_index,
+                **conv_kwargs,
+            )
+        if pbar is not None:
+            pbar.update(1)
+        return conv
+
+    try:
+        # gather preserves submission order, so results stay in run order
+        return list(await asyncio.gather(*(one_run(i) for i in range(n_runs))))
+    finally:
+        if pbar is not None:
+            pbar.close()
 
 
 # ---------------------------------------------------------------------------
@@ -408,6 +732,16 @@ def int_consist(
     api_key: Optional[str] = None,
     request_logprobs_default: bool = True,
     show_progress: bool = True,
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    cache: Optional[Union[str, Path, ResponseCache]] = None,
+    execution: str = "sync",
+    stream: bool = False,
+    raw: str = "summary",
+    raw_spill_path: Optional[Union[str, Path]] = None,
+    telemetry_path: Optional[Union[str, Path]] = None,
+    replicas: Optional[Union[int, LocalReplicaPool]] = None,
+    batching: str = "static",
     **gen_kwargs: Any,
 ) -> pd.DataFrame:
     """
@@ -433,6 +767,61 @@ def int_consist(
         If True and the model supports logprobs, request them from the client.
     show_progress:
         If True, show a tqdm progress bar (if tqdm is installed).
+    concurrency:
+        If > 1, keep up to this many runs in flight at once via the asyncio
+        client path (turns within a run stay ordered). None/1 runs sequentially.
+    batch_size:
+        Local HuggingFace models only: generate this many runs together in one
+        left-padded batch per turn. Use with sampling (do_sample=True).
+    cache:
+        Optional ResponseCache (or a directory path for one). Turns generated
+        before for the same model, history, gen_kwargs and run index are read
+        from disk instead of calling the provider, so re-running a scenario
+        after changing only a metric costs nothing.
+    execution:
+        "sync" (default) calls the provider per request. "batch" submits each
+        turn of all n_runs as one provider batch job (OpenAI Batch API,
+        Anthropic Message Batches, or the local file stand-in for simulated
+        models / "batch_backend": "file"), polls until it has finished and
+        then advances every conversation. Much cheaper for large sweeps, but
+        each turn may take up to the provider's completion window.
+    stream:
+        If True, stream responses (OpenAI, Anthropic, Mistral, local HF and
+        simulated models) and report timing rows: time in the rate limiter,
+        time to first token, total latency and decode tokens/sec. Not
+        available with batch_size or execution="batch". Cached turns carry
+        no timing.
+    raw:
+        Retention of raw provider responses while the runs are collected:
+        "summary" (default; id, model, finish reason, usage), "none", "full"
+        (provider SDK objects) or "spill" (full payloads streamed to the gzip
+        JSONL file raw_spill_path instead of being kept in memory).
+    raw_spill_path:
+        Sidecar file for raw="spill" (e.g. "runs/gpt-4.1.raw.jsonl.gz").
+    telemetry_path:
+        If given, write the provider-call telemetry of this run (call counts by
+        status, retries, tokens, latency histograms) to this file in Prometheus
+        text format. The per-model summary is always attached as
+        df.attrs["telemetry"], a plain {model: {column: value}} dict (latency
+        p50/p90/p99, errors, cache hits, ...; pd.DataFrame.from_dict(...,
+        orient="index") turns it back into TelemetryRegistry.summary_frame()).
+    replicas:
+        Local HuggingFace models on CPU only: spread the runs over this many
+        worker processes, each pinned to its own cores and all sharing one
+        memory-mapped copy of the weights; results keep run order. Pass a
+        running replicas.LocalReplicaPool instead of a count to reuse its
+        workers across calls. Not combinable with concurrency, batch_size or
+        execution="batch".
+    batching:
+        Local HuggingFace models only. "static" (default) advances
+        batch_size runs turn by turn, so each step waits for the longest
+        reply. "continuous" keeps batch_size slots (default
+        CONTINUOUS_BATCH_SLOTS = 16) busy: a finished
+        turn leaves at once and the next queued turn (of any run) joins,
+        which pays off when reply lengths vary (e.g. with stop strings).
+        The entry's "max_kv_cache_bytes" caps KV cache memory; supports
+        max_new_tokens, min_new_tokens, stop, do_sample, temperature, top_k
+        and top_p.
     **gen_kwargs:
         Additional generation kwargs (temperature, max_tokens, etc.).
 
@@ -455,6 +844,8 @@ def int_consist(
             - style_similarity_internal, style_similarity_reference
             - pos_distribution_similarity_internal, pos_distribution_similarity_reference
             - confidence_avg_logprob_mean, confidence_avg_logprob_std   (if supported)
+            - queued_s_mean/std, ttft_s_mean/std, latency_s_mean/std,
+              decode_tokens_per_s_mean/std                             (if stream=True)
     """
     if not user_prompts:
         raise ValueError("user_prompts must contain at least one prompt string.")
@@ -471,11 +862,16 @@ def int_consist(
         raise ValueError(f"Unknown model '{model}'. Check MODEL_CONFIG in config.py.")
 
     supports_logprobs = bool(cfg.get("supports_logprobs", False))
+    response_cache = (
+        cache if cache is None or isinstance(cache, ResponseCache) else ResponseCache(cache)
+    )
     request_logprobs = (
         [request_logprobs_default]
         if supports_logprobs and request_logprobs_default
         else [False]
     )
+    if stream:
+        gen_kwargs["stream"] = True
 
     # Segment labels: total conversation + each assistant message m1..mN
     segment_labels = ["total"] + [f"m{i+1}" for i in range(num_msgs)]
@@ -484,6 +880,10 @@ def int_consist(
     seg_texts: Dict[str, List[str]] = {seg: [] for seg in segment_labels}
     # Segment -> list of avg logprobs (one per run) if available
     seg_conf_values: Dict[str, List[float]] = {seg: [] for seg in segment_labels}
+    # Segment -> timing metric -> values (one per run), streaming mode only
+    seg_timing: Dict[str, Dict[str, List[float]]] = {
+        seg: {name: [] for name in _TIMING_METRICS} for seg in segment_labels
+    }
     # Segment -> single reference text (if provided)
     seg_reference: Dict[str, Optional[str]] = {seg: None for seg in segment_labels}
 
@@ -495,25 +895,36 @@ def int_consist(
     # -----------------------------------------------------------------------
     # Run model n_runs times and collect texts + confidences
     # -----------------------------------------------------------------------
-    if show_progress and _HAS_TQDM and n_runs > 1:
-        run_iter = tqdm(
-            range(n_runs),
-            desc=f"int_consist {model}",
-            unit="run",
-        )
-    else:
-        run_iter = range(n_runs)
-
-    for _ in run_iter:
-        conv: ConversationResult = run_conversation(
-            model_name=model,
-            user_prompts=user_prompts,
-            api_key=api_key,
-            system_prompt=system_prompt,
-            request_logprobs=request_logprobs,
-            **gen_kwargs,
-        )
-
+    if raw not in ("none", "summary", "full", "spill"):
+        raise ValueError(f"raw must be 'none', 'summary', 'full' or 'spill' (got {raw!r}).")
+    if raw == "spill" and raw_spill_path is None:
+        raise ValueError("raw='spill' requires raw_spill_path.")
+    raw_spill = RawResponseSpill(raw_spill_path) if raw == "spill" else None
+    try:
+        with collect_telemetry() as telemetry:
+            conversations = _generate_runs(
+                model,
+                user_prompts,
+                n_runs,
+                progress_desc=f"int_consist {model}" if show_progress else None,
+                concurrency=concurrency,
+                batch_size=batch_size,
+                execution=execution,
+                replicas=replicas,
+                batching=batching,
+                api_key=api_key,
+                response_cache=response_cache,
+                system_prompt=system_prompt,
+                request_logprobs=request_logprobs,
+                raw=raw,
+                raw_spill=raw_spill,
+                **gen_kwargs,
+            )
+    finally:
+        if raw_spill is not None:
+            raw_spill.close()
+
+    for conv in conversations:
         assistant_msgs: List[MessageStats] = conv.assistant_messages
 
         # Texts
@@ -538,6 +949,17 @@ def int_consist(
                     if lp is not None:
                         seg_conf_values[f"m{i+1}"].append(lp)
 
+        # Timing (streaming mode)
+        if stream:
+            segments = [("total", assistant_msgs)] + [
+                (f"m{i+1}", assistant_msgs[i : i + 1]) for i in range(num_msgs)
+            ]
+            for seg, msgs in segments:
+                timing = _timing_for_messages(msgs)
+                if timing is not None:
+                    for name, value in timing.items():
+                        seg_timing[seg][name].append(value)
+
     # -----------------------------------------------------------------------
     # Build metrics for each segment
     # -----------------------------------------------------------------------
@@ -582,6 +1004,13 @@ def int_consist(
         rows["confidence_avg_logprob_mean"] = {}
         rows["confidence_avg_logprob_std"] = {}
 
+    # Timing rows only if any streamed turn reported timing
+    any_timing_data = any(seg_timing["total"][name] for name in _TIMING_METRICS)
+    if any_timing_data:
+        for name in _TIMING_METRICS:
+            rows[f"{name}_mean"] = {}
+            rows[f"{name}_std"] = {}
+
     # Fill rows per segment
     for seg in segment_labels:
         texts = seg_texts[seg]
@@ -709,5 +1138,18 @@ def int_consist(
             rows["confidence_avg_logprob_mean"][seg] = mean_lp
             rows["confidence_avg_logprob_std"][seg] = std_lp
 
+        # --- Timing ---
+        if any_timing_data:
+            for name in _TIMING_METRICS:
+                vals = [v for v in seg_timing[seg][name] if not math.isnan(v)]
+                mean_v, std_v = _mean_std(vals)
+                rows[f"{name}_mean"][seg] = mean_v
+                rows[f"{name}_std"][seg] = std_v
+
     df = pd.DataFrame.from_dict(rows, orient="index", columns=segment_labels)
+    # plain data: pandas copies and compares attrs (e.g. in pd.concat), which
+    # a DataFrame value breaks
+    df.attrs["telemetry"] = telemetry.summary_frame().to_dict("index")
+    if telemetry_path is not None:
+        telemetry.write_prometheus(telemetry_path)
     return df
@@ -0,0 +1,520 @@
+# src/daemon.py
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .cache import ResponseCache
+from .client import (
+    ConversationResult,
+    _create_local_client,
+    _get_model_config,
+    _release_memory,
+    local_model_cache,
+)
+from .telemetry import collect_telemetry, record_call
+
+
+# --- Wire protocol -------------------------------------------------------------------
+#
+# One request per connection: an 8-byte length followed by a pickle, answered the
+# same way. Pickles can run code when loaded, so nothing is unpickled unless the
+# other end runs as the same user: the socket lives in a directory only its owner
+# can write to, is created with mode 0600, and both sides check SO_PEERCRED.
+
+
+_HEADER = struct.Struct("!Q")
+_DISABLED = ("", "0", "off", "false", "no")
+
+# Client methods the daemon runs on behalf of a DaemonChatClient
+_METHODS = ("run_conversation", "run_conversations_batched", "run_conversations_continuous")
+
+
+def daemon_socket_path() -> Optional[str]:
+    """
+    Socket of the local model daemon: $LLM_CONSISTENCY_DAEMON, else daemon.sock
+    in a private per-user directory ($XDG_RUNTIME_DIR/llm-consistency, or
+    llm-consistency-<uid> in the temp directory). None when the variable is
+    "off" / "0", or on platforms without Unix sockets and user ids.
+    """
+    value = os.environ.get("LLM_CONSISTENCY_DAEMON")
+    if value is not None and value.strip().lower() in _DISABLED:
+        return None
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "getuid"):
+        return None
+    if value is not None:
+        return value
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        directory = os.path.join(runtime_dir, "llm-consistency")
+    else:
+        directory = os.path.join(tempfile.gettempdir(), f"llm-consistency-{os.getuid()}")
+    return os.path.join(directory, "daemon.sock")
+
+
+def _check_socket_dir(path: str, create: bool = False) -> None:
+    """The socket's directory must be ours and not writable by anyone else."""
+    directory = os.path.dirname(os.path.abspath(path))
+    if create and not os.path.exists(directory):
+        os.makedirs(directory, mode=0o700)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(
+            f"{directory} must be a directory owned by this user and not writable by "
+            "other users (chmod 700)."
+        )
+
+
+def _check_socket(path: str) -> None:
+    """Refuse sockets another user could have created or could be listening on."""
+    _check_socket_dir(path)
+    st = os.lstat(path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a socket private to this user (mode 0600).")
+
+
+def _check_peer(sock: socket.socket) -> None:
+    """The process on the other end of a Unix socket must run as this user."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return  # no peer credentials here (e.g. macOS); the file checks still apply
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    if uid != os.getuid():
+        raise PermissionError(f"The peer on the daemon socket runs as uid {uid}.")
+
+
+def _send(sock: socket.socket, obj: Any) -> None:
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(min(n - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("The local model daemon closed the connection.")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> Any:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return pickle.loads(_recv_exact(sock, size))
+
+
+def _request(path: str, message: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+    _check_socket(path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        _check_peer(sock)
+        _send(sock, message)
+        return _recv(sock)
+
+
+def _ping(path: str, timeout: float = 2.0) -> Optional[Dict[str, Any]]:
+    """Daemon status, or None if nothing (trustworthy) answers on `path`."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    try:
+        return _request(path, {"op": "ping"}, timeout)
+    except PermissionError as exc:
+        print(f"[daemon] Ignoring the local model daemon socket: {exc}")
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def _weight_keys(client: Any) -> List[Tuple[str, str, str, str]]:
+    """LocalModelCache keys of the weights a HuggingFaceLocalClient holds."""
+    keys = [client._model_key]
+    if client.draft_model_id is not None:
+        keys.append((client.draft_model_id,) + client._model_key[1:])
+    return keys
+
+
+def _cache_args(cache: Optional[ResponseCache]) -> Optional[Tuple[str, int, float]]:
+    if cache is None:
+        return None
+    return str(cache.directory), cache.max_bytes, cache.low_watermark
+
+
+# --- Daemon --------------------------------------------------------------------------
+
+
+class LocalModelDaemon:
+    """
+    Long-lived process that keeps local HuggingFace models loaded.
+
+    Every script that creates a client for a local model (create_llm_client /
+    get_llm_client / int_consist) talks to the daemon when it is running, so the
+    model is loaded once for a whole series of scripts instead of once per
+    script, and the scripts never import torch / transformers themselves.
+    Without a daemon they load the model in-process as before.
+
+        python -m llm_consistency.daemon --preload llama-3-8b &
+        for i in $(seq 1 14); do python Scripts/scenario$i.py; done
+        python -m llm_consistency.daemon --stop
+
+    The daemon listens on a Unix socket (daemon_socket_path()) in a directory
+    only its owner can write to; clients and daemon check the socket's owner
+    and mode and the peer's credentials before unpickling anything. Clients
+    send their MODEL_CONFIG entry along with every request, so scripts may
+    define models the daemon has never seen; entries with the same weights
+    share them through the LocalModelCache. Requests for different models run
+    concurrently, requests for the same model one at a time.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, preload: Sequence[str] = ()):
+        path = socket_path or daemon_socket_path()
+        if path is None:
+            raise ValueError(
+                "The local model daemon is disabled (LLM_CONSISTENCY_DAEMON=off); "
+                "pass socket_path explicitly."
+            )
+        self.socket_path = path
+        self.started = time.time()
+        self.requests = 0
+        self._clients: Dict[str, Tuple[Any, threading.Lock]] = {}
+        self._caches: Dict[Tuple[str, int, float], ResponseCache] = {}
+        self._lock = threading.Lock()
+
+        _check_socket_dir(path, create=True)
+        if os.path.exists(path):
+            if _ping(path) is not None:
+                raise RuntimeError(f"A local model daemon is already running on {path}.")
+            os.unlink(path)  # left behind by a daemon that was killed
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(path, _make_handler(self))
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+        for model_name in preload:
+            self._client(model_name, dict(_get_model_config(model_name)))
+
+    # ---- lifecycle ------------------------------------------------------------------
+
+    def serve_forever(self) -> None:
+        try:
+            self._server.serve_forever()
+        finally:
+            self._cleanup()
+
+    def start(self) -> "LocalModelDaemon":
+        """Serve from a background thread (e.g. inside a notebook or a test)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._cleanup()
+
+    def _cleanup(self) -> None:
+        self._server.server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "LocalModelDaemon":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    # ---- requests -------------------------------------------------------------------
+
+    def _client(self, model_name: str, cfg: Dict[str, Any]) -> Tuple[Any, threading.Lock]:
+        key = json.dumps(cfg, sort_keys=True, default=repr)
+        self._drop_evicted_clients()
+        with self._lock:
+            entry = self._clients.get(key)
+        if entry is None:
+            client = _create_local_client(model_name, cfg)
+            with self._lock:
+                entry = self._clients.setdefault(key, (client, threading.Lock()))
+            # loading may have evicted other models (--max-models)
+            self._drop_evicted_clients()
+        return entry
+
+    def _drop_evicted_clients(self) -> None:
+        """Forget clients whose weights the LocalModelCache evicted, freeing them."""
+        loaded = set(local_model_cache().keys())
+        with self._lock:
+            evicted = [
+                key
+                for key, (client, _) in self._clients.items()
+                if not set(_weight_keys(client)) <= loaded
+            ]
+            for key in evicted:
+                del self._clients[key]
+        if evicted:
+            _release_memory()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "socket": self.socket_path,
+            "uptime_s": time.time() - self.started,
+            "requests": self.requests,
+            "models": [list(key) for key in local_model_cache().keys()],
+        }
+
+    def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        op = message.get("op")
+        if op == "ping":
+            return self.status()
+        if op == "shutdown":
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return {"stopping": True}
+        if op != "call" or message.get("method") not in _METHODS:
+            raise ValueError(f"Unknown daemon request {op!r} / {message.get('method')!r}.")
+
+        with self._lock:
+            self.requests += 1
+        model_name = message["model_name"]
+        cfg = message["cfg"]
+        client, client_lock = self._client(model_name, cfg)
+        kwargs = dict(message["kwargs"])
+        # per-model options come from the caller's entry, never from this
+        # process's MODEL_CONFIG (which may not have the model or differ)
+        kwargs.setdefault("stream", bool(cfg.get("stream", False)))
+        cache_args = message.get("cache")
+        if cache_args is not None:
+            cache_args = tuple(cache_args)
+            with self._lock:
+                if cache_args not in self._caches:
+                    self._caches[cache_args] = ResponseCache(*cache_args)
+                kwargs["response_cache"] = self._caches[cache_args]
+
+        with client_lock, collect_telemetry() as telemetry:
+            result = getattr(client, message["method"])(model_name=model_name, **kwargs)
+        return {"result": result, "telemetry": telemetry.records()}
+
+
+def _make_handler(daemon: LocalModelDaemon) -> type:
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self) -> None:
+            try:
+                _check_peer(self.request)
+                message = _recv(self.request)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                return
+            try:
+                reply = daemon.handle(message)
+            except Exception as exc:
+                reply = {"error": exc, "traceback": traceback.format_exc()}
+                try:
+                    pickle.dumps(exc)
+                except Exception:
+                    reply["error"] = RuntimeError(reply["traceback"])
+            try:
+                _send(self.request, reply)
+            except OSError:
+                pass  # the client gave up (e.g. Ctrl-C)
+
+    return Handler
+
+
+# --- Client side ---------------------------------------------------------------------
+
+
+class DaemonChatClient:
+    """
+    LLMClient for a local model served by a LocalModelDaemon.
+
+    Behaves like HuggingFaceLocalClient (same arguments and results, including
+    log-probs, timing and batched generation); telemetry recorded in the daemon
+    is replayed into this process. If the daemon goes away, the model is loaded
+    in this process and used from then on.
+    """
+
+    def __init__(self, model_name: str, cfg: Dict[str, Any], socket_path: str):
+        self.model_name = model_name
+        self.cfg = dict(cfg, daemon=False)
+        self.socket_path = socket_path
+        self._fallback: Any = None
+
+    def _call(self, method: str, model_name: str, kwargs: Dict[str, Any]) -> Any:
+        if self._fallback is None:
+            response_cache = kwargs.pop("response_cache", None)
+            message = {
+                "op": "call",
+                "method": method,
+                "model_name": model_name,
+                "cfg": self.cfg,
+                "cache": _cache_args(response_cache),
+                "kwargs": kwargs,
+            }
+            try:
+                reply = _request(self.socket_path, message)
+            except OSError as exc:
+                # gone, refused, or died while handling the request: run it here
+                print(
+                    f"[daemon] Lost the local model daemon on {self.socket_path} ({exc}); "
+                    f"loading '{self.model_name}' in this process."
+                )
+                self._fallback = _create_local_client(self.model_name, self.cfg)
+                kwargs["response_cache"] = response_cache
+            else:
+                for call in reply.get("telemetry", ()):
+                    record_call(call)
+                if "error" in reply:
+                    raise reply["error"]
+                return reply["result"]
+        return getattr(self._fallback, method)(model_name=model_name, **kwargs)
+
+    def run_conversation(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        return self._call(
+            "run_conversation",
+            model_name,
+            dict(
+                user_prompts=user_prompts,
+                system_prompt=system_prompt,
+                request_logprobs=request_logprobs,
+                response_cache=response_cache,
+                run_index=run_index,
+                **gen_kwargs,
+            ),
+        )
+
+    async def run_conversation_async(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        run_index: int = 0,
+        **gen_kwargs: Any,
+    ) -> ConversationResult:
+        return await asyncio.to_thread(
+            self.run_conversation,
+            model_name,
+            user_prompts,
+            system_prompt,
+            request_logprobs,
+            response_cache,
+            run_index,
+            **gen_kwargs,
+        )
+
+    def run_conversations_batched(
+        self, model_name: str, user_prompts: List[str], n_conversations: int, **kwargs: Any
+    ) -> List[ConversationResult]:
+        kwargs.update(user_prompts=user_prompts, n_conversations=n_conversations)
+        return self._call("run_conversations_batched", model_name, kwargs)
+
+    def run_conversations_continuous(
+        self, model_name: str, user_prompts: List[str], n_conversations: int, **kwargs: Any
+    ) -> List[ConversationResult]:
+        # callbacks cannot cross the socket; report results once they are back
+        on_result = kwargs.pop("on_result", None)
+        kwargs.update(user_prompts=user_prompts, n_conversations=n_conversations)
+        results = self._call("run_conversations_continuous", model_name, kwargs)
+        if on_result is not None:
+            for conv in results:
+                on_result(conv)
+        return results
+
+
+def connect_local_daemon(model_name: str, cfg: Dict[str, Any]) -> Optional[DaemonChatClient]:
+    """A DaemonChatClient if a daemon answers on the configured socket, else None."""
+    path = cfg.get("daemon_socket") or daemon_socket_path()
+    if path is None or _ping(path) is None:
+        return None
+    return DaemonChatClient(model_name, cfg, path)
+
+
+def stop_local_daemon(socket_path: Optional[str] = None) -> bool:
+    """Ask a running daemon to exit; False if none was running."""
+    path = socket_path or daemon_socket_path()
+    if path is None or _ping(path) is None:
+        return False
+    _request(path, {"op": "shutdown"}, timeout=10.0)
+    return True
+
+
+# --- Command line --------------------------------------------------------------------
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m llm_consistency.daemon",
+        description="Keep local HuggingFace models loaded for all scripts of this user.",
+    )
+    parser.add_argument("--socket", help="socket path (default: daemon_socket_path())")
+    parser.add_argument(
+        "--preload", nargs="*", default=[], metavar="MODEL", help="MODEL_CONFIG names to load now"
+    )
+    parser.add_argument(
+        "--max-models", type=int, help="keep at most this many models loaded (LRU)"
+    )
+    parser.add_argument("--status", action="store_true", help="show the running daemon")
+    parser.add_argument("--stop", action="store_true", help="stop the running daemon")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        status = _ping(args.socket or daemon_socket_path() or "")
+        print(json.dumps(status, indent=2) if status else "No local model daemon is running.")
+        return
+    if args.stop:
+        stopped = stop_local_daemon(args.socket)
+        print("Stopped." if stopped else "No local model daemon is running.")
+        return
+
+    if args.max_models is not None:
+        local_model_cache().max_models = args.max_models
+    daemon = LocalModelDaemon(args.socket, preload=args.preload)
+    print(f"Local model daemon (pid {os.getpid()}) listening on {daemon.socket_path}")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # removes the socket on kill
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+__all__ = [
+    "LocalModelDaemon",
+    "DaemonChatClient",
+    "connect_local_daemon",
+    "stop_local_daemon",
+    "daemon_socket_path",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# src/lazy.py
+
+from __future__ import annotations
+
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+# --- Deferred optional imports -------------------------------------------------------
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Keeps `torch.no_grad()`-style call sites unchanged while moving the import
+    cost (seconds for torch / transformers / sklearn) from module import time to
+    the first real use. available() replaces the former `x is None` checks.
+
+    If the import fails, accessing an attribute raises ImportError with
+    `install_hint` (when given) so the error still says what to install.
+    """
+
+    def __init__(self, name: str, install_hint: Optional[str] = None):
+        self._name = name
+        self._install_hint = install_hint
+        self._module: Optional[ModuleType] = None
+        self._error: Optional[ImportError] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is None:
+                if self._error is not None:
+                    raise self._error
+                try:
+                    self._module = importlib.import_module(self._name)
+                except ImportError as exc:
+                    if self._install_hint:
+                        error = ImportError(self._install_hint)
+                        error.__cause__ = exc
+                    else:
+                        error = exc
+                    self._error = error
+                    raise error
+            return self._module
+
+    def available(self) -> bool:
+        """True if the module can be imported (imports it on first call)."""
+        try:
+            self._load()
+        except ImportError:
+            return False
+        return True
+
+    @property
+    def loaded(self) -> bool:
+        """True once the module has actually been imported."""
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith("__") and attr.endswith("__"):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+__all__ = ["LazyModule"]
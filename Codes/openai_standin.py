@@ -0,0 +1,265 @@
+# src/openai_standin.py
+
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .client import SimulatedChatClient, SimulatedProviderError
+from .ratelimit import estimate_tokens
+
+
+# --- Local OpenAI-compatible stand-in server -----------------------------------------
+
+
+class SimulatedOpenAIServer:
+    """
+    Local stand-in for an OpenAI-compatible inference server (offline testing).
+
+    Serves POST /v1/chat/completions (plain and streamed, with logprobs) and
+    GET /v1/models over real HTTP, so provider "openai_compatible" is exercised
+    end to end through the openai SDK. Replies come from a SimulatedChatClient
+    built from `sim_config`, including its latency and 429 / 500 injection
+    (429s carry Retry-After). Requests are served concurrently; max_in_flight
+    records the highest number seen at once.
+
+    A request's "seed" selects the simulated run (like run_index); requests
+    without one get consecutive run numbers, so repeated runs differ.
+
+        with SimulatedOpenAIServer({"supports_logprobs": True}) as server:
+            MODEL_CONFIG["local"] = {
+                "provider": "openai_compatible",
+                "base_url": server.base_url,
+                "model_id": server.model_id,
+                "supports_logprobs": True,
+            }
+    """
+
+    def __init__(
+        self,
+        sim_config: Optional[Dict[str, Any]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        model_id: str = "simulated",
+    ):
+        self.model_id = model_id
+        self._sim = SimulatedChatClient(sim_config or {"supports_logprobs": True})
+        self._runs = itertools.count()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "SimulatedOpenAIServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self) -> "SimulatedOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    # ---- request handling -----------------------------------------------------------
+
+    def _enter(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def _run_index(self, body: Dict[str, Any]) -> int:
+        seed = body.get("seed")
+        return int(seed) if isinstance(seed, int) else next(self._runs)
+
+    def _completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Sample one reply; returns the pieces both response formats need."""
+        messages = body.get("messages")
+        if not isinstance(messages, list) or not messages:
+            raise ValueError("'messages' must be a non-empty list.")
+        (text, token_stats, _), first_delay, decode_delay = self._sim._sample_turn(
+            messages, bool(body.get("logprobs")), self._run_index(body)
+        )
+        words = text.split()
+        prompt_tokens = estimate_tokens("".join(str(m.get("content", "")) for m in messages))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "created": int(time.time()),
+            "model": body.get("model") or self.model_id,
+            "text": text,
+            "pieces": [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)],
+            "logprobs": (
+                [
+                    {"token": t.token, "logprob": t.logprob, "bytes": None, "top_logprobs": []}
+                    for t in token_stats
+                ]
+                if token_stats
+                else None
+            ),
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words),
+            },
+            "first_delay": first_delay,
+            "decode_delay": decode_delay,
+        }
+
+
+def _make_handler(server: SimulatedOpenAIServer) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:  # quiet
+            pass
+
+        def _send_json(
+            self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None
+        ) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_error(
+            self, status: int, message: str, retry_after: Optional[float] = None
+        ) -> None:
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            error_type = "rate_limit_error" if status == 429 else "server_error"
+            if status == 400:
+                error_type = "invalid_request_error"
+            self._send_json(
+                status,
+                {"error": {"message": message, "type": error_type, "code": status}},
+                headers,
+            )
+
+        def do_GET(self) -> None:
+            if self.path.rstrip("/") != "/v1/models":
+                self._send_error(404, f"Unknown path {self.path}")
+                return
+            self._send_json(
+                200,
+                {"object": "list", "data": [{"id": server.model_id, "object": "model"}]},
+            )
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw_body = self.rfile.read(length)
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self._send_error(404, f"Unknown path {self.path}")
+                return
+            server._enter()
+            try:
+                try:
+                    body = json.loads(raw_body or b"{}")
+                    completion = server._completion(body)
+                except SimulatedProviderError as exc:
+                    self._send_error(exc.status_code, str(exc), exc.retry_after)
+                    return
+                except ValueError as exc:
+                    self._send_error(400, str(exc))
+                    return
+                if body.get("stream"):
+                    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+                    self._stream(completion, include_usage)
+                else:
+                    time.sleep(completion["first_delay"] + completion["decode_delay"])
+                    self._send_json(200, _completion_payload(completion))
+            finally:
+                server._leave()
+
+        def _stream(self, completion: Dict[str, Any], include_usage: bool) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(choices: List[Dict[str, Any]], usage: Any = None) -> None:
+                chunk = {
+                    "id": completion["id"],
+                    "object": "chat.completion.chunk",
+                    "created": completion["created"],
+                    "model": completion["model"],
+                    "choices": choices,
+                    "usage": usage,
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            pieces = completion["pieces"]
+            logprobs = completion["logprobs"]
+            per_piece = completion["decode_delay"] / max(1, len(pieces) - 1)
+            event([{"index": 0, "delta": {"role": "assistant", "content": ""},
+                    "logprobs": None, "finish_reason": None}])
+            time.sleep(completion["first_delay"])
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(per_piece)
+                entry = logprobs[i : i + 1] if logprobs else None
+                if logprobs and i == len(pieces) - 1:
+                    entry = logprobs[i:]
+                event([{"index": 0, "delta": {"content": piece},
+                        "logprobs": {"content": entry} if entry else None,
+                        "finish_reason": None}])
+            event([{"index": 0, "delta": {}, "logprobs": None, "finish_reason": "stop"}])
+            if include_usage:
+                event([], completion["usage"])
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def _completion_payload(completion: Dict[str, Any]) -> Dict[str, Any]:
+    logprobs = completion["logprobs"]
+    return {
+        "id": completion["id"],
+        "object": "chat.completion",
+        "created": completion["created"],
+        "model": completion["model"],
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": completion["text"]},
+                "finish_reason": "stop",
+                "logprobs": {"content": logprobs} if logprobs else None,
+            }
+        ],
+        "usage": completion["usage"],
+    }
+
+
+__all__ = ["SimulatedOpenAIServer"]
@@ -0,0 +1,385 @@
+# src/ratelimit.py
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+# --- Error classification ------------------------------------------------------------
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of a provider SDK error (OpenAI, Anthropic, Mistral, httpx, simulated)."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After hint on the error or its HTTP response, if any."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+        if headers is not None:
+            try:
+                value = headers.get("retry-after")
+            except Exception:
+                value = None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None  # HTTP-date form; fall back to our own backoff
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Connection problems and timeouts are worth retrying even without a status."""
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    return any(
+        marker in name
+        for name in names
+        for marker in ("Timeout", "Connection", "TransportError", "ServiceUnavailable")
+    )
+
+
+def classify_error(exc: BaseException) -> str:
+    """Return "rate_limited", "retryable" or "fatal" for a provider error."""
+    status = _status_code(exc)
+    if status == 429:
+        return "rate_limited"
+    if status is not None and (status >= 500 or status in (408, 409)):
+        return "retryable"
+    if status is None and _is_transient(exc):
+        return "retryable"
+    return "fatal"
+
+
+# --- Token bucket --------------------------------------------------------------------
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute / 60` units per second.
+
+    acquire() may drive the level negative when a single request is larger than
+    the capacity; the debt is then paid off before anyone else proceeds.
+    adjust() corrects an estimate once the real usage is known.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self, amount: float) -> float:
+        """Take `amount` if possible and return 0, else return seconds to wait."""
+        with self._lock:
+            self._refill()
+            if self._level >= min(amount, self.capacity):
+                self._level -= amount
+                return 0.0
+            missing = min(amount, self.capacity) - self._level
+            return missing / self.rate
+
+    def acquire(self, amount: float = 1.0) -> None:
+        while True:
+            wait = self._try_take(amount)
+            if wait <= 0.0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, amount: float = 1.0) -> None:
+        while True:
+            wait = self._try_take(amount)
+            if wait <= 0.0:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (delta > 0) or refund (delta < 0) units after the fact."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - delta)
+
+    def drain(self, seconds: float) -> None:
+        """Pause the bucket: nothing is granted for roughly `seconds` from now."""
+        with self._lock:
+            self._refill()
+            self._level = min(self._level, -seconds * self.rate)
+
+
+# --- AIMD concurrency ----------------------------------------------------------------
+
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase / multiplicative-decrease limit on requests in flight.
+
+    Every success raises the limit by additive_increase / limit (about +1 per
+    window of successful requests); every 429 multiplies it by decrease_factor.
+    The effective limit therefore settles just below the provider's quota.
+    """
+
+    def __init__(
+        self,
+        initial: float = 4.0,
+        minimum: float = 1.0,
+        maximum: float = 64.0,
+        additive_increase: float = 1.0,
+        decrease_factor: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def _try_enter(self) -> bool:
+        with self._cond:
+            if self.in_flight < max(1, int(self.limit)):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        delay = 0.005
+        while not self._try_enter():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, outcome: str) -> None:
+        """outcome: "success", "rate_limited" or anything else (no adjustment)."""
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + self.additive_increase / self.limit)
+            elif outcome == "rate_limited":
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self._cond.notify_all()
+
+
+# --- Limiter + retry -----------------------------------------------------------------
+
+
+@dataclass
+class RateLimitConfig:
+    """
+    Per-model limits, read from MODEL_CONFIG[model]["rate_limits"] (all optional):
+
+        {
+            "requests_per_minute": 500,
+            "tokens_per_minute": 30000,
+            "initial_concurrency": 4,
+            "max_concurrency": 64,
+            "max_retries": 6,
+            "base_delay": 1.0,      # seconds, first backoff step
+            "max_delay": 60.0,      # seconds, backoff cap
+        }
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    initial_concurrency: float = 4.0
+    max_concurrency: float = 64.0
+    max_retries: int = 6
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    @classmethod
+    def from_dict(cls, cfg: Optional[Dict[str, Any]]) -> "RateLimitConfig":
+        cfg = dict(cfg or {})
+        unknown = set(cfg) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown rate_limits keys: {sorted(unknown)}")
+        return cls(**cfg)
+
+
+class RateLimiter:
+    """
+    Shared limiter for one model: request/token buckets, AIMD concurrency and
+    retries with jittered exponential backoff.
+
+    A 429 halves the concurrency limit and pauses the request bucket for the
+    Retry-After time (when the provider sends one), so every caller backs off,
+    not just the one that was throttled.
+
+    With adaptive_concurrency=False there is no limit on requests in flight
+    (callers such as int_consist(concurrency=N) decide); retries still apply.
+    """
+
+    def __init__(self, config: RateLimitConfig, adaptive_concurrency: bool = True):
+        self.config = config
+        self.requests = (
+            TokenBucket(config.requests_per_minute) if config.requests_per_minute else None
+        )
+        self.tokens = (
+            TokenBucket(config.tokens_per_minute) if config.tokens_per_minute else None
+        )
+        self.concurrency = (
+            AdaptiveConcurrency(initial=config.initial_concurrency, maximum=config.max_concurrency)
+            if adaptive_concurrency
+            else None
+        )
+        self.retries = 0  # total retries performed (for reporting)
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than Retry-After."""
+        cap = min(self.config.max_delay, self.config.base_delay * (2 ** attempt))
+        delay = random.uniform(0.0, cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _release(self, outcome: str) -> None:
+        if self.concurrency is not None:
+            self.concurrency.release(outcome)
+
+    def _on_rate_limited(self, exc: BaseException) -> Optional[float]:
+        retry_after = _retry_after(exc)
+        if retry_after and self.requests is not None:
+            self.requests.drain(retry_after)
+        return retry_after
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        estimated_tokens: float = 0.0,
+        used_tokens: Optional[Callable[[T], Optional[float]]] = None,
+    ) -> T:
+        """Run fn() under the limits, retrying rate limits and transient errors."""
+        attempt = 0
+        while True:
+            if self.requests is not None:
+                self.requests.acquire(1.0)
+            if self.tokens is not None and estimated_tokens:
+                self.tokens.acquire(estimated_tokens)
+            if self.concurrency is not None:
+                self.concurrency.acquire()
+
+            try:
+                result = fn()
+            except Exception as exc:
+                kind = classify_error(exc)
+                self._release(kind)
+                if self.tokens is not None and estimated_tokens:
+                    self.tokens.adjust(-estimated_tokens)  # nothing was consumed
+                if kind == "fatal" or attempt >= self.config.max_retries:
+                    raise
+                retry_after = self._on_rate_limited(exc) if kind == "rate_limited" else None
+                self.retries += 1
+                time.sleep(self.backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+
+            self._release("success")
+            self._settle_tokens(result, estimated_tokens, used_tokens)
+            return result
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        estimated_tokens: float = 0.0,
+        used_tokens: Optional[Callable[[T], Optional[float]]] = None,
+    ) -> T:
+        """Async counterpart of call()."""
+        attempt = 0
+        while True:
+            if self.requests is not None:
+                await self.requests.acquire_async(1.0)
+            if self.tokens is not None and estimated_tokens:
+                await self.tokens.acquire_async(estimated_tokens)
+            if self.concurrency is not None:
+                await self.concurrency.acquire_async()
+
+            try:
+                result = await fn()
+            except Exception as exc:
+                kind = classify_error(exc)
+                self._release(kind)
+                if self.tokens is not None and estimated_tokens:
+                    self.tokens.adjust(-estimated_tokens)
+                if kind == "fatal" or attempt >= self.config.max_retries:
+                    raise
+                retry_after = self._on_rate_limited(exc) if kind == "rate_limited" else None
+                self.retries += 1
+                await asyncio.sleep(self.backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+
+            self._release("success")
+            self._settle_tokens(result, estimated_tokens, used_tokens)
+            return result
+
+    def _settle_tokens(
+        self,
+        result: Any,
+        estimated_tokens: float,
+        used_tokens: Optional[Callable[[Any], Optional[float]]],
+    ) -> None:
+        if self.tokens is None or used_tokens is None:
+            return
+        actual = used_tokens(result)
+        if actual is not None:
+            self.tokens.adjust(actual - estimated_tokens)
+
+
+_LIMITERS: Dict[Tuple[Any, ...], RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(key: Tuple[Any, ...], rate_limits: Optional[Dict[str, Any]]) -> RateLimiter:
+    """
+    Process-wide limiter for `key` (created from `rate_limits` on first use).
+
+    Without rate_limits the limiter only retries: requests in flight are not
+    capped, so they are not held to a slow-start limit the provider never set.
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is None:
+            limiter = RateLimiter(
+                RateLimitConfig.from_dict(rate_limits), adaptive_concurrency=bool(rate_limits)
+            )
+            _LIMITERS[key] = limiter
+        return limiter
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used before usage is known."""
+    return max(1, len(text) // 4)
+
+
+__all__ = [
+    "TokenBucket",
+    "AdaptiveConcurrency",
+    "RateLimitConfig",
+    "RateLimiter",
+    "classify_error",
+    "get_rate_limiter",
+    "estimate_tokens",
+]
@@ -0,0 +1,345 @@
+# src/replicas.py
+
+from __future__ import annotations
+
+import dataclasses
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .cache import ResponseCache
+from .config import MODEL_CONFIG
+from .client import (
+    ConversationResult,
+    InferenceProfile,
+    RawResponseSpill,
+    _get_model_config,
+    get_llm_client,
+    retain_raw_responses,
+)
+from .lazy import LazyModule
+from .telemetry import CallRecord, collect_telemetry, record_call
+
+pd = LazyModule("pandas", "pandas package is not installed. Add 'pandas' to requirements.txt.")
+
+
+# --- Multi-process local model replicas ----------------------------------------------
+
+
+_LOCAL_PROVIDERS = ("huggingface", "local", "llama_local")
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _partition_cpus(cpus: Sequence[int], n_workers: int, threads: int) -> List[List[int]]:
+    """Disjoint blocks of `threads` CPUs per worker; ValueError if they do not fit."""
+    if n_workers * threads > len(cpus):
+        raise ValueError(
+            f"{n_workers} workers x {threads} threads need {n_workers * threads} CPUs, but "
+            f"only {len(cpus)} are available; lower n_workers / threads_per_worker or pass "
+            "pin_threads=False to oversubscribe without pinning."
+        )
+    return [list(cpus[w * threads : (w + 1) * threads]) for w in range(n_workers)]
+
+
+class LocalReplicaPool:
+    """
+    N worker processes, each running one replica of a local HuggingFace model.
+
+    A single process cannot keep a many-core machine busy with one model, and N
+    separately loaded copies of the weights would not fit in RAM. Every worker
+    loads the model with InferenceProfile(mmap=True), so all of them read the
+    same memory-mapped safetensors pages and the weights are held only once.
+    Each worker is pinned to its own block of `threads_per_worker` CPUs (with a
+    matching torch / OpenMP thread count), so replicas do not compete for cores;
+    if the blocks do not fit on the available CPUs, the pool refuses to start
+    unless pin_threads=False.
+
+    Runs are handed out through a shared queue (an idle worker takes the next
+    one) and run() returns them in run order; call telemetry recorded in the
+    workers is replayed into the calling process. Workers are started with the
+    "spawn" method, so scripts using the pool need an `if __name__ == "__main__":`
+    guard.
+
+        with LocalReplicaPool("llama-3-8b", n_workers=8) as pool:
+            results = pool.run(prompts, n_runs=64, do_sample=True)
+
+    Aggregate throughput scales with n_workers until memory bandwidth is
+    saturated; see benchmark.benchmark_replicas and stats().
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        n_workers: int,
+        threads_per_worker: Optional[int] = None,
+        pin_threads: bool = True,
+        start_method: str = "spawn",
+        startup_timeout: float = 600.0,
+    ):
+        if n_workers < 1:
+            raise ValueError(f"n_workers must be a positive integer (got {n_workers}).")
+        cfg = dict(_get_model_config(model_name))
+        if cfg.get("provider") not in _LOCAL_PROVIDERS:
+            raise ValueError(f"Model '{model_name}' is not a local HuggingFace model.")
+        if (cfg.get("device") or "cpu") != "cpu":
+            raise ValueError(
+                "LocalReplicaPool runs CPU replicas; set the model's device to 'cpu'."
+            )
+
+        cpus = _available_cpus()
+        threads = threads_per_worker or max(1, len(cpus) // n_workers)
+        self.model_name = model_name
+        self.n_workers = n_workers
+        self.threads_per_worker = threads
+        self.cpu_sets = _partition_cpus(cpus, n_workers, threads) if pin_threads else None
+
+        profile = InferenceProfile.coerce(cfg.get("inference_profile"))
+        cfg["device"] = "cpu"
+        cfg["daemon"] = False  # each worker holds its own replica
+        cfg["inference_profile"] = dataclasses.replace(
+            profile, mmap=True, num_threads=threads, num_interop_threads=1
+        )
+
+        ctx = multiprocessing.get_context(start_method)
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._next_job = 0
+        self._workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(
+                    i,
+                    model_name,
+                    cfg,
+                    threads,
+                    self.cpu_sets[i] if self.cpu_sets else None,
+                    self._tasks,
+                    self._results,
+                ),
+                name=f"replica-{i}",
+                daemon=True,
+            )
+            for i in range(n_workers)
+        ]
+        self.worker_info: List[Dict[str, Any]] = [{} for _ in range(n_workers)]
+        for process in self._workers:
+            process.start()
+        try:
+            self._await_ready(startup_timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    # ---- lifecycle ------------------------------------------------------------------
+
+    def _receive(self, timeout: Optional[float] = None) -> Any:
+        """Next worker message; raises if a worker died instead of answering."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self._results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [p for p in self._workers if p.exitcode is not None]
+                if dead:
+                    raise RuntimeError(
+                        f"Replica worker {dead[0].name} exited with code {dead[0].exitcode}."
+                    ) from None
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError("Timed out waiting for replica workers.") from None
+
+    def _await_ready(self, timeout: float) -> None:
+        ready = 0
+        while ready < self.n_workers:
+            message = self._receive(timeout)
+            if message[0] == "error":
+                raise RuntimeError(f"Replica worker failed to load the model:\n{message[-1]}")
+            _, worker, info = message
+            self.worker_info[worker] = dict(info, runs=0, generated_tokens=0, busy_s=0.0)
+            ready += 1
+
+    def close(self) -> None:
+        """Stop the workers (waiting for the runs they are working on)."""
+        for process in self._workers:
+            if process.is_alive():
+                self._tasks.put(None)
+        for process in self._workers:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._workers = []
+
+    def __enter__(self) -> "LocalReplicaPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    # ---- runs -----------------------------------------------------------------------
+
+    def run(
+        self,
+        user_prompts: List[str],
+        n_runs: int,
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        response_cache: Optional[ResponseCache] = None,
+        raw: str = "summary",
+        raw_spill: Optional[RawResponseSpill] = None,
+        on_result: Optional[Callable[[ConversationResult], None]] = None,
+        **gen_kwargs: Any,
+    ) -> List[ConversationResult]:
+        """
+        Generate n_runs conversations (run indices 0..n_runs-1) across the
+        replicas and return them in run order. Same arguments as
+        client.run_conversation; on_result is called as each run finishes.
+        """
+        if not self._workers:
+            raise RuntimeError("LocalReplicaPool is closed.")
+        if raw == "spill" and raw_spill is None:
+            raise ValueError("raw='spill' requires a RawResponseSpill (raw_spill=...).")
+
+        job = self._next_job
+        self._next_job += 1
+        cache_args = (
+            (str(response_cache.directory), response_cache.max_bytes, response_cache.low_watermark)
+            if response_cache is not None
+            else None
+        )
+        kwargs = dict(
+            user_prompts=user_prompts,
+            system_prompt=system_prompt,
+            request_logprobs=request_logprobs,
+            # spill files are written by this process, so workers send everything
+            raw="full" if raw == "spill" else raw,
+            **gen_kwargs,
+        )
+        for run_index in range(n_runs):
+            self._tasks.put((job, run_index, cache_args, kwargs))
+
+        results: Dict[int, ConversationResult] = {}
+        errors: Dict[int, str] = {}
+        while len(results) + len(errors) < n_runs:
+            message = self._receive()
+            if message[1] != job:
+                continue  # left over from an interrupted run() call
+            if message[0] == "error":
+                errors[message[2]] = message[3]
+                continue
+            _, _, run_index, worker, conv, records, stats = message
+            for call in records:
+                record_call(call)
+            info = self.worker_info[worker]
+            for name in ("runs", "generated_tokens", "busy_s"):
+                info[name] += stats[name]
+            if raw == "spill":
+                retain_raw_responses(conv, raw, raw_spill, run_index)
+            results[run_index] = conv
+            if on_result is not None:
+                on_result(conv)
+
+        if errors:
+            run_index = min(errors)
+            raise RuntimeError(
+                f"Run {run_index} failed in a replica worker "
+                f"({len(errors)} of {n_runs} runs failed):\n{errors[run_index]}"
+            )
+        return [results[i] for i in range(n_runs)]
+
+    def stats(self) -> "pd.DataFrame":
+        """One row per worker: pid, cpus, load_s, shared weight bytes, runs, tokens/sec."""
+        rows = []
+        for worker, info in enumerate(self.worker_info):
+            busy = info.get("busy_s", 0.0)
+            rows.append(
+                dict(
+                    info,
+                    worker=worker,
+                    tokens_per_s=info.get("generated_tokens", 0) / busy if busy else float("nan"),
+                )
+            )
+        return pd.DataFrame(rows).set_index("worker")
+
+
+def _generated_tokens(conv: ConversationResult) -> int:
+    total = 0
+    for raw in conv.raw_responses:
+        if isinstance(raw, dict) and raw.get("generated_ids") is not None:
+            total += len(raw["generated_ids"])
+    return total
+
+
+def _worker_main(
+    worker: int,
+    model_name: str,
+    cfg: Dict[str, Any],
+    threads: int,
+    cpus: Optional[List[int]],
+    tasks: Any,
+    results: Any,
+) -> None:
+    # Thread pools are sized when torch is first imported, which happens below.
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    # the entry may have been added at runtime in the parent process
+    MODEL_CONFIG[model_name] = cfg
+    try:
+        started = time.perf_counter()
+        client = get_llm_client(model_name)
+        model = client.model  # type: ignore[attr-defined]
+        info = {
+            "pid": os.getpid(),
+            "cpus": cpus,
+            "threads": threads,
+            "load_s": time.perf_counter() - started,
+            "shared_weight_bytes": getattr(model, "mmap_shared_bytes", 0),
+        }
+    except BaseException:
+        results.put(("error", worker, traceback.format_exc()))
+        return
+    results.put(("ready", worker, info))
+
+    caches: Dict[Any, ResponseCache] = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job, run_index, cache_args, kwargs = task
+        kwargs = dict(kwargs)
+        raw = kwargs.pop("raw")
+        if cache_args is not None and cache_args not in caches:
+            caches[cache_args] = ResponseCache(*cache_args)
+        try:
+            started = time.perf_counter()
+            with collect_telemetry() as telemetry:
+                conv = client.run_conversation(
+                    model_name=model_name,
+                    run_index=run_index,
+                    response_cache=caches.get(cache_args) if cache_args else None,
+                    **kwargs,
+                )
+            stats = {
+                "runs": 1,
+                "generated_tokens": _generated_tokens(conv),
+                "busy_s": time.perf_counter() - started,
+            }
+            conv = retain_raw_responses(conv, raw, None, run_index)
+            records: List[CallRecord] = telemetry.records()
+        except Exception:
+            results.put(("error", job, run_index, traceback.format_exc()))
+            continue
+        results.put(("ok", job, run_index, worker, conv, records, stats))
+
+
+__all__ = ["LocalReplicaPool"]
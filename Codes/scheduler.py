@@ -0,0 +1,502 @@
+# src/scheduler.py
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .client import (
+    ConversationResult,
+    HuggingFaceLocalClient,
+    MessageStats,
+    _cache_scope,
+    _KVCacheState,
+    _normalize_logprob_flags,
+    _pop_stream,
+    _record_turn,
+    _StopSpec,
+    np,
+    torch,
+    transformers,
+)
+
+
+# --- KV cache layout helpers ---------------------------------------------------------
+
+
+def _cache_layers(past: Any) -> List[Tuple[Any, Any]]:
+    """(keys, values) per layer, each [batch, heads, seq, head_dim]."""
+    if hasattr(past, "layers"):  # transformers >= 4.56
+        return [(layer.keys, layer.values) for layer in past.layers]
+    if hasattr(past, "key_cache"):
+        return list(zip(past.key_cache, past.value_cache))
+    return [(k, v) for k, v in past]  # legacy tuple cache
+
+
+def _cache_from_layers(layers: List[Tuple[Any, Any]]) -> Any:
+    cache = transformers.DynamicCache()
+    for idx, (keys, values) in enumerate(layers):
+        cache.update(keys, values, idx)
+    return cache
+
+
+def _left_pad(tensor: Any, length: int) -> Any:
+    """Pad the sequence axis (dim 2) on the left with zeros up to `length`."""
+    missing = length - tensor.shape[2]
+    if missing <= 0:
+        return tensor
+    pad = tensor.new_zeros(tensor.shape[:2] + (missing,) + tensor.shape[3:])
+    return torch.cat([pad, tensor], dim=2)
+
+
+# --- Continuous batching -------------------------------------------------------------
+
+
+@dataclass
+class _Sequence:
+    """One assistant turn in flight (a row of the running batch)."""
+
+    conv: int
+    turn: int
+    prompt_ids: List[int]
+    want_logprobs: bool
+    started: float
+    generated: List[int] = field(default_factory=list)
+    logprobs: List[float] = field(default_factory=list)
+    length: int = 0  # tokens held in the KV cache for this row
+    next_id: int = -1  # sampled token that still has to be fed to the model
+
+
+@dataclass
+class SchedulerStats:
+    """Counters of one ContinuousBatchScheduler.run() call."""
+
+    decode_steps: int = 0
+    decode_tokens: int = 0
+    prefill_tokens: int = 0
+    reused_prompt_tokens: int = 0
+    peak_batch_size: int = 0
+    peak_kv_bytes: int = 0
+    wall_s: float = 0.0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.decode_tokens / self.decode_steps if self.decode_steps else 0.0
+
+    @property
+    def tokens_per_s(self) -> float:
+        return self.decode_tokens / self.wall_s if self.wall_s > 0 else float("nan")
+
+
+class ContinuousBatchScheduler:
+    """
+    Continuous (in-flight) batching for a HuggingFaceLocalClient.
+
+    A static batch (run_conversations_batched) keeps every row until the
+    longest reply of the turn is done, so short replies leave their slots
+    idle. Here every decode step feeds one token for each running sequence,
+    finished sequences leave the batch immediately, and queued sequences
+    (the next turn of a conversation that just finished one, or the first
+    turn of a new run) are prefilled and join at the next step. Throughput
+    therefore depends on the mean reply length, not on the longest one.
+
+    The batch shares one left-padded KV cache; a sequence's attention mask
+    and position ids cover only its own tokens, so every row computes the
+    same result as an unbatched run. Between turns a conversation's KV cache
+    is kept and only the new transcript tail is prefilled (reuse_kv_cache),
+    and first turns start from the client's PrefixKVCache.
+
+    - max_batch_size: number of slots (sequences decoded together).
+    - max_kv_bytes: cap on KV cache memory. A sequence is admitted only if
+      the padded batch cache, grown to every row's max_new_tokens, plus the
+      caches kept between turns still fits; kept caches are dropped (and
+      their transcripts prefilled again later) before a slot is refused.
+      One sequence always runs.
+
+    Supported generation kwargs: max_new_tokens, min_new_tokens, stop,
+    do_sample, temperature, top_k and top_p (defaults from the model's
+    generation_config, as in generate()).
+    """
+
+    def __init__(
+        self,
+        client: HuggingFaceLocalClient,
+        max_batch_size: int = 16,
+        max_kv_bytes: Optional[int] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1 (got {max_batch_size}).")
+        if client.draft_model is not None:
+            raise ValueError("Continuous batching does not support draft models.")
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_kv_bytes = max_kv_bytes
+        self.stats = SchedulerStats()
+        self._kv_token_bytes: Optional[int] = None
+
+    # ---- public ---------------------------------------------------------------------
+
+    def run(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        n_conversations: int,
+        system_prompt: Optional[str] = None,
+        request_logprobs: Optional[List[bool]] = None,
+        run_offset: int = 0,
+        on_result: Optional[Callable[[ConversationResult], None]] = None,
+        **gen_kwargs: Any,
+    ) -> List[ConversationResult]:
+        """
+        Generate n_conversations conversations (run indices run_offset, ...)
+        and return them in run order; on_result is called as each completes.
+        """
+        if not user_prompts:
+            raise ValueError("user_prompts must contain at least one prompt string.")
+        if n_conversations < 1:
+            raise ValueError(f"n_conversations must be >= 1 (got {n_conversations}).")
+        self._setup(model_name, user_prompts, system_prompt, request_logprobs, gen_kwargs)
+        self._run_offset = run_offset
+
+        self.stats = SchedulerStats()
+        started = time.perf_counter()
+        self._results = [
+            ConversationResult(model_name=model_name, messages=[], assistant_messages=[])
+            for _ in range(n_conversations)
+        ]
+        self._transcripts = [""] * n_conversations
+        self._kv_states: Dict[int, _KVCacheState] = {}
+        self._on_result = on_result
+        # next turns of running conversations go first, so their caches are freed soon
+        self._continuing: Deque[_Sequence] = deque()
+        self._fresh: Deque[int] = deque(range(n_conversations))
+        self._rows: List[_Sequence] = []
+        self._cache: Any = None
+        self._cache_len = 0
+
+        with torch.no_grad():  # type: ignore[attr-defined]
+            self._admit()
+            while self._rows:
+                self._decode_step()
+                self._admit()
+        self.stats.wall_s = time.perf_counter() - started
+        return self._results
+
+    # ---- setup ----------------------------------------------------------------------
+
+    def _setup(
+        self,
+        model_name: str,
+        user_prompts: List[str],
+        system_prompt: Optional[str],
+        request_logprobs: Optional[List[bool]],
+        gen_kwargs: Dict[str, Any],
+    ) -> None:
+        client = self.client
+        gen_kwargs = dict(gen_kwargs)
+        self._model_name = model_name
+        self._user_prompts = user_prompts
+        self._system_prompt = system_prompt
+        self._want_logprobs = _normalize_logprob_flags(user_prompts, request_logprobs)
+        self._max_new_tokens = gen_kwargs.pop("max_new_tokens", 256)
+        self._stop = _StopSpec.from_kwarg(gen_kwargs.pop("stop", None))
+        if _pop_stream(model_name, gen_kwargs):
+            raise ValueError("stream=True is not supported for batched generation.")
+        self._scope_kwargs = client._scope_kwargs(
+            dict(gen_kwargs), self._max_new_tokens, self._stop
+        )
+
+        config = client.model.generation_config
+        do_sample = gen_kwargs.pop("do_sample", config.do_sample)
+        temperature = gen_kwargs.pop("temperature", config.temperature)
+        top_k = gen_kwargs.pop("top_k", config.top_k)
+        top_p = gen_kwargs.pop("top_p", config.top_p)
+        self._min_new_tokens = gen_kwargs.pop("min_new_tokens", config.min_new_tokens) or 0
+        if gen_kwargs:
+            raise ValueError(
+                f"Generation kwargs not supported with continuous batching: {sorted(gen_kwargs)}."
+            )
+
+        # same warpers, in the same order, as generate() uses for sampling
+        self._do_sample = bool(do_sample)
+        self._warpers = []
+        if self._do_sample:
+            if temperature is not None and temperature != 1.0:
+                self._warpers.append(transformers.TemperatureLogitsWarper(temperature))
+            if top_k:
+                self._warpers.append(transformers.TopKLogitsWarper(top_k))
+            if top_p is not None and top_p < 1.0:
+                self._warpers.append(transformers.TopPLogitsWarper(top_p))
+
+        self._end_ids = client._eos_token_ids() | set(self._stop.token_ids)
+        self._end_index = torch.tensor(
+            sorted(self._end_ids), dtype=torch.long, device=client.device
+        )
+        self._stop_window = max((len(s) for s in self._stop.strings), default=0) + 1
+
+    # ---- admission ------------------------------------------------------------------
+
+    def _next_sequence(self) -> Optional[_Sequence]:
+        if self._continuing:
+            return self._continuing[0]
+        if self._fresh:
+            conv = self._fresh[0]
+            if self._system_prompt:
+                self._transcripts[conv] = f"[SYSTEM]: {self._system_prompt}\n"
+                self._results[conv].messages.append(
+                    MessageStats(role="system", content=self._system_prompt)
+                )
+            seq = self._new_turn(conv, 0)
+            self._fresh.popleft()
+            self._continuing.appendleft(seq)
+            return seq
+        return None
+
+    def _new_turn(self, conv: int, turn: int) -> _Sequence:
+        user_prompt = self._user_prompts[turn]
+        self._transcripts[conv] += f"[USER]: {user_prompt}\n"
+        self._results[conv].messages.append(MessageStats(role="user", content=user_prompt))
+        prompt = self._transcripts[conv] + "[ASSISTANT]:"
+        prompt_ids = self.client.tokenizer(prompt, add_special_tokens=False)["input_ids"]
+        return _Sequence(
+            conv=conv,
+            turn=turn,
+            prompt_ids=list(prompt_ids),
+            want_logprobs=self._want_logprobs[turn],
+            started=time.perf_counter(),
+        )
+
+    def _parked_bytes(self, exclude: Optional[int] = None) -> int:
+        total = 0
+        for conv, state in self._kv_states.items():
+            if conv != exclude and state.past is not None:
+                total += len(state.ids) * (self._kv_token_bytes or 0)
+        return total
+
+    def _fits(self, seq: _Sequence) -> bool:
+        """Whether admitting seq keeps the projected KV memory under max_kv_bytes."""
+        if not self._rows:
+            return True
+        if len(self._rows) >= self.max_batch_size:
+            return False
+        if self.max_kv_bytes is None or self._kv_token_bytes is None:
+            return True
+        # left padding: every row is as long as the longest one
+        longest = max(
+            [r.length + self._max_new_tokens - len(r.generated) for r in self._rows]
+            + [len(seq.prompt_ids) + self._max_new_tokens]
+        )
+        projected = (len(self._rows) + 1) * longest * self._kv_token_bytes
+        if projected + self._parked_bytes(exclude=seq.conv) <= self.max_kv_bytes:
+            return True
+        if projected > self.max_kv_bytes:
+            return False
+        # kept caches only save prefill work: give up the largest ones for a slot
+        while projected + self._parked_bytes(exclude=seq.conv) > self.max_kv_bytes:
+            conv = max(
+                (c for c, state in self._kv_states.items() if c != seq.conv),
+                key=lambda c: len(self._kv_states[c].ids),
+            )
+            del self._kv_states[conv]
+        return True
+
+    def _admit(self) -> None:
+        while True:
+            seq = self._next_sequence()
+            if seq is None or not self._fits(seq):
+                return
+            self._continuing.popleft()
+            logits, past = self._prefill(seq)
+            if self._choose([seq], logits)[0]:
+                self._finish(seq, past)
+            else:
+                self._join(seq, past)
+
+    def _prefill(self, seq: _Sequence) -> Tuple[Any, Any]:
+        """Encode seq's prompt (reusing cached KV where possible); last-position logits."""
+        client = self.client
+        past = None
+        state = self._kv_states.pop(seq.conv, None)
+        if state is not None:
+            past = client._reusable_kv_cache(state, seq.prompt_ids)
+        elif client.prefix_cache is not None:
+            past = client._shared_prefix_kv_cache(seq.prompt_ids)
+
+        cached = past.get_seq_length() if past is not None else 0
+        self.stats.reused_prompt_tokens += cached
+        self.stats.prefill_tokens += len(seq.prompt_ids) - cached
+        ids = torch.tensor([seq.prompt_ids[cached:]], device=client.device)
+        out = client.model(input_ids=ids, past_key_values=past, use_cache=True)
+        seq.length = len(seq.prompt_ids)
+
+        if self._kv_token_bytes is None:
+            nbytes = sum(
+                k.numel() * k.element_size() + v.numel() * v.element_size()
+                for k, v in _cache_layers(out.past_key_values)
+            )
+            self._kv_token_bytes = nbytes // max(1, seq.length)
+        return out.logits[:, -1, :], out.past_key_values
+
+    def _join(self, seq: _Sequence, past: Any) -> None:
+        """Merge a prefilled sequence into the running batch cache."""
+        new_layers = _cache_layers(past)
+        if self._cache is None:
+            merged = new_layers
+            self._cache_len = seq.length
+        else:
+            length = max(self._cache_len, seq.length)
+            merged = [
+                (
+                    torch.cat([_left_pad(k, length), _left_pad(nk, length)], dim=0),
+                    torch.cat([_left_pad(v, length), _left_pad(nv, length)], dim=0),
+                )
+                for (k, v), (nk, nv) in zip(_cache_layers(self._cache), new_layers)
+            ]
+            self._cache_len = length
+        self._cache = _cache_from_layers(merged)
+        self._rows.append(seq)
+        self.stats.peak_batch_size = max(self.stats.peak_batch_size, len(self._rows))
+
+    # ---- decoding -------------------------------------------------------------------
+
+    def _decode_step(self) -> None:
+        device = self.client.device
+        rows = self._rows
+        lengths = torch.tensor([r.length for r in rows], device=device)
+        # each row attends to its own last `length` cached tokens plus the new one
+        columns = torch.arange(self._cache_len + 1, device=device)
+        mask = (columns[None, :] >= (self._cache_len - lengths)[:, None]).long()
+        out = self.client.model(
+            input_ids=torch.tensor([[r.next_id] for r in rows], device=device),
+            attention_mask=mask,
+            position_ids=lengths[:, None],
+            past_key_values=self._cache,
+            use_cache=True,
+        )
+        self._cache = out.past_key_values
+        self._cache_len += 1
+        for r in rows:
+            r.length += 1
+
+        self.stats.decode_steps += 1
+        self.stats.decode_tokens += len(rows)
+        self.stats.peak_kv_bytes = max(
+            self.stats.peak_kv_bytes, len(rows) * self._cache_len * (self._kv_token_bytes or 0)
+        )
+
+        done = self._choose(rows, out.logits[:, -1, :])
+        if any(done):
+            self._retire([i for i, d in enumerate(done) if d])
+
+    def _choose(self, rows: List[_Sequence], logits: Any) -> List[bool]:
+        """Pick each row's next token (as generate() would); True where a row finished."""
+        scores = logits.float()
+        if self._min_new_tokens and len(self._end_index):
+            young = [i for i, r in enumerate(rows) if len(r.generated) < self._min_new_tokens]
+            if young:
+                young_index = torch.tensor(young, device=scores.device)
+                scores[young_index[:, None], self._end_index[None, :]] = -float("inf")
+        for warper in self._warpers:
+            scores = warper(None, scores)
+        if self._do_sample:
+            chosen = torch.multinomial(torch.softmax(scores, dim=-1), num_samples=1)[:, 0]
+        else:
+            chosen = scores.argmax(dim=-1)
+
+        logprobs = None
+        if any(r.want_logprobs for r in rows):
+            logprobs = torch.log_softmax(scores, dim=-1).gather(1, chosen[:, None])[:, 0]
+            logprobs = logprobs.tolist()
+
+        done = []
+        for i, (r, tok) in enumerate(zip(rows, chosen.tolist())):
+            r.generated.append(tok)
+            r.next_id = tok
+            if r.want_logprobs:
+                r.logprobs.append(logprobs[i])  # type: ignore[index]
+            done.append(
+                tok in self._end_ids
+                or len(r.generated) >= self._max_new_tokens
+                or self._hit_stop_string(r)
+            )
+        return done
+
+    def _hit_stop_string(self, seq: _Sequence) -> bool:
+        if not self._stop.strings:
+            return False
+        tail = self.client.tokenizer.decode(
+            seq.generated[-self._stop_window :], skip_special_tokens=True
+        )
+        return any(s in tail for s in self._stop.strings)
+
+    def _retire(self, finished: List[int]) -> None:
+        layers = _cache_layers(self._cache)
+        for i in finished:
+            seq = self._rows[i]
+            past = None
+            if self.client.reuse_kv_cache and seq.turn + 1 < len(self._user_prompts):
+                # copies, so the kept cache does not pin the whole batch cache
+                start = self._cache_len - seq.length
+                past = _cache_from_layers(
+                    [
+                        (k[i : i + 1, :, start:].clone(), v[i : i + 1, :, start:].clone())
+                        for k, v in layers
+                    ]
+                )
+            self._finish(seq, past)
+
+        gone = set(finished)
+        self._rows = [r for i, r in enumerate(self._rows) if i not in gone]
+        if not self._rows:
+            self._cache, self._cache_len = None, 0
+            return
+        keep = torch.tensor(
+            [i for i in range(len(layers[0][0])) if i not in gone], device=self.client.device
+        )
+        # drop the padding columns no remaining row needs
+        length = max(r.length for r in self._rows)
+        start = self._cache_len - length
+        self._cache = _cache_from_layers(
+            [(k[keep, :, start:], v[keep, :, start:]) for k, v in layers]
+        )
+        self._cache_len = length
+
+    # ---- results --------------------------------------------------------------------
+
+    def _finish(self, seq: _Sequence, past: Any) -> None:
+        """Record the finished turn and queue the conversation's next turn."""
+        client = self.client
+        generated = torch.tensor(seq.generated, dtype=torch.long)
+        logprobs = np.asarray(seq.logprobs, dtype=np.float32) if seq.want_logprobs else None
+        msg_stats, raw = client._finish_turn(generated, logprobs, self._stop)
+
+        conv = self._results[seq.conv]
+        conv.messages.append(msg_stats)
+        conv.assistant_messages.append(msg_stats)
+        conv.raw_responses.append(raw)
+        scope = _cache_scope(
+            "huggingface", client.model_id, self._scope_kwargs, self._run_offset + seq.conv
+        )
+        usage = {"output_tokens": len(raw["generated_ids"])}
+        _record_turn(
+            self._model_name,
+            scope,
+            seq.turn,
+            seq.started,
+            turn=(msg_stats.content, None, raw, None, usage),
+        )
+        self._transcripts[seq.conv] += f" {msg_stats.content}\n"
+
+        if seq.turn + 1 < len(self._user_prompts):
+            if past is not None and client.reuse_kv_cache:
+                # the last sampled token was never fed to the model
+                ids = seq.prompt_ids + seq.generated[:-1]
+                self._kv_states[seq.conv] = _KVCacheState(ids=ids[: seq.length], past=past)
+            self._continuing.append(self._new_turn(seq.conv, seq.turn + 1))
+        elif self._on_result is not None:
+            self._on_result(conv)
+
+
+__all__ = ["ContinuousBatchScheduler", "SchedulerStats"]
@@ -0,0 +1,346 @@
+# src/telemetry.py
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import math
+import os
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from .lazy import LazyModule
+
+pd = LazyModule("pandas", "pandas package is not installed. Add 'pandas' to requirements.txt.")
+
+
+# --- Call records --------------------------------------------------------------------
+
+
+@dataclass
+class CallRecord:
+    """
+    One assistant turn as seen by the client.
+
+    - status: "ok", "cache_hit", "rate_limited", "retryable" or "fatal"
+      (the last three when the call finally failed, see ratelimit.classify_error)
+    - latency_s: duration of the last provider attempt
+    - end_to_end_s: including rate-limit waits, retries and backoff
+    """
+
+    model: str
+    provider: Optional[str]
+    run_index: int
+    turn_index: int
+    status: str
+    latency_s: float
+    end_to_end_s: float
+    retries: int = 0
+    cache_hit: bool = False
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cache_read_tokens: Optional[int] = None
+    error: Optional[str] = None
+
+
+# --- HDR-style histogram -------------------------------------------------------------
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with bounded relative error (HDR-style).
+
+    Bucket k holds values in (lowest * r^(k-1), lowest * r^k] with r = 1 + precision,
+    so every quantile is reported within `precision` relative error over any range
+    of magnitudes, and memory grows only with the number of buckets touched.
+    """
+
+    def __init__(self, precision: float = 0.01, lowest: float = 1e-4):
+        if precision <= 0.0 or lowest <= 0.0:
+            raise ValueError("precision and lowest must be positive.")
+        self.precision = precision
+        self.lowest = lowest
+        self._log_ratio = math.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        return int(math.ceil(math.log(value / self.lowest) / self._log_ratio))
+
+    def _upper(self, index: int) -> float:
+        return self.lowest * math.exp(index * self._log_ratio)
+
+    def record(self, value: float) -> None:
+        value = max(0.0, float(value))
+        idx = self._index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if (other.precision, other.lowest) != (self.precision, self.lowest):
+            raise ValueError("Can only merge histograms with the same precision / lowest.")
+        for idx, n in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile q in [0, 1] (nan when empty)."""
+        if not self.count:
+            return math.nan
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(self._upper(idx), self.max)
+        return self.max
+
+    def count_le(self, bound: float) -> int:
+        """Number of recorded values <= bound (up to bucket precision)."""
+        limit = self._index(bound)
+        return sum(n for idx, n in self.counts.items() if idx <= limit)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+
+# --- Registry ------------------------------------------------------------------------
+
+
+# Prometheus bucket boundaries (seconds) used for export; the histogram itself is finer.
+PROMETHEUS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _ModelStats:
+    def __init__(self, provider: Optional[str]):
+        self.provider = provider
+        self.calls_by_status: Dict[str, int] = {}
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.latency = LatencyHistogram()
+        self.end_to_end = LatencyHistogram()
+
+
+class TelemetryRegistry:
+    """
+    In-process registry of provider calls.
+
+    Aggregates per model (calls by status, retries, token counts, latency and
+    end-to-end histograms) and keeps the last `keep_records` CallRecords for
+    finding tail-latency outliers. Hooks added with add_hook() are called with
+    every record. Thread-safe.
+    """
+
+    def __init__(self, keep_records: int = 10_000):
+        self.enabled = True
+        self._models: Dict[str, _ModelStats] = {}
+        self._records: Deque[CallRecord] = deque(maxlen=keep_records)
+        self._hooks: List[Callable[[CallRecord], None]] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[CallRecord], None]) -> None:
+        self._hooks.append(hook)
+
+    def record(self, call: CallRecord) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._models.get(call.model)
+            if stats is None:
+                stats = self._models[call.model] = _ModelStats(call.provider)
+            stats.calls_by_status[call.status] = stats.calls_by_status.get(call.status, 0) + 1
+            stats.retries += call.retries
+            stats.input_tokens += call.input_tokens or 0
+            stats.output_tokens += call.output_tokens or 0
+            stats.cache_read_tokens += call.cache_read_tokens or 0
+            if not call.cache_hit:
+                stats.latency.record(call.latency_s)
+                stats.end_to_end.record(call.end_to_end_s)
+            self._records.append(call)
+        for hook in self._hooks:
+            hook(call)
+
+    def records(self) -> List[CallRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def slowest(self, n: int = 10) -> List[CallRecord]:
+        """The n retained calls with the longest end-to-end time."""
+        return sorted(self.records(), key=lambda c: c.end_to_end_s, reverse=True)[:n]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._records.clear()
+
+    # ---- export ---------------------------------------------------------------------
+
+    def summary_frame(self) -> Any:
+        """pandas DataFrame with one row per model."""
+        rows = []
+        with self._lock:
+            for model, s in sorted(self._models.items()):
+                calls = sum(s.calls_by_status.values())
+                rows.append(
+                    {
+                        "model": model,
+                        "provider": s.provider,
+                        "calls": calls,
+                        "ok": s.calls_by_status.get("ok", 0),
+                        "cache_hits": s.calls_by_status.get("cache_hit", 0),
+                        "errors": calls
+                        - s.calls_by_status.get("ok", 0)
+                        - s.calls_by_status.get("cache_hit", 0),
+                        "retries": s.retries,
+                        "input_tokens": s.input_tokens,
+                        "output_tokens": s.output_tokens,
+                        "cache_read_tokens": s.cache_read_tokens,
+                        "latency_mean_s": s.latency.mean,
+                        "latency_p50_s": s.latency.quantile(0.5),
+                        "latency_p90_s": s.latency.quantile(0.9),
+                        "latency_p99_s": s.latency.quantile(0.99),
+                        "latency_max_s": s.latency.max if s.latency.count else math.nan,
+                        "end_to_end_p50_s": s.end_to_end.quantile(0.5),
+                        "end_to_end_p99_s": s.end_to_end.quantile(0.99),
+                    }
+                )
+        return pd.DataFrame(rows).set_index("model") if rows else pd.DataFrame()
+
+    def records_frame(self) -> Any:
+        """pandas DataFrame of the retained CallRecords (one row per call)."""
+        return pd.DataFrame([asdict(c) for c in self.records()])
+
+    def to_prometheus(self, prefix: str = "llm") -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+
+        def emit_header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+        with self._lock:
+            models = sorted(self._models.items())
+
+            emit_header("calls_total", "counter", "Assistant turns by final status.")
+            for model, s in models:
+                for status, n in sorted(s.calls_by_status.items()):
+                    labels = _labels(model=model, provider=s.provider, status=status)
+                    lines.append(f"{prefix}_calls_total{labels} {n}")
+
+            emit_header("retries_total", "counter", "Provider retries after errors.")
+            for model, s in models:
+                lines.append(f"{prefix}_retries_total{_labels(model=model)} {s.retries}")
+
+            emit_header("tokens_total", "counter", "Tokens reported by the provider.")
+            for model, s in models:
+                for kind, n in (
+                    ("input", s.input_tokens),
+                    ("output", s.output_tokens),
+                    ("cache_read", s.cache_read_tokens),
+                ):
+                    lines.append(f"{prefix}_tokens_total{_labels(model=model, kind=kind)} {n}")
+
+            for name, attr, help_text in (
+                ("call_latency_seconds", "latency", "Duration of the last provider attempt."),
+                ("call_end_to_end_seconds", "end_to_end", "Including throttling and retries."),
+            ):
+                emit_header(name, "histogram", help_text)
+                for model, s in models:
+                    hist: LatencyHistogram = getattr(s, attr)
+                    for bound in PROMETHEUS_BUCKETS:
+                        labels = _labels(model=model, le=_fmt(bound))
+                        lines.append(f"{prefix}_{name}_bucket{labels} {hist.count_le(bound)}")
+                    labels = _labels(model=model, le="+Inf")
+                    lines.append(f"{prefix}_{name}_bucket{labels} {hist.count}")
+                    lines.append(f"{prefix}_{name}_sum{_labels(model=model)} {_fmt(hist.total)}")
+                    lines.append(f"{prefix}_{name}_count{_labels(model=model)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Union[str, os.PathLike], prefix: str = "llm") -> None:
+        """Write to_prometheus() atomically (e.g. for node_exporter's textfile collector)."""
+        path = os.fspath(path)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.to_prometheus(prefix))
+        os.replace(tmp, path)
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value))
+
+
+def _labels(**labels: Any) -> str:
+    parts = []
+    for key, value in labels.items():
+        if value is None:
+            continue
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+# --- Process-wide + scoped registries ------------------------------------------------
+
+
+_GLOBAL = TelemetryRegistry()
+_SCOPED: contextvars.ContextVar[Tuple[TelemetryRegistry, ...]] = contextvars.ContextVar(
+    "telemetry_scopes", default=()
+)
+
+
+def get_telemetry() -> TelemetryRegistry:
+    """The process-wide registry (receives every call)."""
+    return _GLOBAL
+
+
+@contextlib.contextmanager
+def collect_telemetry(
+    registry: Optional[TelemetryRegistry] = None,
+) -> Iterator[TelemetryRegistry]:
+    """
+    Additionally record calls made inside this block (including asyncio tasks
+    and worker threads started from it) into `registry` (a new one by default).
+    """
+    registry = registry if registry is not None else TelemetryRegistry()
+    token = _SCOPED.set(_SCOPED.get() + (registry,))
+    try:
+        yield registry
+    finally:
+        _SCOPED.reset(token)
+
+
+def record_call(call: CallRecord) -> None:
+    _GLOBAL.record(call)
+    for registry in _SCOPED.get():
+        registry.record(call)
+
+
+def telemetry_enabled() -> bool:
+    return _GLOBAL.enabled or bool(_SCOPED.get())
+
+
+__all__ = [
+    "CallRecord",
+    "LatencyHistogram",
+    "TelemetryRegistry",
+    "PROMETHEUS_BUCKETS",
+    "get_telemetry",
+    "collect_telemetry",
+    "record_call",
+]
@@ -0,0 +1,101 @@
+# tests/conftest.py
+
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+try:
+    import Codes.config  # noqa: F401  (the user's own model list, if present)
+except ModuleNotFoundError:
+    # config.py is local to each checkout; tests register the entries they use.
+    _config = types.ModuleType("Codes.config")
+    _config.MODEL_CONFIG = {}
+    sys.modules["Codes.config"] = _config
+
+
+@pytest.fixture
+def model_config(monkeypatch):
+    """Register MODEL_CONFIG entries for one test: model_config(name, **entry)."""
+    from Codes import client, ratelimit
+    from Codes.config import MODEL_CONFIG
+
+    def register(name, **entry):
+        monkeypatch.setitem(MODEL_CONFIG, name, entry)
+        return name
+
+    monkeypatch.setattr(client, "_DEFAULT_REGISTRY", None)
+    monkeypatch.setattr(ratelimit, "_LIMITERS", {})
+    yield register
+    if client._DEFAULT_REGISTRY is not None:
+        client._DEFAULT_REGISTRY.close()
+
+
+# Text the tiny test tokenizer is trained on (any short English does).
+_TINY_CORPUS = [
+    "The assistant answers every question about the scenario briefly and politely.",
+    "Tell me more about the patient, the doctor and the hospital in this story.",
+    "Please describe what happened next, and explain why the decision was made.",
+    "Consistency across runs matters when we compare language models on tasks.",
+]
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory):
+    """A randomly initialised two-layer LLaMA with a byte-level BPE tokenizer."""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    tokenizers = pytest.importorskip("tokenizers")
+
+    path = tmp_path_factory.mktemp("tiny-llama")
+    tok = tokenizers.Tokenizer(tokenizers.models.BPE(unk_token="<unk>"))
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = tokenizers.decoders.ByteLevel()
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=400,
+        special_tokens=["<unk>", "<s>", "</s>", "<pad>"],
+        initial_alphabet=tokenizers.pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tok.train_from_iterator(_TINY_CORPUS * 4, trainer)
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tok,
+        unk_token="<unk>",
+        bos_token="<s>",
+        eos_token="</s>",
+        pad_token="<pad>",
+    )
+    tokenizer.save_pretrained(path)
+
+    config = transformers.LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=1024,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    torch.manual_seed(0)
+    transformers.LlamaForCausalLM(config).save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture
+def tiny_client(tiny_model_dir):
+    """tiny_client(**kwargs): a CPU HuggingFaceLocalClient with its own caches."""
+    from Codes.client import HuggingFaceLocalClient, LocalModelCache, PrefixKVCache
+
+    def make(**kwargs):
+        kwargs.setdefault("model_cache", LocalModelCache())
+        kwargs.setdefault("prefix_cache", PrefixKVCache())
+        return HuggingFaceLocalClient(tiny_model_dir, device="cpu", **kwargs)
+
+    return make
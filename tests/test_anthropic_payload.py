@@ -0,0 +1,40 @@
+# tests/test_anthropic_payload.py
+
+from Codes.client import AnthropicChatClient
+
+HISTORY = [
+    {"role": "system", "content": "Be a robot."},
+    {"role": "user", "content": "Hi"},
+    {"role": "assistant", "content": "Hello."},
+    {"role": "user", "content": "Bye"},
+]
+
+
+def test_system_prompt_goes_to_the_system_parameter():
+    kwargs = AnthropicChatClient._request_kwargs(HISTORY)
+
+    assert kwargs["system"] == "Be a robot."
+    assert [m["role"] for m in kwargs["messages"]] == ["user", "assistant", "user"]
+
+
+def test_cache_breakpoints():
+    caching = AnthropicChatClient._prompt_caching(
+        {"prompt_caching": {"breakpoints": ["system", "last_user"], "ttl": "1h"}}
+    )
+    kwargs = AnthropicChatClient._request_kwargs(HISTORY, caching)
+
+    control = {"type": "ephemeral", "ttl": "1h"}
+    assert kwargs["system"] == [{"type": "text", "text": "Be a robot.", "cache_control": control}]
+    assert kwargs["messages"][0] == {"role": "user", "content": "Hi"}
+    assert kwargs["messages"][-1]["content"] == [
+        {"type": "text", "text": "Bye", "cache_control": control}
+    ]
+    assert all(m["role"] != "system" for m in kwargs["messages"])
+
+
+def test_no_system_prompt():
+    caching = AnthropicChatClient._prompt_caching({"prompt_caching": True})
+    kwargs = AnthropicChatClient._request_kwargs(HISTORY[1:], caching)
+
+    assert "system" not in kwargs
+    assert "cache_control" in kwargs["messages"][0]["content"][0]
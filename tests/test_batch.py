@@ -0,0 +1,77 @@
+# tests/test_batch.py
+
+import pytest
+
+from Codes.batch import (
+    FileBatchBackend,
+    OpenAIBatchBackend,
+    make_batch_backend,
+    run_conversations_batch,
+)
+from Codes.client import SimulatedChatClient, get_llm_client
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+def test_file_backend_removes_its_temporary_directory():
+    with FileBatchBackend() as backend:
+        directory = backend.directory
+        assert directory.is_dir()
+    assert not directory.exists()
+
+
+def test_file_backend_keeps_a_given_directory(tmp_path):
+    backend = FileBatchBackend(tmp_path / "jobs")
+    backend.close()
+    assert (tmp_path / "jobs").is_dir()
+
+
+def test_batch_run_cleans_up_the_backend_it_created(model_config, monkeypatch):
+    model = model_config("sim-batch", provider="simulated", batch_poll_interval=0.0)
+    created = []
+    original_init = FileBatchBackend.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        created.append(self.directory)
+
+    monkeypatch.setattr(FileBatchBackend, "__init__", tracking_init)
+
+    results = run_conversations_batch(model, ["Hello", "And then?"], n_runs=3)
+
+    assert [len(r.assistant_messages) for r in results] == [2, 2, 2]
+    assert len(created) == 1 and not created[0].exists()
+
+
+def test_file_backend_uses_the_recorded_run_index():
+    sim = SimulatedChatClient({"supports_logprobs": True})
+    with FileBatchBackend() as backend:
+        job_id = backend.submit([("first", 3, MESSAGES, True), ("second", 0, MESSAGES, True)])
+        assert backend.is_done(job_id)
+        results = backend.results(job_id)
+
+    for cid, run_index in (("first", 3), ("second", 0)):
+        text, token_stats, _ = sim.complete(MESSAGES, True, run_index)
+        assert results[cid][0] == text
+        assert results[cid][1] == token_stats
+
+
+def test_openai_backend_shares_the_registry_client(model_config):
+    pytest.importorskip("openai")
+    model = model_config("gpt-batch", provider="openai", model_id="gpt-test")
+
+    first = make_batch_backend(model, api_key="sk-test")
+    second = make_batch_backend(model, api_key="sk-test")
+
+    assert isinstance(first, OpenAIBatchBackend)
+    sdk_client = get_llm_client(model, api_key="sk-test")._client
+    # one pooled HTTP client for chat calls and every batch backend
+    assert first._client._client is sdk_client._client
+    assert second._client._client is sdk_client._client
+    assert first._client.max_retries == 2
+
+
+def test_providers_without_a_batch_endpoint_are_rejected(model_config):
+    model = model_config("gemini-batch", provider="gemini")
+    with pytest.raises(ValueError, match="no batch endpoint"):
+        make_batch_backend(model)
@@ -0,0 +1,55 @@
+# tests/test_cache.py
+
+import os
+import time
+
+from Codes.cache import ResponseCache
+from Codes.client import run_conversation
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = ResponseCache(tmp_path)
+    key = ResponseCache.make_key(model="m", messages=[{"role": "user", "content": "hi"}])
+
+    assert cache.get(key) is None
+    cache.put(key, {"content": "hello"})
+    assert cache.get(key) == {"content": "hello"}
+    assert (tmp_path / key[:2] / f"{key}.json").is_file()
+
+
+def test_make_key_ignores_field_order():
+    assert ResponseCache.make_key(a=1, b={"x": 1, "y": 2}) == ResponseCache.make_key(
+        b={"y": 2, "x": 1}, a=1
+    )
+    assert ResponseCache.make_key(a=1, run_index=0) != ResponseCache.make_key(a=1, run_index=1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=10_000, low_watermark=0.7)
+    keys = [ResponseCache.make_key(i=i) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, {"content": "x" * 3000})
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(keys[0])  # now the most recently used
+
+    cache.put(ResponseCache.make_key(i=3), {"content": "x" * 3000})
+
+    assert cache.nbytes <= 7_000
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None and cache.get(keys[2]) is None
+
+
+def test_conversation_turns_are_served_from_the_cache(model_config, tmp_path):
+    model = model_config("sim-cache", provider="simulated", supports_logprobs=True)
+    cache = ResponseCache(tmp_path)
+    prompts = ["Hello", "Tell me more"]
+
+    first = run_conversation(model, prompts, response_cache=cache, run_index=0)
+    again = run_conversation(model, prompts, response_cache=cache, run_index=0)
+    other_run = run_conversation(model, prompts, response_cache=cache, run_index=1)
+
+    assert [m.content for m in again.assistant_messages] == [
+        m.content for m in first.assistant_messages
+    ]
+    assert all(raw["cached"] for raw in again.raw_responses)
+    assert not any(raw.get("cached") for raw in other_run.raw_responses)
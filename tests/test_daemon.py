@@ -0,0 +1,222 @@
+# tests/test_daemon.py
+
+import os
+import socket
+import threading
+
+import pytest
+
+from Codes import daemon
+from Codes.client import ConversationResult, MessageStats
+from Codes.config import MODEL_CONFIG
+from Codes.telemetry import CallRecord, collect_telemetry, record_call
+from Codes.daemon import (
+    DaemonChatClient,
+    LocalModelDaemon,
+    connect_local_daemon,
+    daemon_socket_path,
+)
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX") or not hasattr(os, "getuid"),
+    reason="the local model daemon needs Unix sockets",
+)
+
+
+class FakeModelCache:
+    """LocalModelCache stand-in that keeps at most max_models keys (LRU)."""
+
+    def __init__(self, max_models=None):
+        self.max_models = max_models
+        self.loaded = []
+
+    def load(self, key):
+        if key in self.loaded:
+            self.loaded.remove(key)
+        self.loaded.append(key)
+        if self.max_models is not None:
+            del self.loaded[: -self.max_models]
+
+    def keys(self):
+        return list(self.loaded)
+
+
+class FakeLocalClient:
+    """Stands in for HuggingFaceLocalClient inside the daemon."""
+
+    draft_model_id = None
+
+    def __init__(self, model_name, cfg, cache):
+        self.cfg = cfg
+        self._model_key = (cfg.get("model_id", model_name), "cpu", "auto", "default")
+        cache.load(self._model_key)
+
+    def run_conversation(self, model_name, user_prompts, stream=False, **kwargs):
+        record_call(
+            CallRecord(
+                model=model_name,
+                provider="huggingface",
+                run_index=0,
+                turn_index=0,
+                status="ok",
+                latency_s=0.01,
+                end_to_end_s=0.01,
+                output_tokens=3,
+            )
+        )
+        content = f"{self.cfg['model_id']}: {user_prompts[0]}"
+        reply = MessageStats(role="assistant", content=content)
+        return ConversationResult(
+            model_name=model_name,
+            messages=[MessageStats(role="user", content=user_prompts[0]), reply],
+            assistant_messages=[reply],
+            raw_responses=[{"stream": stream}],
+        )
+
+
+@pytest.fixture
+def model_cache(monkeypatch):
+    cache = FakeModelCache()
+    monkeypatch.setattr(daemon, "local_model_cache", lambda: cache)
+    monkeypatch.setattr(
+        daemon, "_create_local_client", lambda name, cfg: FakeLocalClient(name, cfg, cache)
+    )
+    return cache
+
+
+@pytest.fixture
+def server(tmp_path, model_cache):
+    server = LocalModelDaemon(socket_path=str(tmp_path / "run" / "daemon.sock"))
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def running_daemon(tmp_path):
+    with LocalModelDaemon(socket_path=str(tmp_path / "run" / "daemon.sock")) as server:
+        yield server
+
+
+def test_default_socket_lives_in_a_private_directory(tmp_path, monkeypatch):
+    monkeypatch.delenv("LLM_CONSISTENCY_DAEMON", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+    assert daemon_socket_path() == str(tmp_path / "llm-consistency" / "daemon.sock")
+
+
+def test_daemon_creates_its_directory_for_the_owner_only(running_daemon):
+    directory = os.path.dirname(running_daemon.socket_path)
+
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    assert os.stat(running_daemon.socket_path).st_mode & 0o777 == 0o600
+    assert daemon._ping(running_daemon.socket_path)["requests"] >= 0
+    assert connect_local_daemon("any", {"daemon_socket": running_daemon.socket_path})
+
+
+def test_socket_open_to_other_users_is_refused(running_daemon):
+    os.chmod(running_daemon.socket_path, 0o666)
+
+    with pytest.raises(PermissionError, match="mode 0600"):
+        daemon._request(running_daemon.socket_path, {"op": "ping"})
+    assert connect_local_daemon("any", {"daemon_socket": running_daemon.socket_path}) is None
+
+
+def test_socket_in_a_shared_directory_is_refused(running_daemon):
+    os.chmod(os.path.dirname(running_daemon.socket_path), 0o777)
+
+    with pytest.raises(PermissionError, match="not writable by other users"):
+        daemon._request(running_daemon.socket_path, {"op": "ping"})
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_PEERCRED"), reason="no peer credentials")
+def test_peer_running_as_another_user_is_refused(monkeypatch):
+    uid = os.getuid()
+    monkeypatch.setattr(daemon.os, "getuid", lambda: uid + 1)
+    left, right = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    with left, right:
+        with pytest.raises(PermissionError, match=f"uid {uid}"):
+            daemon._check_peer(left)
+
+
+def test_clients_of_evicted_models_are_dropped(server, model_cache):
+    model_cache.max_models = 1
+    first, _ = server._client("a", {"model_id": "model-a"})
+    assert server._client("a", {"model_id": "model-a"})[0] is first
+    server._client("b", {"model_id": "model-b"})
+
+    assert [client.cfg["model_id"] for client, _ in server._clients.values()] == ["model-b"]
+    assert [key[0] for key in server.status()["models"]] == ["model-b"]
+    assert server._client("a", {"model_id": "model-a"})[0] is not first
+
+
+def test_requests_bring_their_own_model_options(server):
+    def call(cfg):
+        message = {
+            "op": "call",
+            "method": "run_conversation",
+            "model_name": "shared-name",
+            "cfg": cfg,
+            "kwargs": {"user_prompts": ["Hi"]},
+        }
+        return server.handle(message)["result"]
+
+    streamed = call({"model_id": "model-a", "stream": True})
+    plain = call({"model_id": "model-a"})
+
+    assert streamed.raw_responses == [{"stream": True}]
+    assert plain.raw_responses == [{"stream": False}]
+    assert "shared-name" not in MODEL_CONFIG
+
+
+def test_request_falls_back_in_process_when_the_daemon_dies(tmp_path, model_cache):
+    directory = tmp_path / "run"
+    directory.mkdir(mode=0o700)
+    path = str(directory / "daemon.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o600)
+    listener.listen(1)
+
+    def die_mid_request():
+        conn, _ = listener.accept()
+        daemon._recv(conn)
+        conn.close()
+
+    dying = threading.Thread(target=die_mid_request)
+    dying.start()
+    try:
+        client = DaemonChatClient("m", {"model_id": "model-a"}, path)
+        result = client.run_conversation("m", ["Hi"])
+    finally:
+        dying.join()
+        listener.close()
+
+    assert result.assistant_messages[0].content == "model-a: Hi"
+    assert isinstance(client._fallback, FakeLocalClient)
+
+
+def test_call_round_trip_replays_telemetry(model_cache, running_daemon):
+    cfg = {"model_id": "model-a", "daemon_socket": running_daemon.socket_path}
+    client = connect_local_daemon("m", cfg)
+
+    with collect_telemetry() as telemetry:
+        result = client.run_conversation("m", ["Hi"])
+
+    assert result.assistant_messages[0].content == "model-a: Hi"
+    assert [(call.model, call.output_tokens) for call in telemetry.records()] == [("m", 3)]
+    assert running_daemon.requests == 1
+    assert client._fallback is None
+
+
+def test_client_falls_back_after_the_daemon_stops(model_cache, running_daemon):
+    cfg = {"model_id": "model-a", "daemon_socket": running_daemon.socket_path}
+    client = connect_local_daemon("m", cfg)
+    client.run_conversation("m", ["Hi"])
+    running_daemon.close()
+
+    with collect_telemetry() as telemetry:
+        result = client.run_conversation("m", ["Again"])
+
+    assert result.assistant_messages[0].content == "model-a: Again"
+    assert isinstance(client._fallback, FakeLocalClient)
+    assert len(telemetry.records()) == 1
@@ -0,0 +1,131 @@
+# tests/test_dispatch.py
+
+import pytest
+
+from Codes import consistency
+from Codes.cache import ResponseCache
+from Codes.client import ConversationResult
+from Codes.consistency import CONTINUOUS_BATCH_SLOTS, _generate_runs
+
+
+class FakeLocalClient:
+    """Records which batched entry point _generate_runs picked."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _results(self, n):
+        return [
+            ConversationResult(
+                model_name="local",
+                messages=[],
+                assistant_messages=[],
+                raw_responses=[{"generated_ids": [1, 2]}],
+            )
+            for _ in range(n)
+        ]
+
+    def run_conversations_batched(self, model_name, user_prompts, n_conversations, **kwargs):
+        self.calls.append(("batched", n_conversations, kwargs))
+        return self._results(n_conversations)
+
+    def run_conversations_continuous(
+        self,
+        model_name,
+        user_prompts,
+        n_conversations,
+        max_batch_size,
+        max_kv_bytes,
+        on_result=None,
+        **kwargs,
+    ):
+        self.calls.append(("continuous", n_conversations, dict(kwargs, slots=max_batch_size)))
+        results = self._results(n_conversations)
+        for conv in results:
+            if on_result is not None:
+                on_result(conv)
+        return results
+
+
+@pytest.fixture
+def local_client(model_config, monkeypatch):
+    model_config("local", provider="huggingface", model_id="dummy", max_kv_cache_bytes=1 << 20)
+    client = FakeLocalClient()
+    monkeypatch.setattr(consistency, "get_llm_client", lambda model, api_key=None: client)
+    return client
+
+
+def test_static_batches_are_chunked(local_client):
+    runs = _generate_runs("local", ["Hi"], 10, None, batch_size=4, max_new_tokens=8)
+
+    assert len(runs) == 10
+    assert [(kind, n) for kind, n, _ in local_client.calls] == [
+        ("batched", 4),
+        ("batched", 4),
+        ("batched", 2),
+    ]
+    assert local_client.calls[0][2]["max_new_tokens"] == 8
+
+
+def test_continuous_batching_uses_one_scheduler_call(local_client):
+    runs = _generate_runs(
+        "local", ["Hi"], 10, None, batch_size=4, batching="continuous", raw="none"
+    )
+
+    assert [(kind, n) for kind, n, _ in local_client.calls] == [("continuous", 10)]
+    assert local_client.calls[0][2]["slots"] == 4
+    assert all(run.raw_responses == [None] for run in runs)
+
+
+def test_continuous_batching_defaults_to_full_slot_count(local_client):
+    _generate_runs("local", ["Hi"], 20, None, batching="continuous", raw="none")
+
+    assert local_client.calls[0][2]["slots"] == CONTINUOUS_BATCH_SLOTS == 16
+
+
+def test_batch_size_one_runs_sequentially(model_config):
+    model = model_config("sim-seq", provider="simulated")
+    runs = _generate_runs(model, ["Hi", "More"], 3, None, batch_size=1)
+
+    assert [len(run.assistant_messages) for run in runs] == [2, 2, 2]
+
+
+def test_provider_batch_execution(model_config):
+    model = model_config("sim-provider-batch", provider="simulated", batch_poll_interval=0.0)
+    sequential = _generate_runs(model, ["Hi", "More"], 3, None)
+    batched = _generate_runs(model, ["Hi", "More"], 3, None, execution="batch")
+
+    assert len(batched) == 3
+    assert [len(run.assistant_messages) for run in batched] == [2, 2, 2]
+    assert batched[0].assistant_messages[0].content == sequential[0].assistant_messages[0].content
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        (dict(execution="eventually"), "execution must be"),
+        (dict(batching="dynamic"), "batching must be"),
+        (dict(batch_size=0), "batch_size must be"),
+        (dict(concurrency=0), "concurrency must be"),
+        (dict(replicas=2, batch_size=4), "replicas cannot be combined"),
+        (dict(replicas=2, batching="continuous"), "replicas cannot be combined"),
+    ],
+)
+def test_invalid_combinations(local_client, kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        _generate_runs("local", ["Hi"], 2, None, **kwargs)
+
+
+def test_batch_size_rejects_response_cache(local_client, tmp_path):
+    with pytest.raises(ValueError, match="response_cache is not supported"):
+        _generate_runs(
+            "local", ["Hi"], 2, None, batch_size=2, response_cache=ResponseCache(tmp_path)
+        )
+
+
+def test_models_without_batching_are_rejected(model_config):
+    model = model_config("sim-nobatch", provider="simulated")
+    with pytest.raises(ValueError, match="does not support batched generation"):
+        _generate_runs(model, ["Hi"], 2, None, batch_size=2)
+    with pytest.raises(ValueError, match="does not support continuous batching"):
+        _generate_runs(model, ["Hi"], 2, None, batch_size=2, batching="continuous")
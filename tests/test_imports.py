@@ -0,0 +1,41 @@
+# tests/test_imports.py
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Seconds to import the client and the metrics module in a fresh interpreter.
+IMPORT_BUDGET_S = 1.0
+HEAVY_MODULES = ("torch", "transformers", "openai", "anthropic", "sklearn", "numpy", "pandas")
+
+_PROBE = """
+import json, sys, time, types
+sys.path.insert(0, {root!r})
+try:
+    import Codes.config
+except ModuleNotFoundError:
+    config = types.ModuleType("Codes.config")
+    config.MODEL_CONFIG = {{}}
+    sys.modules["Codes.config"] = config
+started = time.perf_counter()
+import Codes.client, Codes.consistency
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def test_import_is_light_and_within_budget():
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(root=str(ROOT))],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    probe = json.loads(out.stdout.strip().splitlines()[-1])
+
+    loaded = set(probe["modules"])
+    assert [name for name in HEAVY_MODULES if name in loaded] == []
+    assert probe["elapsed"] < IMPORT_BUDGET_S
@@ -0,0 +1,83 @@
+# tests/test_kv_reuse.py
+
+import pytest
+
+from Codes.client import HuggingFaceLocalClient, _KVCacheState
+
+PROMPTS = ["Hello there", "Tell me more about the patient", "ok", "Why?"]
+
+
+class FakeCache:
+    """KV cache stand-in that only records crops."""
+
+    def __init__(self):
+        self.crops = []
+
+    def crop(self, n):
+        self.crops.append(n)
+
+
+def test_cache_is_cropped_at_the_first_mismatch():
+    cache = FakeCache()
+    state = _KVCacheState(ids=[1, 2, 3, 4], past=cache)
+
+    assert HuggingFaceLocalClient._reusable_kv_cache(state, [1, 2, 9, 9, 9]) is cache
+    assert cache.crops == [2]
+    assert state.ids == [1, 2]
+
+
+def test_one_prompt_token_is_always_left_uncached():
+    cache = FakeCache()
+    state = _KVCacheState(ids=[1, 2, 3], past=cache)
+
+    HuggingFaceLocalClient._reusable_kv_cache(state, [1, 2, 3])
+
+    assert cache.crops == [2]
+
+
+def test_unusable_caches_are_dropped():
+    state = _KVCacheState(ids=[1, 2], past=FakeCache())
+    assert HuggingFaceLocalClient._reusable_kv_cache(state, [7, 8, 9]) is None
+    assert state.past is None and state.ids == []
+
+    legacy = _KVCacheState(ids=[1, 2, 3], past=((None, None),))  # tuple caches cannot crop
+    assert HuggingFaceLocalClient._reusable_kv_cache(legacy, [1, 2, 9]) is None
+
+
+def test_reused_cache_matches_full_recompute(
+    model_config, tiny_client, tiny_model_dir, monkeypatch
+):
+    model = model_config("tiny", provider="huggingface", model_id=tiny_model_dir)
+    kwargs = dict(system_prompt="Be brief", request_logprobs=[True] * 4, max_new_tokens=12)
+    full = tiny_client(reuse_kv_cache=False).run_conversation(model, PROMPTS, **kwargs)
+
+    reuses = []
+    reusable = HuggingFaceLocalClient._reusable_kv_cache
+
+    def logged(state, prompt_ids):
+        kept = len(state.ids)
+        past = reusable(state, prompt_ids)
+        reuses.append((kept, len(state.ids) if past is not None else 0))
+        return past
+
+    monkeypatch.setattr(HuggingFaceLocalClient, "_reusable_kv_cache", staticmethod(logged))
+    client = tiny_client(reuse_kv_cache=True, share_prefix_cache=False)
+    reused = client.run_conversation(model, PROMPTS, **kwargs)
+
+    for fresh, cached in zip(full.assistant_messages, reused.assistant_messages):
+        assert cached.content == fresh.content
+        assert list(cached.token_logprobs.logprobs) == pytest.approx(
+            list(fresh.token_logprobs.logprobs), abs=1e-4
+        )
+    assert [raw["generated_ids"] for raw in reused.raw_responses] == [
+        raw["generated_ids"] for raw in full.raw_responses
+    ]
+    # later turns start from the kept cache ...
+    assert all(used > 0 for _, used in reuses[1:])
+    # ... which was cropped where a reply re-tokenizes differently
+    retokenized = [
+        client.tokenizer(msg.content, add_special_tokens=False)["input_ids"]
+        for msg in reused.assistant_messages
+    ]
+    assert retokenized != [raw["generated_ids"] for raw in reused.raw_responses]
+    assert any(used < kept for kept, used in reuses[1:])
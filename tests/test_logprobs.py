@@ -0,0 +1,77 @@
+# tests/test_logprobs.py
+
+import math
+
+import pytest
+
+from Codes.client import MessageStats, TokenLogProb, TokenLogProbs
+from Codes.consistency import _average_logprob_for_message, _average_logprob_for_messages
+
+ENTRIES = [
+    TokenLogProb(token="The", logprob=-0.25, position=0),
+    TokenLogProb(token=" patient", logprob=-1.5, position=1),
+    TokenLogProb(token=" is", logprob=-0.0625, position=2),
+    TokenLogProb(token=" stable", logprob=-3.0, position=3),
+]
+
+
+@pytest.fixture
+def packed():
+    return TokenLogProbs.from_entries(ENTRIES)
+
+
+def test_behaves_like_a_list_of_token_logprobs(packed):
+    assert len(packed) == len(ENTRIES)
+    assert list(packed) == ENTRIES
+    assert [packed[i] for i in range(len(packed))] == ENTRIES
+    assert packed[-1] == ENTRIES[-1]
+    assert list(packed[1:3]) == ENTRIES[1:3]
+    assert list(packed[::-1]) == ENTRIES[::-1]
+    assert packed == ENTRIES and packed == TokenLogProbs.from_entries(ENTRIES)
+    assert [t.logprob for t in packed] == [t.logprob for t in ENTRIES]
+    assert all(type(t.logprob) is float and type(t.position) is int for t in packed)
+    with pytest.raises(IndexError):
+        packed[len(ENTRIES)]
+
+
+def test_coerce_and_concat(packed):
+    assert TokenLogProbs.coerce(ENTRIES) == packed
+    assert TokenLogProbs.coerce(packed) is packed
+    assert TokenLogProbs.coerce([]) is None and TokenLogProbs.coerce(None) is None
+
+    joined = TokenLogProbs.concat([packed[:2], None, packed[2:]])
+    assert joined == packed
+    assert len(TokenLogProbs.concat([])) == 0
+    with pytest.raises(ValueError, match="same length"):
+        TokenLogProbs(["a", "b"], [-1.0])
+
+
+def test_reductions_match_pure_python(packed):
+    logprobs = [t.logprob for t in ENTRIES]
+    mean = sum(logprobs) / len(logprobs)
+
+    assert packed.sum() == pytest.approx(sum(logprobs))
+    assert packed.mean() == pytest.approx(mean)
+    assert packed.min() == min(logprobs)
+    assert packed.surprisal() == pytest.approx(-mean)
+    assert packed.perplexity() == pytest.approx(math.exp(-mean))
+    assert packed.to_records() == [[t.token, t.logprob, t.position] for t in ENTRIES]
+
+    empty = TokenLogProbs((), ())
+    assert empty.mean() is None and empty.min() is None and empty.perplexity() is None
+
+
+def test_confidence_helpers_accept_packed_and_list_logprobs(packed):
+    first = MessageStats(role="assistant", content="a", token_logprobs=packed)
+    second = MessageStats(role="assistant", content="b", token_logprobs=ENTRIES[:1])
+    silent = MessageStats(role="assistant", content="c")
+    pooled = [t.logprob for t in ENTRIES + ENTRIES[:1]]
+
+    assert _average_logprob_for_message(first) == pytest.approx(
+        sum(t.logprob for t in ENTRIES) / len(ENTRIES)
+    )
+    assert _average_logprob_for_message(silent) is None
+    assert _average_logprob_for_messages([first, silent, second]) == pytest.approx(
+        sum(pooled) / len(pooled)
+    )
+    assert _average_logprob_for_messages([silent]) is None
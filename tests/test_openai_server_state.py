@@ -0,0 +1,69 @@
+# tests/test_openai_server_state.py
+
+import pytest
+
+from Codes.client import OpenAIChatClient, _ResponseChain
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, message, code=None, param=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = {"error": {"message": message, "code": code, "param": param}}
+
+
+@pytest.fixture
+def openai_client():
+    client = OpenAIChatClient.__new__(OpenAIChatClient)
+    client._no_server_state = set()
+    return client
+
+
+@pytest.mark.parametrize("status", [404, 405, 501])
+def test_missing_endpoint_disables_server_state(openai_client, status):
+    exc = FakeAPIError(status, "Not Found")
+    assert openai_client._server_state_fallback(exc, {}, _ResponseChain(), "m")
+    assert openai_client._no_server_state == {"m"}
+
+
+def test_unsupported_parameter_disables_server_state(openai_client):
+    exc = FakeAPIError(400, "Unrecognized request argument supplied: store", param="store")
+    assert openai_client._server_state_fallback(exc, {}, _ResponseChain(), "m")
+    assert openai_client._no_server_state == {"m"}
+
+
+@pytest.mark.parametrize(
+    "message, code",
+    [
+        ("This model's maximum context length is 8192 tokens.", "context_length_exceeded"),
+        ("Invalid value for 'temperature': must be <= 2.", "invalid_value"),
+        ("Unsupported value: 'temperature' does not support 0.2.", "unsupported_value"),
+        ("Your request was rejected by the safety system.", "content_policy_violation"),
+    ],
+)
+def test_other_bad_requests_propagate(openai_client, message, code):
+    exc = FakeAPIError(400, message, code=code)
+    assert not openai_client._server_state_fallback(exc, {}, _ResponseChain(), "m")
+    assert openai_client._no_server_state == set()
+
+
+def test_expired_chain_resends_full_history(openai_client):
+    chain = _ResponseChain(response_id="resp_1", synced=3)
+    exc = FakeAPIError(
+        400, "Previous response with id 'resp_1' not found.", code="previous_response_not_found"
+    )
+    body = {"previous_response_id": "resp_1"}
+
+    assert openai_client._server_state_fallback(exc, body, chain, "m")
+    assert (chain.response_id, chain.synced) == (None, 0)
+    assert openai_client._no_server_state == set()
+
+
+def test_bad_request_on_a_chained_call_propagates(openai_client):
+    chain = _ResponseChain(response_id="resp_1", synced=3)
+    exc = FakeAPIError(400, "Invalid value for 'top_p'.", code="invalid_value")
+
+    assert not openai_client._server_state_fallback(
+        exc, {"previous_response_id": "resp_1"}, chain, "m"
+    )
+    assert chain.response_id == "resp_1"
@@ -0,0 +1,102 @@
+# tests/test_openai_standin.py
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from Codes.client import _rate_limiter, run_conversation
+from Codes.consistency import _generate_runs
+from Codes.openai_standin import SimulatedOpenAIServer
+
+pytest.importorskip("openai")  # provider "openai_compatible" talks through the SDK
+
+
+@pytest.fixture
+def server():
+    with SimulatedOpenAIServer({"supports_logprobs": True, "latency": {"mean": 0.05}}) as server:
+        yield server
+
+
+@pytest.fixture
+def served_model(server, model_config):
+    return model_config(
+        "standin",
+        provider="openai_compatible",
+        base_url=server.base_url,
+        model_id=server.model_id,
+        supports_logprobs=True,
+    )
+
+
+def _post(server, path, body):
+    request = urllib.request.Request(
+        server.base_url + path,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def test_models_and_completions_over_http(server):
+    with urllib.request.urlopen(server.base_url + "/models", timeout=10) as response:
+        models = json.loads(response.read())
+    assert [m["id"] for m in models["data"]] == [server.model_id]
+
+    body = {"model": server.model_id, "messages": [{"role": "user", "content": "Hi"}]}
+    reply = _post(server, "/chat/completions", dict(body, seed=7))
+    assert reply["choices"][0]["message"]["content"]
+    assert reply["usage"]["completion_tokens"] > 0
+    # the seed selects the simulated run, so the reply is reproducible
+    again = _post(server, "/chat/completions", dict(body, seed=7))
+    assert again["choices"][0]["message"]["content"] == reply["choices"][0]["message"]["content"]
+
+
+def test_malformed_requests_get_400(server):
+    with pytest.raises(urllib.error.HTTPError) as info:
+        _post(server, "/chat/completions", {"model": server.model_id, "messages": []})
+    assert info.value.code == 400
+
+
+def test_conversation_through_the_openai_sdk(served_model):
+    result = run_conversation(
+        served_model, ["Hello", "Tell me more"], system_prompt="Be brief", request_logprobs=[True]
+    )
+
+    roles = [m.role for m in result.messages]
+    assert roles == ["system", "user", "assistant", "user", "assistant"]
+    assert all(m.content for m in result.assistant_messages)
+    assert result.assistant_messages[0].token_logprobs is not None
+
+
+def test_streamed_conversation_reports_timing(served_model):
+    result = run_conversation(served_model, ["Hello"], stream=True, request_logprobs=[True])
+
+    message = result.assistant_messages[0]
+    assert message.content
+    assert message.timing is not None and message.timing.ttft_s >= 0.04
+
+
+def test_concurrent_runs_share_the_server(server, served_model):
+    runs = _generate_runs(served_model, ["Hello"], 12, None, concurrency=6)
+
+    assert len(runs) == 12
+    assert server.max_in_flight > 1
+
+
+def test_injected_rate_limits_are_retried(model_config):
+    sim = {"rate_limit_rate": 0.4, "retry_after": 0.001}
+    with SimulatedOpenAIServer(sim) as server:
+        model = model_config(
+            "standin-429",
+            provider="openai_compatible",
+            base_url=server.base_url,
+            model_id=server.model_id,
+            rate_limits={"base_delay": 0.001, "max_delay": 0.01, "max_retries": 20},
+        )
+        runs = _generate_runs(model, ["Hello", "More"], 4, None)
+
+    assert [len(run.assistant_messages) for run in runs] == [2, 2, 2, 2]
+    assert _rate_limiter(model).retries > 0
@@ -0,0 +1,97 @@
+# tests/test_prefix_cache.py
+
+import pytest
+
+from Codes.client import PrefixKVCache
+
+
+class FakeTensor:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class FakeCache:
+    """KV cache stand-in: one layer of `nbytes`-sized keys and values that records crops."""
+
+    def __init__(self, nbytes=10):
+        self.key_cache = [FakeTensor(nbytes)]
+        self.value_cache = [FakeTensor(nbytes)]
+        self.crops = []
+
+    def crop(self, n):
+        self.crops.append(n)
+
+
+def test_lookup_hands_out_private_copies():
+    cache = PrefixKVCache()
+    original = FakeCache()
+    cache.store("model", [1, 2, 3], original)
+    original.crops.append("changed after store")
+
+    first = cache.lookup("model", [1, 2, 3, 4])
+    first.crops.append("changed by a run")
+    second = cache.lookup("model", [1, 2, 3, 4])
+
+    assert first is not second and first is not original
+    assert second.crops == []
+
+
+def test_lookup_uses_the_longest_shared_prefix():
+    cache = PrefixKVCache()
+    cache.store("model", [1, 2, 3], FakeCache())
+    cache.store("model", [1, 2, 3, 4, 5], FakeCache())
+
+    assert cache.lookup("model", [1, 2, 3, 4, 5, 6]).crops == []
+    assert cache.lookup("model", [1, 2, 3, 4, 9]).crops == [4]
+    # at least one prompt token stays uncached
+    assert cache.lookup("model", [1, 2, 3]).crops == [2]
+    assert cache.lookup("model", [7, 8]) is None
+    assert cache.lookup("other-model", [1, 2, 3, 4]) is None
+
+
+def test_entries_are_evicted_lru_by_bytes():
+    cache = PrefixKVCache(max_bytes=60)  # 20 bytes per entry
+    cache.store("model", [1, 1], FakeCache())
+    cache.store("model", [2, 2], FakeCache())
+    cache.store("model", [3, 3], FakeCache())
+    cache.lookup("model", [1, 1, 0])  # now most recently used
+    cache.store("model", [4, 4], FakeCache())
+
+    assert len(cache) == 3 and cache.nbytes == 60
+    assert cache.lookup("model", [2, 2, 0]) is None
+    assert cache.lookup("model", [1, 1, 0]) is not None
+
+    cache.store("model", [5, 5], FakeCache(nbytes=100))
+    assert len(cache) == 0  # a single prefix larger than the budget is not kept
+
+
+def test_runs_sharing_a_prefix_match_runs_without_the_cache(
+    model_config, tiny_client, tiny_model_dir
+):
+    model = model_config("tiny", provider="huggingface", model_id=tiny_model_dir)
+    kwargs = dict(system_prompt="Be brief", request_logprobs=[True] * 2, max_new_tokens=12)
+    scenarios = [["Hello there", "Go on"], ["Hello friend", "Go on"]]
+    prefix_cache = PrefixKVCache()
+    shared = tiny_client(prefix_cache=prefix_cache)
+    plain = tiny_client(share_prefix_cache=False)
+
+    for prompts in scenarios:
+        with_cache = shared.run_conversation(model, prompts, **kwargs)
+        without = plain.run_conversation(model, prompts, **kwargs)
+
+        assert [raw["generated_ids"] for raw in with_cache.raw_responses] == [
+            raw["generated_ids"] for raw in without.raw_responses
+        ]
+        for cached, fresh in zip(with_cache.assistant_messages, without.assistant_messages):
+            assert list(cached.token_logprobs.logprobs) == pytest.approx(
+                list(fresh.token_logprobs.logprobs), abs=1e-4
+            )
+    # the second scenario started from a cropped copy of the first one's entry
+    # instead of prefilling and storing its own
+    assert len(prefix_cache) == 1
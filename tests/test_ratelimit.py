@@ -0,0 +1,149 @@
+# tests/test_ratelimit.py
+
+import time
+
+import pytest
+
+from Codes import client
+from Codes.client import SimulatedProviderError
+from Codes.consistency import _generate_runs
+from Codes.ratelimit import (
+    AdaptiveConcurrency,
+    RateLimitConfig,
+    RateLimiter,
+    TokenBucket,
+    classify_error,
+)
+
+LATENCY_S = 0.25
+
+
+def _timed_runs(model, n_runs, concurrency):
+    started = time.perf_counter()
+    results = _generate_runs(model, ["Hello"], n_runs, None, concurrency=concurrency)
+    return results, time.perf_counter() - started
+
+
+def test_unconfigured_limiter_does_not_cap_concurrency(model_config):
+    model = model_config("sim-open", provider="simulated", latency={"mean": LATENCY_S})
+
+    results, elapsed = _timed_runs(model, 16, concurrency=16)
+
+    assert len(results) == 16
+    assert client._rate_limiter(model).concurrency is None
+    # all 16 calls overlap: one latency, not four waves of an initial limit of 4
+    assert elapsed < 2 * LATENCY_S
+
+
+def test_configured_limiter_caps_concurrency(model_config):
+    model = model_config(
+        "sim-capped",
+        provider="simulated",
+        latency={"mean": LATENCY_S},
+        rate_limits={"initial_concurrency": 4, "max_concurrency": 4},
+    )
+
+    results, elapsed = _timed_runs(model, 16, concurrency=16)
+
+    assert len(results) == 16
+    assert client._rate_limiter(model).concurrency.limit == 4
+    assert elapsed >= 4 * LATENCY_S
+
+
+@pytest.mark.parametrize(
+    "status, kind",
+    [
+        (429, "rate_limited"),
+        (500, "retryable"),
+        (503, "retryable"),
+        (408, "retryable"),
+        (400, "fatal"),
+        (401, "fatal"),
+    ],
+)
+def test_classify_error(status, kind):
+    assert classify_error(SimulatedProviderError("x", status_code=status)) == kind
+
+
+def test_classify_transient_errors_without_status():
+    class ConnectionResetByPeer(Exception):
+        pass
+
+    assert classify_error(ConnectionResetByPeer()) == "retryable"
+    assert classify_error(ValueError("bad")) == "fatal"
+
+
+def test_aimd_limit():
+    limit = AdaptiveConcurrency(initial=4, maximum=8)
+    for _ in range(8):
+        limit.acquire()
+        limit.release("success")
+    assert 5 <= limit.limit <= 6
+
+    limit.acquire()
+    limit.release("rate_limited")
+    assert 2.5 <= limit.limit <= 3
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=600, capacity=1)  # 10 per second
+    bucket.acquire()
+    started = time.perf_counter()
+    bucket.acquire()
+    assert time.perf_counter() - started >= 0.08
+
+
+def _limiter(**limits):
+    return RateLimiter(RateLimitConfig.from_dict(dict({"base_delay": 0.001}, **limits)))
+
+
+def test_rate_limited_calls_are_retried():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise SimulatedProviderError("slow down", status_code=429, retry_after=0.01)
+        return "ok"
+
+    limiter = _limiter()
+    assert limiter.call(flaky) == "ok"
+    assert limiter.retries == 2
+    assert limiter.concurrency.limit < limiter.config.initial_concurrency
+
+
+def test_fatal_errors_and_exhausted_retries_propagate():
+    limiter = _limiter(max_retries=2)
+
+    def fatal():
+        raise SimulatedProviderError("bad request", status_code=400)
+
+    def always_busy():
+        raise SimulatedProviderError("busy", status_code=503)
+
+    with pytest.raises(SimulatedProviderError, match="bad request"):
+        limiter.call(fatal)
+    assert limiter.retries == 0
+    with pytest.raises(SimulatedProviderError, match="busy"):
+        limiter.call(always_busy)
+    assert limiter.retries == 2
+
+
+def test_unknown_rate_limit_keys_are_rejected():
+    with pytest.raises(ValueError, match="Unknown rate_limits keys"):
+        RateLimitConfig.from_dict({"requests_per_second": 1})
+
+
+def test_simulated_rate_limits_are_absorbed_by_retries(model_config):
+    model = model_config(
+        "sim-429",
+        provider="simulated",
+        rate_limit_rate=0.5,
+        retry_after=0.001,
+        rate_limits={"base_delay": 0.001, "max_delay": 0.01, "max_retries": 20},
+    )
+
+    results = _generate_runs(model, ["Hello", "More"], 8, None, concurrency=4)
+
+    assert len(results) == 8
+    assert client._rate_limiter(model).retries > 0
@@ -0,0 +1,26 @@
+# tests/test_replicas.py
+
+import pytest
+
+from Codes.replicas import LocalReplicaPool, _partition_cpus
+
+
+def test_cpu_blocks_are_disjoint():
+    blocks = _partition_cpus([0, 1, 2, 3, 4, 5, 6, 7], n_workers=3, threads=2)
+
+    assert blocks == [[0, 1], [2, 3], [4, 5]]
+
+
+def test_overlapping_cpu_blocks_are_refused():
+    with pytest.raises(ValueError, match="need 6 CPUs, but only 4"):
+        _partition_cpus([0, 1, 2, 3], n_workers=3, threads=2)
+
+
+def test_pool_refuses_to_pin_more_workers_than_cpus(model_config, monkeypatch):
+    from Codes import replicas
+
+    model = model_config("local-replicas", provider="huggingface", model_id="dummy")
+    monkeypatch.setattr(replicas, "_available_cpus", lambda: [0, 1])
+
+    with pytest.raises(ValueError, match="pin_threads=False"):
+        LocalReplicaPool(model, n_workers=2, threads_per_worker=2)
@@ -0,0 +1,75 @@
+# tests/test_retention.py
+
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from Codes.client import ConversationResult, RawResponseSpill, retain_raw_responses
+
+
+def _sdk_response(i):
+    return SimpleNamespace(
+        id=f"resp-{i}",
+        model="gpt-test",
+        choices=[SimpleNamespace(finish_reason="stop")],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+        model_dump=lambda mode="json": {"id": f"resp-{i}", "payload": "x" * 100},
+    )
+
+
+def _result():
+    return ConversationResult(
+        model_name="m",
+        messages=[],
+        assistant_messages=[],
+        raw_responses=[_sdk_response(0), _sdk_response(1)],
+    )
+
+
+def test_summary_keeps_ids_and_usage_only():
+    result = retain_raw_responses(_result(), "summary")
+
+    first = result.raw_responses[0]
+    assert first["id"] == "resp-0"
+    assert first["model"] == "gpt-test"
+    assert first["finish_reason"] == "stop"
+    assert first["usage"]["total_tokens"] == 15
+    assert "payload" not in first
+
+
+def test_none_and_full():
+    assert retain_raw_responses(_result(), "none").raw_responses == [None, None]
+    full = _result()
+    objects = list(full.raw_responses)
+    assert retain_raw_responses(full, "full").raw_responses == objects
+
+
+def test_spill_writes_payloads_to_the_sidecar(tmp_path):
+    path = tmp_path / "raw.jsonl.gz"
+    with RawResponseSpill(path) as spill:
+        result = retain_raw_responses(_result(), "spill", spill, run_index=3)
+
+    assert [r["line"] for r in result.raw_responses] == [0, 1]
+    assert all(r["spill"] == str(path) for r in result.raw_responses)
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        lines = [json.loads(line) for line in fh]
+    assert [(line["run_index"], line["turn"]) for line in lines] == [(3, 0), (3, 1)]
+    assert lines[1]["raw"] == {"id": "resp-1", "payload": "x" * 100}
+
+
+def test_invalid_policies():
+    with pytest.raises(ValueError, match="raw must be one of"):
+        retain_raw_responses(_result(), "everything")
+    with pytest.raises(ValueError, match="requires a RawResponseSpill"):
+        retain_raw_responses(_result(), "spill")
+
+
+def test_generated_runs_apply_the_policy(model_config):
+    from Codes.consistency import _generate_runs
+
+    model = model_config("sim-raw", provider="simulated")
+    runs = _generate_runs(model, ["Hello"], 2, None, raw="none")
+
+    assert [run.raw_responses for run in runs] == [[None], [None]]
@@ -0,0 +1,96 @@
+# tests/test_scheduler.py
+
+import pytest
+
+from Codes.scheduler import ContinuousBatchScheduler
+
+PROMPTS = ["Hello there", "Tell me more about the patient", "ok"]
+TURN_KWARGS = dict(system_prompt="Be brief", request_logprobs=[True] * 3, max_new_tokens=16)
+
+# KV cache bytes per token of the tiny model: 2 layers x (keys, values) x 2 kv heads
+# x 16 dims x 4 bytes (float32).
+KV_TOKEN_BYTES = 512
+
+
+def _turns(result):
+    return [
+        (raw["generated_ids"], list(msg.token_logprobs.logprobs))
+        for raw, msg in zip(result.raw_responses, result.assistant_messages)
+    ]
+
+
+def _assert_same_as(results, reference):
+    expected = _turns(reference)
+    for result in results:
+        turns = _turns(result)
+        assert [ids for ids, _ in turns] == [ids for ids, _ in expected]
+        for (_, logprobs), (_, ref_logprobs) in zip(turns, expected):
+            assert logprobs == pytest.approx(ref_logprobs, abs=1e-4)
+        assert [m.content for m in result.assistant_messages] == [
+            m.content for m in reference.assistant_messages
+        ]
+
+
+@pytest.fixture
+def staggered(model_config, tiny_client, tiny_model_dir, monkeypatch):
+    """
+    (client, generation kwargs, sequential reference, decode-step log). The
+    stop id ends the first reply after two tokens while later replies run
+    longer, so rows of different turns and lengths share decode steps.
+    """
+    model = model_config("tiny", provider="huggingface", model_id=tiny_model_dir)
+    client = tiny_client()
+    probe = client.run_conversation(model, PROMPTS, stop=False, **TURN_KWARGS)
+    gen_kwargs = dict(TURN_KWARGS, stop=[probe.raw_responses[0]["generated_ids"][2]])
+    reference = client.run_conversation(model, PROMPTS, **gen_kwargs)
+
+    steps = []
+    decode_step = ContinuousBatchScheduler._decode_step
+
+    def logged_decode_step(self):
+        steps.append({(row.turn, row.length) for row in self._rows})
+        decode_step(self)
+
+    monkeypatch.setattr(ContinuousBatchScheduler, "_decode_step", logged_decode_step)
+    return client, gen_kwargs, reference, steps
+
+
+def test_rows_match_unbatched_greedy_runs(staggered):
+    client, gen_kwargs, reference, steps = staggered
+    scheduler = ContinuousBatchScheduler(client, max_batch_size=3)
+
+    results = scheduler.run("tiny", PROMPTS, 5, **gen_kwargs)
+
+    _assert_same_as(results, reference)
+    assert any(len({turn for turn, _ in rows}) > 1 for rows in steps)
+    assert scheduler.stats.peak_batch_size == 3
+    assert scheduler.stats.reused_prompt_tokens > 0  # later turns reuse their KV cache
+
+
+def test_kv_budget_drops_kept_caches_without_changing_results(staggered):
+    client, gen_kwargs, reference, _ = staggered
+    unbounded = ContinuousBatchScheduler(client, max_batch_size=3)
+    unbounded.run("tiny", PROMPTS, 5, **gen_kwargs)
+    bounded = ContinuousBatchScheduler(
+        client, max_batch_size=3, max_kv_bytes=200 * KV_TOKEN_BYTES
+    )
+
+    results = bounded.run("tiny", PROMPTS, 5, **gen_kwargs)
+
+    _assert_same_as(results, reference)
+    assert bounded._kv_token_bytes == KV_TOKEN_BYTES
+    assert bounded.stats.peak_batch_size > 1
+    # dropped caches are prefilled again
+    assert bounded.stats.prefill_tokens > unbounded.stats.prefill_tokens
+
+
+def test_without_kv_reuse_every_turn_is_prefilled(model_config, tiny_client, tiny_model_dir):
+    model = model_config("tiny", provider="huggingface", model_id=tiny_model_dir)
+    client = tiny_client(reuse_kv_cache=False)
+    reference = client.run_conversation(model, PROMPTS, stop=False, **TURN_KWARGS)
+    scheduler = ContinuousBatchScheduler(client, max_batch_size=2)
+
+    results = scheduler.run(model, PROMPTS, 3, stop=False, **TURN_KWARGS)
+
+    _assert_same_as(results, reference)
+    assert scheduler.stats.reused_prompt_tokens == 0
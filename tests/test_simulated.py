@@ -0,0 +1,65 @@
+# tests/test_simulated.py
+
+import asyncio
+
+import pytest
+
+from Codes.client import run_conversation, run_conversation_async
+
+
+def _contents(result):
+    return [m.content for m in result.assistant_messages]
+
+
+def test_replies_are_reproducible_per_run(model_config):
+    model = model_config("sim-det", provider="simulated", seed=3, supports_logprobs=True)
+    prompts = ["Hello", "Tell me more"]
+
+    first = run_conversation(model, prompts, run_index=0, request_logprobs=[True])
+    again = run_conversation(model, prompts, run_index=0, request_logprobs=[True])
+    other = run_conversation(model, prompts, run_index=1)
+
+    assert _contents(first) == _contents(again)
+    assert _contents(first) != _contents(other)
+    message = first.assistant_messages[0]
+    assert len(message.token_logprobs) == len(message.content.split())
+
+
+def test_async_path_matches_sync(model_config):
+    model = model_config("sim-async", provider="simulated")
+    sync = run_conversation(model, ["Hi"], run_index=2)
+    async_ = asyncio.run(run_conversation_async(model, ["Hi"], run_index=2))
+
+    assert _contents(async_) == _contents(sync)
+
+
+def test_recorded_corpus_is_replayed_by_turn(model_config):
+    corpus = [["first A", "second A"], ["first B", "second B"]]
+    model = model_config("sim-corpus", provider="simulated", corpus=corpus)
+
+    replies = _contents(run_conversation(model, ["one", "two"], run_index=0))
+
+    # each turn samples a recorded conversation and uses its reply for that turn
+    assert replies[0] in ("first A", "first B")
+    assert replies[1] in ("second A", "second B")
+
+
+def test_latency_and_streaming_timing(model_config):
+    model = model_config(
+        "sim-stream", provider="simulated", latency={"mean": 0.03}, per_token_latency=0.001
+    )
+    message = run_conversation(model, ["Hi"], stream=True).assistant_messages[0]
+
+    assert message.timing.ttft_s >= 0.025
+    assert message.timing.total_s >= message.timing.ttft_s
+
+
+def test_injected_failures_surface_after_retries(model_config):
+    model = model_config(
+        "sim-fail",
+        provider="simulated",
+        failure_rate=1.0,
+        rate_limits={"base_delay": 0.001, "max_retries": 2},
+    )
+    with pytest.raises(Exception, match="Simulated server error"):
+        run_conversation(model, ["Hi"])
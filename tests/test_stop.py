@@ -0,0 +1,109 @@
+# tests/test_stop.py
+
+import numpy as np
+import pytest
+
+from Codes.client import HuggingFaceLocalClient, _StopSpec, _StopStringCriteria
+
+# "[USER]:" is split over three tokens; </s> is special
+VOCAB = ["Hel", "lo", " [US", "ER]", ":", " again", "</s>", "[USER]:"]
+SPECIAL = {6}
+
+
+class FakeTokenizer:
+    def __init__(self):
+        self.decoded_widths = []
+
+    def decode(self, ids, skip_special_tokens=False):
+        return "".join(VOCAB[i] for i in ids if not (skip_special_tokens and i in SPECIAL))
+
+    def batch_decode(self, rows, skip_special_tokens=False):
+        self.decoded_widths.append(rows.shape[1])
+        return [self.decode(row.tolist(), skip_special_tokens) for row in rows]
+
+    def convert_ids_to_tokens(self, ids):
+        return [VOCAB[i] for i in ids.tolist()]
+
+
+@pytest.fixture
+def client():
+    client = HuggingFaceLocalClient.__new__(HuggingFaceLocalClient)
+    client.tokenizer = FakeTokenizer()
+    return client
+
+
+def test_stop_kwarg_parsing():
+    assert _StopSpec.from_kwarg(None).strings == ("[USER]:", "[SYSTEM]:", "[ASSISTANT]:")
+    assert not _StopSpec.from_kwarg(False)
+    assert not _StopSpec.from_kwarg([])
+    assert _StopSpec.from_kwarg(["\n\n", 7]) == _StopSpec(strings=("\n\n",), token_ids=(7,))
+    assert _StopSpec.from_kwarg(2) == _StopSpec(token_ids=(2,))
+    with pytest.raises(ValueError, match="non-empty strings"):
+        _StopSpec.from_kwarg(["", 1.5])
+
+
+def test_stop_string_split_across_tokens(client):
+    ids = np.array([0, 1, 2, 3, 4, 5])
+
+    kept, matched, text = client._cut_at_stop(ids, _StopSpec.from_kwarg(None))
+
+    # " [US" already belongs to the stop string, so only whole tokens before it stay
+    assert kept.tolist() == [0, 1]
+    assert (matched, text) == ("[USER]:", "Hello")
+
+
+def test_stop_string_starting_on_a_token_boundary(client):
+    kept, _, text = client._cut_at_stop(np.array([0, 1, 7, 5]), _StopSpec.from_kwarg(None))
+
+    assert kept.tolist() == [0, 1]
+    assert text == "Hello"
+
+
+def test_stop_token_id(client):
+    kept, matched, text = client._cut_at_stop(np.array([0, 1, 4, 5]), _StopSpec(token_ids=(4,)))
+
+    assert kept.tolist() == [0, 1]
+    assert matched == 4 and text is None
+
+
+def test_no_stop_keeps_everything(client):
+    ids = np.array([0, 1, 2, 3, 4, 5])
+    logprobs = np.arange(6, dtype=np.float32)
+
+    msg, raw = client._finish_turn(ids, logprobs, _StopSpec.from_kwarg(False))
+
+    assert raw["generated_ids"] == [0, 1, 2, 3, 4, 5]
+    assert msg.content == "Hello [USER]: again"
+    assert "finish_reason" not in raw
+
+
+def test_logprobs_are_cut_with_the_tokens(client):
+    ids = np.array([0, 1, 2, 3, 4, 5])
+    logprobs = -np.arange(6, dtype=np.float32)
+
+    msg, raw = client._finish_turn(ids, logprobs, _StopSpec.from_kwarg(None))
+
+    assert raw["generated_ids"] == [0, 1]
+    assert msg.content == "Hello"
+    assert msg.tokens == ["Hel", "lo"]
+    assert list(msg.token_logprobs.logprobs) == [0.0, -1.0]
+    assert (raw["finish_reason"], raw["stop"], raw["num_decoded_tokens"]) == ("stop", "[USER]:", 6)
+
+
+def test_criteria_checks_only_a_window_of_new_tokens():
+    torch = pytest.importorskip("torch")
+    tokenizer = FakeTokenizer()
+    # the prompt itself ends in the stop string, which must not count
+    prompt = [0, 7]
+    criteria = _StopStringCriteria(tokenizer, ("[USER]:",), prompt_len=len(prompt))
+    rows = [prompt + [0, 1] * 8 + [2, 3, 4], prompt + [0, 1] * 9 + [5]]
+
+    done = []
+    for step in range(len(prompt) + 1, len(rows[0]) + 1):
+        input_ids = torch.tensor([row[:step] for row in rows])
+        done.append(criteria(input_ids, scores=None).tolist())
+
+    assert done[:-1] == [[False, False]] * (len(done) - 1)
+    assert done[-1] == [True, False]
+    # each step decodes the new token plus at most `window` earlier ones
+    assert max(tokenizer.decoded_widths) <= criteria.window + 1
@@ -0,0 +1,120 @@
+# tests/test_telemetry.py
+
+import math
+
+import pytest
+
+from Codes.lazy import LazyModule
+from Codes.telemetry import PROMETHEUS_BUCKETS, CallRecord, LatencyHistogram, TelemetryRegistry
+
+# 1 ms .. 2 s, spread over several orders of magnitude
+LATENCIES = [0.001 * 1.013**i for i in range(600)]
+
+
+def _call(model="m", status="ok", latency=0.2, **fields):
+    return CallRecord(
+        model=model,
+        provider="simulated",
+        run_index=0,
+        turn_index=0,
+        status=status,
+        latency_s=latency,
+        end_to_end_s=latency,
+        **fields,
+    )
+
+
+@pytest.mark.parametrize("q", [0.0, 0.5, 0.9, 0.99, 1.0])
+def test_quantiles_are_within_the_relative_precision(q):
+    hist = LatencyHistogram(precision=0.01)
+    for value in LATENCIES:
+        hist.record(value)
+
+    exact = sorted(LATENCIES)[max(1, math.ceil(q * len(LATENCIES))) - 1]
+    assert exact <= hist.quantile(q) <= exact * 1.01
+    assert hist.quantile(q) <= hist.max
+
+
+def test_count_le_counts_whole_buckets():
+    hist = LatencyHistogram(precision=0.01)
+    for value in LATENCIES:
+        hist.record(value)
+
+    for bound in (0.005, 0.1, 0.5, 1.0):
+        at_most = sum(v <= bound for v in LATENCIES)
+        within_bucket = sum(v <= bound * 1.01 for v in LATENCIES)
+        assert at_most <= hist.count_le(bound) <= within_bucket
+    assert hist.count_le(10.0) == hist.count == len(LATENCIES)
+
+
+def test_empty_and_merged_histograms():
+    empty = LatencyHistogram()
+    assert math.isnan(empty.quantile(0.5)) and math.isnan(empty.mean)
+
+    low, high = LatencyHistogram(), LatencyHistogram()
+    for value in LATENCIES[:300]:
+        low.record(value)
+    for value in LATENCIES[300:]:
+        high.record(value)
+    low.merge(high)
+
+    assert low.count == len(LATENCIES)
+    assert low.max == max(LATENCIES) and low.min == min(LATENCIES)
+    assert low.mean == pytest.approx(sum(LATENCIES) / len(LATENCIES))
+    with pytest.raises(ValueError, match="same precision"):
+        low.merge(LatencyHistogram(precision=0.05))
+
+
+def test_prometheus_export():
+    registry = TelemetryRegistry()
+    for latency in (0.07, 0.3, 0.3, 4.0):
+        registry.record(_call(latency=latency, input_tokens=10, output_tokens=5))
+    registry.record(_call(status="rate_limited", latency=0.2, retries=3))
+    registry.record(_call(status="cache_hit", cache_hit=True, latency=0.0))
+    registry.record(_call(model='say "hi"\n', latency=1.0))
+
+    text = registry.to_prometheus(prefix="llm")
+    samples = dict(
+        line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#")
+    )
+
+    assert "# TYPE llm_calls_total counter" in text
+    assert "# TYPE llm_call_latency_seconds histogram" in text
+    assert samples['llm_calls_total{model="m",provider="simulated",status="ok"}'] == "4"
+    assert samples['llm_calls_total{model="m",provider="simulated",status="cache_hit"}'] == "1"
+    assert samples['llm_retries_total{model="m"}'] == "3"
+    assert samples['llm_tokens_total{model="m",kind="input"}'] == "40"
+    assert samples['llm_tokens_total{model="m",kind="output"}'] == "20"
+    # cache hits do not enter the latency histograms
+    buckets = [
+        int(samples[f'llm_call_latency_seconds_bucket{{model="m",le="{float(b)!r}"}}'])
+        for b in PROMETHEUS_BUCKETS
+    ]
+    assert buckets == sorted(buckets)
+    assert buckets[PROMETHEUS_BUCKETS.index(0.1)] == 1
+    assert buckets[PROMETHEUS_BUCKETS.index(0.5)] == 4
+    assert samples['llm_call_latency_seconds_bucket{model="m",le="+Inf"}'] == "5"
+    assert samples['llm_call_latency_seconds_count{model="m"}'] == "5"
+    assert float(samples['llm_call_latency_seconds_sum{model="m"}']) == pytest.approx(4.87)
+    assert 'llm_retries_total{model="say \\"hi\\"\\n"} 0' in text
+
+
+def test_int_consist_results_can_be_concatenated(model_config, monkeypatch):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("sacrebleu")
+    pytest.importorskip("rouge_score")
+    from Codes import consistency
+
+    # POS tagging needs downloaded NLTK data; it is not what this test is about
+    monkeypatch.setattr(consistency, "nltk", LazyModule("nltk_is_not_used_here"))
+    model = model_config("sim-telemetry", provider="simulated")
+
+    first = consistency.int_consist(model, ["Hi", "More"], n_runs=2, show_progress=False)
+    second = consistency.int_consist(model, ["Hi"], n_runs=3, show_progress=False)
+    both = pd.concat([first, second])
+
+    assert first.attrs["telemetry"][model]["calls"] == 4
+    assert second.attrs["telemetry"][model]["calls"] == 3
+    assert len(both) == len(first) + len(second)
+    summary = pd.DataFrame.from_dict(first.attrs["telemetry"], orient="index")
+    assert summary.loc[model, "ok"] == 4